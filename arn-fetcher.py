@@ -1,24 +1,204 @@
 import boto3
+from botocore.exceptions import ClientError
+
+from arns import partition_of, session_account
+from read_planner import PlanRunner
+
+# API limits for the server-side filters used below
+EC2_FILTER_VALUES_LIMIT = 200
+DMS_FILTER_VALUES_LIMIT = 100
+TAG_FILTER_VALUES_LIMIT = 20
+
+# Resource types resolved through resourcegroupstaggingapi.get_resources
+TAGGING_API_RESOURCE_TYPES = {
+    "lambda": "lambda:function",
+    "efs": "elasticfilesystem:file-system",
+    "elb": "elasticloadbalancing:loadbalancer",
+    "logs": "logs:log-group",
+    "redis": "elasticache:cluster",
+    "rds": "rds:db",
+    "ecs-cluster": "ecs:cluster",
+    "ecs-service": "ecs:service",
+    "sqs": "sqs",
+    "sns": "sns",
+    "dynamodb": "dynamodb:table",
+}
+
+# Listings of the types read_planner.PlanRunner does not list: (service, operation, items key)
+SERVICE_LISTINGS = {
+    "rds": ("rds", "describe_db_instances", "DBInstances"),
+    "sqs": ("sqs", "list_queues", "QueueUrls"),
+    "sns": ("sns", "list_topics", "Topics"),
+    "dynamodb": ("dynamodb", "list_tables", "TableNames"),
+}
+
+
+def chunked(items, size):
+    """Yield successive lists of at most `size` items."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def resource_ids_from_arn(arn):
+    """
+    Return the identifiers a name file may use for an ARN: the full resource ID, its last path
+    segment and, for load balancers (loadbalancer/app/NAME/ID), the name.
+    """
+    parts = arn.split(":", 5)
+    resource = parts[-1]
+    for separator in (":", "/"):
+        if separator in resource:
+            resource = resource.split(separator, 1)[1]
+            break
+    segments = resource.split("/")
+    ids = {resource, segments[-1]}
+    if parts[2] == "elasticloadbalancing" and len(segments) >= 3:
+        ids.add(segments[-2])
+    return ids
+
+
+def list_service_arns(resource_type, region):
+    """Yield the ARN of every resource of a type from the service's own listing, tagged or not."""
+    if resource_type not in SERVICE_LISTINGS:
+        for arn, _ in PlanRunner(region).list_resources(resource_type, with_tags=False):
+            yield arn
+        return
+    service, operation, items_key = SERVICE_LISTINGS[resource_type]
+    paginator = boto3.client(service, region_name=region).get_paginator(operation)
+    for page in paginator.paginate():
+        for item in page.get(items_key, []):
+            if resource_type == "rds":
+                yield item["DBInstanceArn"]
+            elif resource_type == "sns":
+                yield item["TopicArn"]
+            elif resource_type == "sqs":
+                # Queue URLs are https://sqs.REGION.amazonaws.com/ACCOUNT/NAME
+                account_id, queue_name = item.rsplit("/", 2)[1:]
+                yield f"arn:{partition_of(region)}:sqs:{region}:{account_id}:{queue_name}"
+            else:
+                yield f"arn:{partition_of(region)}:dynamodb:{region}:{session_account()}:table/{item}"
+
+
+def fetch_s3_arns(resource_names, region):
+    """S3 has no name filter on list_buckets, so this is a full listing."""
+    client = boto3.client("s3", region_name=region)
+    wanted = set(resource_names)
+    arns = {}
+    for bucket in client.list_buckets().get("Buckets", []):
+        bucket_name = bucket["Name"]
+        if bucket_name in wanted:
+            arns[bucket_name] = f"arn:aws:s3:::{bucket_name}"
+    return arns
+
+
+def fetch_ec2_arns(resource_names, region):
+    """Resolve instance IDs and Name tags with instance-id / tag:Name filters."""
+    client = boto3.client("ec2", region_name=region)
+    paginator = client.get_paginator("describe_instances")
+    instance_ids = [name for name in resource_names if name.startswith("i-")]
+    tag_names = [name for name in resource_names if not name.startswith("i-")]
+
+    queries = [("instance-id", chunk) for chunk in chunked(instance_ids, EC2_FILTER_VALUES_LIMIT)]
+    queries += [("tag:Name", chunk) for chunk in chunked(tag_names, EC2_FILTER_VALUES_LIMIT)]
+
+    arns = {}
+    for filter_name, values in queries:
+        wanted = set(values)
+        for page in paginator.paginate(Filters=[{"Name": filter_name, "Values": values}]):
+            for reservation in page["Reservations"]:
+                account_id = reservation.get("OwnerId", "")
+                for instance in reservation["Instances"]:
+                    instance_id = instance["InstanceId"]
+                    arn = f"arn:aws:ec2:{region}:{account_id}:instance/{instance_id}"
+                    if filter_name == "instance-id":
+                        arns[instance_id] = arn
+                        continue
+                    for tag in instance.get("Tags", []):
+                        if tag["Key"] == "Name" and tag["Value"] in wanted:
+                            arns[tag["Value"]] = arn
+    return arns
+
+
+def fetch_dms_arns(resource_names, region):
+    """Resolve replication task identifiers with the replication-task-id filter."""
+    client = boto3.client("dms", region_name=region)
+    paginator = client.get_paginator("describe_replication_tasks")
+    arns = {}
+    for values in chunked(resource_names, DMS_FILTER_VALUES_LIMIT):
+        filters = [{"Name": "replication-task-id", "Values": values}]
+        try:
+            # Task settings are large and not needed to resolve an ARN
+            for page in paginator.paginate(Filters=filters, WithoutSettings=True):
+                for task in page["ReplicationTasks"]:
+                    arns[task["ReplicationTaskIdentifier"]] = task["ReplicationTaskArn"]
+        except ClientError as e:
+            # DMS reports "no match" as an error rather than an empty list
+            if e.response["Error"]["Code"] != "ResourceNotFoundFault":
+                raise
+    return arns
+
+
+def fetch_tagged_arns(resource_names, resource_type, region):
+    """
+    Resolve names through the tagging API.
+
+    Names are first matched server-side against the Name tag. Names without a
+    Name tag fall back to a single listing of the resource type from its own
+    service (the tagging API never returns resources that were never tagged),
+    matched on the resource identifier in the ARN.
+    """
+    client = boto3.client("resourcegroupstaggingapi", region_name=region)
+    paginator = client.get_paginator("get_resources")
+    type_filters = [TAGGING_API_RESOURCE_TYPES[resource_type]]
+    arns = {}
+
+    for values in chunked(resource_names, TAG_FILTER_VALUES_LIMIT):
+        wanted = set(values)
+        pages = paginator.paginate(
+            ResourceTypeFilters=type_filters,
+            TagFilters=[{"Key": "Name", "Values": values}],
+        )
+        for page in pages:
+            for resource in page.get("ResourceTagMappingList", []):
+                for tag in resource.get("Tags", []):
+                    if tag["Key"] == "Name" and tag["Value"] in wanted:
+                        arns[tag["Value"]] = resource["ResourceARN"]
+
+    remaining = set(resource_names) - set(arns)
+    if remaining:
+        for arn in list_service_arns(resource_type, region):
+            for resource_id in resource_ids_from_arn(arn) & remaining:
+                arns[resource_id] = arn
+    return arns
+
+
+RESOURCE_FETCHERS = {
+    "s3": fetch_s3_arns,
+    "ec2": fetch_ec2_arns,
+    "dms": fetch_dms_arns,
+}
+
 
 def get_arns_from_aws(resource_names_file, resource_type, region="us-east-1"):
     """
     Fetches ARNs of AWS resources listed in a text file.
 
+    Lookups use service-side filters (DMS task IDs, EC2 instance-id/tag:Name,
+    tagging API Name tags) in batches sized to each API's limits, so only the
+    requested resources are returned.
+
     Args:
         resource_names_file (str): Path to the text file containing resource names.
-        resource_type (str): The AWS resource type (e.g., 'ec2', 's3', 'dms').
+        resource_type (str): The AWS resource type (e.g., 'ec2', 's3', 'dms', 'lambda').
         region (str): AWS region (default: 'us-east-1').
 
     Returns:
         dict: A dictionary mapping resource names to ARNs.
     """
-    # Initialize boto3 client
-    client = boto3.client(resource_type, region_name=region)
-
     # Read resource names from file
     try:
         with open(resource_names_file, "r") as file:
-            resource_names = [line.strip() for line in file if line.strip()]
+            resource_names = list(dict.fromkeys(line.strip() for line in file if line.strip()))
     except FileNotFoundError:
         print(f"File '{resource_names_file}' not found.")
         return {}
@@ -27,43 +207,26 @@ def get_arns_from_aws(resource_names_file, resource_type, region="us-east-1"):
 
     # Process based on resource type
     try:
-        if resource_type == "s3":
-            buckets = client.list_buckets()
-            for bucket in buckets.get("Buckets", []):
-                bucket_name = bucket["Name"]
-                if bucket_name in resource_names:
-                    arn = f"arn:aws:s3:::{bucket_name}"
-                    arns[bucket_name] = arn
-
-        elif resource_type == "ec2":
-            response = client.describe_instances()
-            for reservation in response["Reservations"]:
-                for instance in reservation["Instances"]:
-                    instance_id = instance["InstanceId"]
-                    if instance_id in resource_names:
-                        arn = f"arn:aws:ec2:{region}::{instance_id}"
-                        arns[instance_id] = arn
-
-        elif resource_type == "dms":
-            response = client.describe_replication_tasks()
-            for task in response["ReplicationTasks"]:
-                task_name = task["ReplicationTaskIdentifier"]
-                if task_name in resource_names:
-                    arn = task["ReplicationTaskArn"]
-                    arns[task_name] = arn
-
+        if resource_type in RESOURCE_FETCHERS:
+            arns = RESOURCE_FETCHERS[resource_type](resource_names, region)
+        elif resource_type in TAGGING_API_RESOURCE_TYPES:
+            arns = fetch_tagged_arns(resource_names, resource_type, region)
         else:
             print(f"Resource type '{resource_type}' not yet supported.")
     except Exception as e:
         print(f"Error fetching ARNs: {e}")
 
+    missing = [name for name in resource_names if name not in arns]
+    if arns and missing:
+        print(f"No ARN found for: {', '.join(missing)}")
+
     return arns
 
 
 if __name__ == "__main__":
     # Input: Path to the text file containing resource names
     resource_names_file = "resources.txt"  # Replace with your file name
-    resource_type = "dms"  # Replace with the resource type (e.g., 'ec2', 's3', 'dms')
+    resource_type = "dms"  # Replace with the resource type (e.g., 'ec2', 's3', 'dms', 'lambda')
 
     region = "us-east-1"  # Set your AWS region
     result = get_arns_from_aws(resource_names_file, resource_type, region)
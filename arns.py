@@ -0,0 +1,167 @@
+"""
+ARN parsing, normalization and construction.
+
+Scripts used to format ARNs by hand, and several branches produced ARNs the
+APIs reject (an empty account field, a missing 'log-group:' segment, a bare
+cache cluster id). Every such ARN cost a failed call. Here:
+
+    parse_arn(arn)            -> Arn(partition, service, region, account, resource_type, resource_id)
+    normalize_arn(arn)        canonical form; raises ArnError for ARNs no API would accept
+    build_arn("vpc", vpc_id)  canonical ARN for a script-level type (see inventory.ARN_RESOURCE_TYPES)
+                              and id, with the account and region of the session unless given
+
+Parsing is cached (LRU), and the account is looked up with STS once per process.
+"""
+import os
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+import boto3
+
+PARTITIONS = ("aws", "aws-cn", "aws-us-gov", "aws-iso", "aws-iso-b")
+# Services whose ARNs have no region, and those whose ARNs have no account either
+GLOBAL_SERVICES = {"s3", "iam", "cloudfront", "route53", "organizations"}
+ACCOUNTLESS_SERVICES = {"s3", "route53"}
+ACCOUNT_ID = re.compile(r"\d{12}")
+REGION = re.compile(r"[a-z]{2}(-[a-z]+)+-\d")
+
+# Script-level resource type -> (service, resource format)
+ARN_FORMATS = {
+    "ec2": ("ec2", "instance/{}"),
+    "vpc": ("ec2", "vpc/{}"),
+    "vpc-endpoint": ("ec2", "vpc-endpoint/{}"),
+    "s3": ("s3", "{}"),
+    "efs": ("elasticfilesystem", "file-system/{}"),
+    "lambda": ("lambda", "function:{}"),
+    "ecs-cluster": ("ecs", "cluster/{}"),
+    "ecs-service": ("ecs", "service/{}"),
+    "ecs-task": ("ecs", "task/{}"),
+    "dms": ("dms", "task:{}"),
+    "elb": ("elasticloadbalancing", "loadbalancer/{}"),
+    "logs": ("logs", "log-group:{}"),
+    "redis": ("elasticache", "cluster:{}"),
+}
+
+
+class ArnError(ValueError):
+    """A string that is not a usable ARN."""
+
+
+Arn = namedtuple("Arn", "partition service region account resource_type resource_id")
+
+
+@lru_cache(maxsize=65536)
+def parse_arn(arn):
+    """
+    Parse and check an ARN.
+
+    :raises ArnError: If `arn` is not of the form arn:PARTITION:SERVICE:REGION:ACCOUNT:RESOURCE,
+        or its region or account is missing or malformed for its service.
+    """
+    parts = arn.split(":", 5)
+    if len(parts) != 6 or parts[0] != "arn":
+        raise ArnError(f"'{arn}' is not an ARN")
+    _, partition, service, region, account, resource = parts
+    if partition not in PARTITIONS:
+        raise ArnError(f"'{arn}': unknown partition '{partition}'")
+    if not service or not resource:
+        raise ArnError(f"'{arn}': missing service or resource")
+    if service not in GLOBAL_SERVICES and not REGION.fullmatch(region):
+        raise ArnError(f"'{arn}': missing or malformed region")
+    if service not in ACCOUNTLESS_SERVICES and not ACCOUNT_ID.fullmatch(account):
+        raise ArnError(f"'{arn}': missing or malformed account id")
+
+    # Same split as inventory.split_arn_resource: the type ends at the first '/' or ':'
+    positions = [resource.find(separator) for separator in ("/", ":") if separator in resource]
+    if positions:
+        split_at = min(positions)
+        resource_type, resource_id = resource[:split_at], resource[split_at + 1:]
+    elif service == "s3":
+        resource_type, resource_id = "", resource
+    else:
+        resource_type, resource_id = resource, ""
+    if service == "logs":
+        # DescribeLogGroups returns log group ARNs ending in ':*'; the tagging API does not
+        resource_id = resource_id.removesuffix(":*")
+    return Arn(partition, service, region, account, resource_type, resource_id)
+
+
+@lru_cache(maxsize=65536)
+def normalize_arn(arn):
+    """
+    Canonical form of an ARN: whitespace trimmed, log group ':*' suffix dropped.
+
+    :raises ArnError: See parse_arn.
+    """
+    arn = arn.strip()
+    if parse_arn(arn).service == "logs":
+        arn = arn.removesuffix(":*")
+    return arn
+
+
+def is_valid_arn(arn):
+    try:
+        parse_arn(arn)
+    except ArnError:
+        return False
+    return True
+
+
+def split_valid_arns(arns):
+    """(canonical valid ARNs, dictionary of rejected input -> reason), in input order."""
+    valid, rejected = [], {}
+    for arn in arns:
+        try:
+            valid.append(normalize_arn(arn))
+        except ArnError as e:
+            rejected[arn] = str(e)
+    return valid, rejected
+
+
+@lru_cache(maxsize=None)
+def session_account():
+    """Account id of the current credentials (one STS call per process)."""
+    return boto3.client('sts').get_caller_identity()['Account']
+
+
+def session_region():
+    """Region of the session: the environment, else the config files (read once per process)."""
+    return os.environ.get("AWS_DEFAULT_REGION") or configured_region()
+
+
+@lru_cache(maxsize=None)
+def configured_region():
+    return boto3.session.Session().region_name
+
+
+def partition_of(region):
+    if region and region.startswith("cn-"):
+        return "aws-cn"
+    if region and region.startswith("us-gov-"):
+        return "aws-us-gov"
+    return "aws"
+
+
+def build_arn(resource_type, resource_id, region=None, account=None):
+    """
+    Canonical ARN of a resource from its script-level type and id.
+
+    :param resource_type: A key of ARN_FORMATS, e.g. 'vpc', 'logs', 'redis'.
+    :param resource_id: The id the service lists (VpcId, logGroupName, CacheClusterId...).
+    :param region: Defaults to the session region.
+    :param account: Defaults to the account of the session's credentials.
+    :raises ArnError: For unknown types, when no region is given or configured, or when the
+        result is not a valid ARN.
+    """
+    if resource_type not in ARN_FORMATS:
+        raise ArnError(f"no ARN format for resource type '{resource_type}'")
+    service, resource_format = ARN_FORMATS[resource_type]
+    if service in GLOBAL_SERVICES:
+        region = ""
+    else:
+        region = region or session_region()
+        if not region:
+            raise ArnError("no region configured; set AWS_DEFAULT_REGION or pass region=")
+    account = "" if service in ACCOUNTLESS_SERVICES else account or session_account()
+    return normalize_arn(f"arn:{partition_of(region)}:{service}:{region}:{account}:{resource_format.format(resource_id)}")
@@ -0,0 +1,291 @@
+"""
+Per-API-call instrumentation built on botocore event hooks.
+
+Counts calls, errors, throttles, retries, latency (histogram) and bytes per
+(service, operation, region), and exports them as a Prometheus textfile
+(for node_exporter's textfile collector) and a JSON summary.
+
+Install before creating clients; clients copy their session's handlers at
+creation time. From the environment:
+
+    AWS_TAGGER_METRICS_TEXTFILE   path of the .prom file written at exit
+    AWS_TAGGER_METRICS_JSON       path of the JSON summary written at exit
+    AWS_TAGGER_METRICS_INTERVAL   seconds between periodic exports (long-running modes)
+"""
+import atexit
+import json
+import os
+import threading
+import time
+
+import boto3
+
+LATENCY_BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+THROTTLE_ERROR_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "RequestThrottled",
+    "RequestThrottledException",
+    "RequestLimitExceeded",
+    "TooManyRequestsException",
+    "ProvisionedThroughputExceededException",
+    "SlowDown",
+}
+
+CONTEXT_KEY = "aws_metrics"
+
+
+class CallStats:
+    """Counters and latency histogram for one (service, operation, region)."""
+
+    __slots__ = ("calls", "errors", "throttles", "retries", "latency_sum", "buckets",
+                 "request_bytes", "response_bytes", "error_codes")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.throttles = 0
+        self.retries = 0
+        self.latency_sum = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_S) + 1)
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.error_codes = {}
+
+    def observe(self, latency):
+        self.latency_sum += latency
+        for index, bound in enumerate(LATENCY_BUCKETS_S):
+            if latency <= bound:
+                self.buckets[index] += 1
+                return
+        self.buckets[-1] += 1
+
+    def quantile(self, q):
+        """Approximate a latency quantile as the upper bound of its histogram bucket."""
+        if not self.calls:
+            return 0.0
+        target = q * self.calls
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target:
+                return LATENCY_BUCKETS_S[index] if index < len(LATENCY_BUCKETS_S) else float("inf")
+        return float("inf")
+
+
+def body_size(body):
+    if body is None:
+        return 0
+    if isinstance(body, (bytes, bytearray, str)):
+        return len(body)
+    if isinstance(body, dict):
+        return len(json.dumps(body))
+    return 0
+
+
+def error_code_of(parsed):
+    return (parsed or {}).get("Error", {}).get("Code")
+
+
+class ApiMetrics:
+    """Collects per-call statistics from a boto3/botocore session's event system."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.started = time.time()
+        self.sessions = []
+
+    def install(self, session=None):
+        """Register hooks on a boto3 Session (default: the boto3 default session)."""
+        if session is None:
+            if boto3.DEFAULT_SESSION is None:
+                boto3.setup_default_session()
+            session = boto3.DEFAULT_SESSION
+        events = session.events
+        events.register("before-parameter-build", self.before_parameter_build, unique_id="aws-metrics-start")
+        events.register("before-call", self.before_call, unique_id="aws-metrics-before-call")
+        events.register("after-call", self.after_call, unique_id="aws-metrics-after-call")
+        events.register("after-call-error", self.after_call_error, unique_id="aws-metrics-after-call-error")
+        events.register("needs-retry", self.needs_retry, unique_id="aws-metrics-needs-retry")
+        self.sessions.append(session)
+        return self
+
+    def entry(self, key):
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = CallStats()
+        return stats
+
+    def before_parameter_build(self, model, context=None, **kwargs):
+        # Emitted for every call, even when a handler such as botocore's Stubber
+        # answers before-call first, so timing starts here
+        if context is None:
+            return
+        region = context.get("client_region") or "global"
+        context[CONTEXT_KEY] = {
+            "key": (model.service_model.service_name, model.name, region),
+            "started": time.perf_counter(),
+            "request_bytes": 0,
+        }
+
+    def before_call(self, params, context=None, **kwargs):
+        call = (context or {}).get(CONTEXT_KEY)
+        if call is not None:
+            call["request_bytes"] = body_size(params.get("body"))
+        return None
+
+    def after_call(self, http_response, parsed, model, context=None, **kwargs):
+        call = (context or {}).pop(CONTEXT_KEY, None)
+        if call is None:
+            return
+        latency = time.perf_counter() - call["started"]
+        response_bytes = int(getattr(http_response, "headers", {}).get("content-length", 0) or 0)
+        code = error_code_of(parsed) if getattr(http_response, "status_code", 200) >= 300 else None
+        retries = parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0) if parsed else 0
+        with self.lock:
+            stats = self.entry(call["key"])
+            stats.calls += 1
+            stats.retries += retries
+            stats.request_bytes += call["request_bytes"]
+            stats.response_bytes += response_bytes
+            stats.observe(latency)
+            if code:
+                stats.errors += 1
+                stats.error_codes[code] = stats.error_codes.get(code, 0) + 1
+
+    def after_call_error(self, exception, context=None, **kwargs):
+        call = (context or {}).pop(CONTEXT_KEY, None)
+        if call is None:
+            return
+        code = type(exception).__name__
+        with self.lock:
+            stats = self.entry(call["key"])
+            stats.calls += 1
+            stats.errors += 1
+            stats.request_bytes += call["request_bytes"]
+            stats.observe(time.perf_counter() - call["started"])
+            stats.error_codes[code] = stats.error_codes.get(code, 0) + 1
+
+    def needs_retry(self, response=None, operation=None, request_dict=None, **kwargs):
+        """Count every throttled attempt, including ones that are retried successfully."""
+        if response is None or operation is None:
+            return None
+        if error_code_of(response[1]) in THROTTLE_ERROR_CODES:
+            call = ((request_dict or {}).get("context") or {}).get(CONTEXT_KEY)
+            region = call["key"][2] if call else "global"
+            with self.lock:
+                self.entry((operation.service_model.service_name, operation.name, region)).throttles += 1
+        return None
+
+    def summary(self):
+        """Return a JSON-serialisable summary per (service, operation, region)."""
+        calls = []
+        with self.lock:
+            for (service, operation, region), stats in sorted(self.stats.items()):
+                calls.append({
+                    "service": service,
+                    "operation": operation,
+                    "region": region,
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "throttles": stats.throttles,
+                    "retries": stats.retries,
+                    "latency_avg_s": round(stats.latency_sum / stats.calls, 4) if stats.calls else 0.0,
+                    "latency_p50_s": stats.quantile(0.5),
+                    "latency_p95_s": stats.quantile(0.95),
+                    "request_bytes": stats.request_bytes,
+                    "response_bytes": stats.response_bytes,
+                    "error_codes": dict(stats.error_codes),
+                })
+        return {
+            "started": self.started,
+            "generated": time.time(),
+            "total_calls": sum(call["calls"] for call in calls),
+            "total_throttles": sum(call["throttles"] for call in calls),
+            "calls": calls,
+        }
+
+    def prometheus_text(self):
+        """Render the counters in the Prometheus text exposition format."""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+
+        with self.lock:
+            items = sorted(self.stats.items())
+            labelled = [(f'service="{s}",operation="{o}",region="{r}"', stats) for (s, o, r), stats in items]
+            for name, attribute, help_text in (
+                ("aws_tagger_api_calls_total", "calls", "AWS API calls made."),
+                ("aws_tagger_api_errors_total", "errors", "AWS API calls that returned an error."),
+                ("aws_tagger_api_throttles_total", "throttles", "AWS API attempts rejected by throttling."),
+                ("aws_tagger_api_retries_total", "retries", "AWS API retry attempts."),
+                ("aws_tagger_api_request_bytes_total", "request_bytes", "AWS API request body bytes."),
+                ("aws_tagger_api_response_bytes_total", "response_bytes", "AWS API response body bytes."),
+            ):
+                metric(name, "counter", help_text,
+                       [f"{name}{{{labels}}} {getattr(stats, attribute)}" for labels, stats in labelled])
+
+            samples = []
+            for labels, stats in labelled:
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS_S + ("+Inf",), stats.buckets):
+                    cumulative += count
+                    samples.append(f'aws_tagger_api_latency_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                samples.append(f"aws_tagger_api_latency_seconds_sum{{{labels}}} {stats.latency_sum:.6f}")
+                samples.append(f"aws_tagger_api_latency_seconds_count{{{labels}}} {stats.calls}")
+            metric("aws_tagger_api_latency_seconds", "histogram", "AWS API call latency.", samples)
+        return "\n".join(lines) + "\n"
+
+    def export(self, textfile=None, json_path=None):
+        """Write the Prometheus textfile and/or JSON summary atomically."""
+        if textfile:
+            write_atomic(textfile, self.prometheus_text())
+        if json_path:
+            write_atomic(json_path, json.dumps(self.summary(), indent=2))
+
+    def start_periodic_export(self, interval, textfile=None, json_path=None):
+        """Export every `interval` seconds from a daemon thread. Returns an Event that stops it."""
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                self.export(textfile, json_path)
+
+        threading.Thread(target=run, name="aws-metrics-export", daemon=True).start()
+        return stop
+
+
+def write_atomic(path, content):
+    temporary = f"{path}.tmp.{os.getpid()}"
+    with open(temporary, "w") as file:
+        file.write(content)
+    os.replace(temporary, path)
+
+
+_metrics = None
+
+
+def enable_from_environment():
+    """
+    Install metrics on the default session when AWS_TAGGER_METRICS_* is set.
+
+    :return: The ApiMetrics instance, or None when metrics are not configured.
+    """
+    global _metrics
+    textfile = os.environ.get("AWS_TAGGER_METRICS_TEXTFILE")
+    json_path = os.environ.get("AWS_TAGGER_METRICS_JSON")
+    if not (textfile or json_path):
+        return None
+    if _metrics is None:
+        _metrics = ApiMetrics().install()
+        interval = float(os.environ.get("AWS_TAGGER_METRICS_INTERVAL", 0) or 0)
+        if interval > 0:
+            _metrics.start_periodic_export(interval, textfile, json_path)
+        atexit.register(_metrics.export, textfile, json_path)
+    return _metrics
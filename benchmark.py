@@ -0,0 +1,134 @@
+"""
+Offline benchmark of discovery, tag reads and tag writes against fake_aws.
+
+Runs the project's own functions (get_resource_arns_by_name, list_existing_tags,
+inventory.load_inventory, tagging.tag_resources) with boto3.client routed to a
+synthetic FakeAWS estate, and writes a JSON report with throughput and API call
+counts per scenario and inventory size.
+
+    python benchmark.py --sizes 1000 10000 100000 --latency-ms 1 --output bench_report.json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import sys
+import time
+
+from fake_aws import FakeAWS
+from inventory import load_inventory
+from tag_events import EventSink
+from tagging import tag_resources
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_script(filename):
+    """Import one of the hyphen-named scripts as a module."""
+    module_name = os.path.splitext(filename)[0].replace("-", "_")
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(HERE, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure(fake, name, items_label, function):
+    """Run `function`, returning a result row with elapsed time, throughput and API calls."""
+    fake.reset_calls()
+    started = time.perf_counter()
+    items = function()
+    elapsed = time.perf_counter() - started
+    calls = {f"{service}.{operation}": count for (service, operation), count in sorted(fake.calls.items())}
+    return {
+        "scenario": name,
+        items_label: items,
+        "seconds": round(elapsed, 4),
+        "per_second": round(items / elapsed, 1) if elapsed > 0 else None,
+        "api_calls": sum(calls.values()),
+        "api_calls_by_operation": calls,
+    }
+
+
+def run_size(size, args, selection, retag):
+    """Run every scenario against an estate of roughly `size` resources."""
+    ecs_resources = args.clusters * args.services_per_cluster * (1 + args.tasks_per_service) + args.clusters
+    fake = FakeAWS(latency_s=args.latency_ms / 1000.0, seed=args.seed).populate(
+        resources=max(size - ecs_resources, 0),
+        tags_per_resource=args.tags_per_resource,
+        clusters=args.clusters,
+        services_per_cluster=args.services_per_cluster,
+        tasks_per_service=args.tasks_per_service,
+    )
+    results = []
+
+    with fake.patch_boto3(), open(os.devnull, "w") as devnull:
+        sink = EventSink(devnull)
+
+        for resource_name in ("s3", "lambda", "ec2", "ecs-service", "ecs-task"):
+            results.append(measure(fake, f"discovery:{resource_name}", "resources",
+                                   lambda: len(selection.get_resource_arns_by_name(resource_name))))
+
+        inventory_holder = {}
+
+        def bulk_read():
+            inventory_holder["inventory"] = load_inventory()
+            return len(inventory_holder["inventory"])
+
+        results.append(measure(fake, "tag-read:get_resources-bulk", "resources", bulk_read))
+        arns = sorted(inventory_holder["inventory"])
+
+        sample = arns[:args.per_arn_sample]
+        results.append(measure(fake, "tag-read:list_existing_tags-per-arn", "resources",
+                               lambda: sum(1 for arn in sample if retag.list_existing_tags(arn) is not None)))
+
+        def write():
+            tag_resources(arns, {"benchmark": "run"}, sink=sink)
+            return len(arns)
+
+        results.append(measure(fake, "tag-write:tag_resources", "resources", write))
+
+    return {"size": len(fake.tags), "estate": repr(fake), "results": results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark tagging paths against a fake AWS backend.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="Total resource counts to benchmark (default: 1k 10k 100k).")
+    parser.add_argument("--tags-per-resource", type=int, default=8)
+    parser.add_argument("--clusters", type=int, default=10)
+    parser.add_argument("--services-per-cluster", type=int, default=10)
+    parser.add_argument("--tasks-per-service", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Injected latency per API call.")
+    parser.add_argument("--per-arn-sample", type=int, default=1000,
+                        help="Number of ARNs read one call at a time (the per-ARN path is slow by design).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+    args = parser.parse_args(argv)
+
+    selection = load_script("multipla-tag-serialwise-selection.py")
+    retag = load_script("retag-1.py")
+
+    report = {
+        "generated": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "runs": [],
+    }
+    for size in args.sizes:
+        run = run_size(size, args, selection, retag)
+        report["runs"].append(run)
+        for row in run["results"]:
+            print(f"{run['size']:>8} {row['scenario']:<40} {row['seconds']:>9.3f}s "
+                  f"{row['per_second'] or 0:>12.1f}/s {row['api_calls']:>8} calls", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
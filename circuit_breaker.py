@@ -0,0 +1,184 @@
+"""
+Circuit breakers for AWS calls, keyed by (account, region, service, operation).
+
+When an endpoint is impaired or the role lacks a permission, every remaining
+call for that partition fails the same way. A breaker opens after `threshold`
+consecutive failures of one class (retryable or auth, see failures.classify),
+and while it is open calls for its key are not made: callers report the
+resources as failed with the error that tripped it, so they land in the
+failure log and the retry-failed run. Every `probe_interval` seconds one call
+is let through (half-open); success closes the breaker, failure re-opens it.
+Permanent failures are about individual resources, not the endpoint, and
+count as the endpoint answering.
+
+Other keys are unaffected, so the healthy part of a large run keeps its full
+throughput.
+
+    AWS_TAGGER_BREAKER_THRESHOLD   consecutive failures that open a breaker (default 5, 0 disables)
+    AWS_TAGGER_BREAKER_PROBE_S     seconds between half-open probes (default 30)
+"""
+import atexit
+import os
+import sys
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+from arns import ArnError, parse_arn
+from failures import PERMANENT, classify
+
+DEFAULT_THRESHOLD = 5
+DEFAULT_PROBE_INTERVAL_S = 30.0
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(Exception):
+    """A call was not made because its breaker is open."""
+
+    def __init__(self, key, breaker):
+        self.key = key
+        self.error_code = breaker.error_code
+        self.failure_class = breaker.failure_class
+        super().__init__(f"Skipped: circuit open for {format_key(key)} after {breaker.consecutive} "
+                         f"consecutive {breaker.failure_class} failures ({breaker.error_code})")
+
+
+def format_key(key):
+    account, region, service, operation = key
+    return f"{service}.{operation} in {account or '-'}/{region or '-'}"
+
+
+def breaker_key(arn, operation):
+    """Breaker key for an operation on the resource `arn`."""
+    try:
+        parsed = parse_arn(arn)
+    except ArnError:
+        return ("", "", "", operation)
+    return (parsed.account, parsed.region, parsed.service, operation)
+
+
+class CircuitBreaker:
+    """Breaker state for one key. Thread-safe."""
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, probe_interval=DEFAULT_PROBE_INTERVAL_S, clock=time.monotonic):
+        self.threshold = threshold
+        self.probe_interval = probe_interval
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive = 0
+        self.failure_class = None
+        self.error_code = None
+        self.opened_at = None
+        self.probing = False
+        self.times_opened = 0
+        self.short_circuited = 0
+
+    def allow(self):
+        """Whether a call may be made now. An open breaker lets one probe through per interval."""
+        with self.lock:
+            if self.state == CLOSED or not self.threshold:
+                return True
+            if self.state == OPEN and self.clock() - self.opened_at >= self.probe_interval:
+                self.state = HALF_OPEN
+                self.probing = True
+                return True
+            self.short_circuited += 1
+            return False
+
+    def success(self):
+        with self.lock:
+            self.state = CLOSED
+            self.consecutive = 0
+            self.probing = False
+
+    def failure(self, failure_class, error_code):
+        """Record a failed call. Permanent failures mean the endpoint answered, so they count as success."""
+        if failure_class == PERMANENT:
+            self.success()
+            return
+        with self.lock:
+            if failure_class == self.failure_class:
+                self.consecutive += 1
+            else:
+                self.failure_class, self.consecutive = failure_class, 1
+            self.error_code = error_code
+            if self.state == HALF_OPEN or (self.threshold and self.consecutive >= self.threshold):
+                if self.state != OPEN:
+                    self.times_opened += 1
+                self.state = OPEN
+                self.opened_at = self.clock()
+                self.probing = False
+
+
+class CircuitBreakers:
+    """Registry of breakers by key."""
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, probe_interval=DEFAULT_PROBE_INTERVAL_S, clock=time.monotonic):
+        self.threshold = threshold
+        self.probe_interval = probe_interval
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.breakers = {}
+
+    def get(self, key):
+        with self.lock:
+            breaker = self.breakers.get(key)
+            if breaker is None:
+                breaker = self.breakers[key] = CircuitBreaker(self.threshold, self.probe_interval, self.clock)
+            return breaker
+
+    def call(self, key, function, *args, **kwargs):
+        """
+        Call `function` through the breaker for `key`.
+
+        :raises CircuitOpenError: If the breaker is open; the function is not called.
+        """
+        breaker = self.get(key)
+        if not breaker.allow():
+            raise CircuitOpenError(key, breaker)
+        try:
+            result = function(*args, **kwargs)
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code", "ClientError")
+            breaker.failure(classify(code, e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")), code)
+            raise
+        except Exception as e:
+            breaker.failure(classify(type(e).__name__), type(e).__name__)
+            raise
+        breaker.success()
+        return result
+
+    def tripped(self):
+        """(key, breaker) pairs of every breaker that opened during the run."""
+        with self.lock:
+            return [(key, breaker) for key, breaker in sorted(self.breakers.items()) if breaker.times_opened]
+
+
+def breakers_from_environment():
+    threshold = int(os.environ.get("AWS_TAGGER_BREAKER_THRESHOLD", DEFAULT_THRESHOLD))
+    probe_interval = float(os.environ.get("AWS_TAGGER_BREAKER_PROBE_S", DEFAULT_PROBE_INTERVAL_S))
+    return CircuitBreakers(threshold, probe_interval)
+
+
+_default_breakers = None
+
+
+def report_tripped():
+    for key, breaker in _default_breakers.tripped():
+        print(f"Circuit {breaker.state} for {format_key(key)}: opened {breaker.times_opened} times on "
+              f"{breaker.failure_class} errors ({breaker.error_code}), {breaker.short_circuited} calls skipped",
+              file=sys.stderr)
+
+
+def default_breakers():
+    """Return the process-wide breakers, configured from the environment."""
+    global _default_breakers
+    if _default_breakers is None:
+        _default_breakers = breakers_from_environment()
+        atexit.register(report_tripped)
+    return _default_breakers
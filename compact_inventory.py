@@ -0,0 +1,394 @@
+"""
+Memory-compact inventory for million-resource estates.
+
+Inventory keeps a dict of tags, a name and several index entries per ARN,
+which costs kilobytes per resource. CompactInventory stores the same data
+in columns:
+
+    ARN        interned prefix ID (array) + unique suffix in one bytearray blob
+    type       interned type ID (array)
+    tags       run of interned (key ID, value ID) pairs in one array, with a
+               start offset and count per resource
+    tag hash   order-independent hash of each resource's tag set (sum of per-pair
+               CRCs), so two inventories compare without decoding unchanged tags
+    lookup     open-addressing hash table of row numbers (array)
+
+Strings shared between resources (ARN prefixes, resource types, tag keys and
+values) are stored once. Nothing is materialised per resource until asked
+for: get_tags() returns a read-only TagView over the pair run, and iteration
+builds ARNs one at a time. The query methods match Inventory's, so
+resource_query.select() works on either; their per-key and per-type row
+lists are built as arrays on first use and dropped on any change.
+"""
+import zlib
+from array import array
+from collections.abc import Mapping
+
+import boto3
+from botocore.exceptions import NoCredentialsError, PartialCredentialsError, ClientError
+
+from inventory import resource_name_from_arn, resource_type_from_arn
+
+EMPTY = 0
+
+
+class StringTable:
+    """Interns strings to dense integer IDs."""
+
+    def __init__(self, strings=()):
+        self.strings = []
+        self.ids = {}
+        for string in strings:
+            self.intern(string)
+
+    def intern(self, string):
+        string_id = self.ids.get(string)
+        if string_id is None:
+            string_id = self.ids[string] = len(self.strings)
+            self.strings.append(string)
+        return string_id
+
+    def get(self, string):
+        """ID of an already interned string, or None."""
+        return self.ids.get(string)
+
+    def __getitem__(self, string_id):
+        return self.strings[string_id]
+
+    def __len__(self):
+        return len(self.strings)
+
+
+def split_arn(arn):
+    """Split an ARN after its last '/' or ':' into (shared prefix, unique suffix)."""
+    cut = max(arn.rfind("/"), arn.rfind(":")) + 1
+    return arn[:cut], arn[cut:]
+
+
+def arn_hash(arn):
+    return zlib.crc32(arn.encode())
+
+
+def tag_pair_hash(key, value):
+    return zlib.crc32(value.encode(), zlib.crc32(key.encode() + b"\0"))
+
+
+class TagView(Mapping):
+    """Read-only mapping over one resource's tags, decoded on access."""
+
+    __slots__ = ("inventory", "row")
+
+    def __init__(self, inventory, row):
+        self.inventory = inventory
+        self.row = row
+
+    def pairs(self):
+        inventory = self.inventory
+        start = inventory.tag_starts[self.row] * 2
+        end = start + inventory.tag_counts[self.row] * 2
+        return inventory.tag_pairs[start:end]
+
+    def __getitem__(self, key):
+        key_id = self.inventory.strings.get(key)
+        if key_id is not None:
+            pairs = self.pairs()
+            for index in range(0, len(pairs), 2):
+                if pairs[index] == key_id:
+                    return self.inventory.strings[pairs[index + 1]]
+        raise KeyError(key)
+
+    def __iter__(self):
+        strings = self.inventory.strings
+        pairs = self.pairs()
+        return (strings[pairs[index]] for index in range(0, len(pairs), 2))
+
+    def __len__(self):
+        return self.inventory.tag_counts[self.row]
+
+    def __repr__(self):
+        return f"TagView({dict(self.items())!r})"
+
+
+class NameView(Mapping):
+    """ARN -> resource name (its Name tag, else derived from the ARN), computed on access."""
+
+    __slots__ = ("inventory",)
+
+    def __init__(self, inventory):
+        self.inventory = inventory
+
+    def __getitem__(self, arn):
+        tags = self.inventory.get_tags(arn)
+        if tags is None:
+            raise KeyError(arn)
+        return tags.get("Name") or resource_name_from_arn(arn)
+
+    def __iter__(self):
+        return iter(self.inventory)
+
+    def __len__(self):
+        return len(self.inventory)
+
+
+class CompactInventory(Mapping):
+    """
+    Column-oriented resource inventory: a read-only mapping of ARN -> TagView.
+
+    add() and remove() update it in place. Replacing a resource's tags appends a
+    new pair run; call compact() after many updates to reclaim the old runs.
+    """
+
+    def __init__(self):
+        # One table for prefixes, types, tag keys and tag values; they overlap little and IDs stay dense
+        self.strings = StringTable()
+        self.prefix_ids = array("I")
+        self.suffix_offsets = array("Q", [0])
+        self.suffix_blob = bytearray()
+        self.type_ids = array("I")
+        self.hashes = array("I")
+        self.live = bytearray()
+        self.tag_starts = array("Q")
+        self.tag_counts = array("H")
+        self.tag_hashes = array("I")
+        self.tag_pairs = array("I")
+        self.slots = array("q", [EMPTY]) * 8
+        self.count = 0
+        self.postings = None
+
+    # -- row storage -----------------------------------------------------
+
+    def arn_at(self, row):
+        suffix = str(self.suffix_blob[self.suffix_offsets[row]:self.suffix_offsets[row + 1]], "utf-8")
+        return self.strings[self.prefix_ids[row]] + suffix
+
+    def find(self, arn, arn_hash_value=None):
+        """Row number holding `arn` (live or removed), or None."""
+        arn_hash_value = arn_hash(arn) if arn_hash_value is None else arn_hash_value
+        mask = len(self.slots) - 1
+        slot = arn_hash_value & mask
+        while True:
+            entry = self.slots[slot]
+            if entry == EMPTY:
+                return None
+            row = entry - 1
+            if self.hashes[row] == arn_hash_value and self.arn_at(row) == arn:
+                return row
+            slot = (slot + 1) & mask
+
+    def insert_slot(self, row):
+        mask = len(self.slots) - 1
+        slot = self.hashes[row] & mask
+        while self.slots[slot] != EMPTY:
+            slot = (slot + 1) & mask
+        self.slots[slot] = row + 1
+
+    def grow(self):
+        self.slots = array("q", [EMPTY]) * (len(self.slots) * 2)
+        for row in range(len(self.hashes)):
+            self.insert_slot(row)
+
+    def append_tags(self, tags):
+        """
+        Append a pair run; `tags` is a dict or the tagging API's [{'Key', 'Value'}] list.
+
+        :return: Tuple of (start, count, tag set hash).
+        """
+        start = len(self.tag_pairs) // 2
+        intern = self.strings.intern
+        items = tags.items() if isinstance(tags, Mapping) else ((tag["Key"], tag.get("Value", "")) for tag in tags)
+        count = 0
+        tags_hash = 0
+        for key, value in items:
+            self.tag_pairs.append(intern(key))
+            self.tag_pairs.append(intern(value))
+            tags_hash += tag_pair_hash(key, value)
+            count += 1
+        return start, count, tags_hash & 0xFFFFFFFF
+
+    # -- mutation --------------------------------------------------------
+
+    def add(self, arn, tags):
+        """Add a resource or replace its tags."""
+        self.postings = None
+        arn_hash_value = arn_hash(arn)
+        row = self.find(arn, arn_hash_value)
+        start, count, tags_hash = self.append_tags(tags)
+        if row is not None:
+            if not self.live[row]:
+                self.live[row] = 1
+                self.count += 1
+            self.tag_starts[row] = start
+            self.tag_counts[row] = count
+            self.tag_hashes[row] = tags_hash
+            return
+
+        prefix, suffix = split_arn(arn)
+        row = len(self.hashes)
+        self.prefix_ids.append(self.strings.intern(prefix))
+        self.suffix_blob += suffix.encode()
+        self.suffix_offsets.append(len(self.suffix_blob))
+        self.type_ids.append(self.strings.intern(resource_type_from_arn(arn)))
+        self.hashes.append(arn_hash_value)
+        self.live.append(1)
+        self.tag_starts.append(start)
+        self.tag_counts.append(count)
+        self.tag_hashes.append(tags_hash)
+        self.count += 1
+        if (row + 1) * 2 > len(self.slots):
+            self.grow()
+        else:
+            self.insert_slot(row)
+
+    def remove(self, arn):
+        row = self.find(arn)
+        if row is not None and self.live[row]:
+            self.postings = None
+            self.live[row] = 0
+            self.tag_counts[row] = 0
+            self.tag_hashes[row] = 0
+            self.count -= 1
+
+    def compact(self):
+        """Rewrite the pair array without the runs left behind by tag replacements."""
+        pairs = array("I")
+        for row in range(len(self.hashes)):
+            start = self.tag_starts[row] * 2
+            end = start + self.tag_counts[row] * 2
+            self.tag_starts[row] = len(pairs) // 2
+            pairs.extend(self.tag_pairs[start:end])
+        self.tag_pairs = pairs
+
+    # -- mapping and query API (same shape as Inventory) -----------------
+
+    def __getitem__(self, arn):
+        tags = self.get_tags(arn)
+        if tags is None:
+            raise KeyError(arn)
+        return tags
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for row in range(len(self.hashes)):
+            if self.live[row]:
+                yield self.arn_at(row)
+
+    def __contains__(self, arn):
+        row = self.find(arn)
+        return row is not None and bool(self.live[row])
+
+    def get_tags(self, arn):
+        """TagView of a resource's tags, or None if it is not in the inventory."""
+        row = self.find(arn)
+        if row is None or not self.live[row]:
+            return None
+        return TagView(self, row)
+
+    @property
+    def names(self):
+        return NameView(self)
+
+    def arns(self):
+        return set(self)
+
+    def build_postings(self):
+        """Build string ID -> array of rows for tag keys and types, in one pass over the columns."""
+        postings = {}
+        pairs = self.tag_pairs
+        for row in range(len(self.hashes)):
+            if not self.live[row]:
+                continue
+            type_id = ~self.type_ids[row]
+            rows = postings.get(type_id)
+            if rows is None:
+                rows = postings[type_id] = array("I")
+            rows.append(row)
+            start = self.tag_starts[row] * 2
+            for key_id in pairs[start:start + self.tag_counts[row] * 2:2]:
+                rows = postings.get(key_id)
+                if rows is None:
+                    rows = postings[key_id] = array("I")
+                rows.append(row)
+        self.postings = postings
+        return postings
+
+    def rows_with(self, posting_id):
+        postings = self.postings if self.postings is not None else self.build_postings()
+        return postings.get(posting_id, ())
+
+    def rows_with_pair(self, key, value=None):
+        key_id = self.strings.get(key)
+        if key_id is None:
+            return
+        if value is None:
+            yield from self.rows_with(key_id)
+            return
+        value_id = self.strings.get(value)
+        if value_id is None:
+            return
+        pairs = self.tag_pairs
+        for row in self.rows_with(key_id):
+            start = self.tag_starts[row] * 2
+            for index in range(start, start + self.tag_counts[row] * 2, 2):
+                if pairs[index] == key_id:
+                    if pairs[index + 1] == value_id:
+                        yield row
+                    break
+
+    def with_type(self, resource_type):
+        type_id = self.strings.get(resource_type)
+        if type_id is None:
+            return set()
+        # Type postings are stored under negative keys so they never collide with tag key IDs
+        return {self.arn_at(row) for row in self.rows_with(~type_id)}
+
+    def with_tag(self, key, value=None):
+        """Return ARNs carrying tag `key`, optionally restricted to one value."""
+        return {self.arn_at(row) for row in self.rows_with_pair(key, value)}
+
+    def with_name_prefix(self, prefix):
+        matches = set()
+        for row in range(len(self.hashes)):
+            if self.live[row]:
+                arn = self.arn_at(row)
+                name = TagView(self, row).get("Name") or resource_name_from_arn(arn)
+                if name.startswith(prefix):
+                    matches.add(arn)
+        return matches
+
+    def memory_usage(self):
+        """Approximate bytes held by the columns and the string table."""
+        columns = (self.prefix_ids, self.suffix_offsets, self.type_ids, self.hashes, self.tag_starts,
+                   self.tag_counts, self.tag_hashes, self.tag_pairs, self.slots)
+        column_bytes = sum(column.itemsize * len(column) for column in columns)
+        string_bytes = sum(len(string) + 49 for string in self.strings.strings)
+        return column_bytes + len(self.suffix_blob) + len(self.live) + string_bytes
+
+
+def load_compact_inventory(resource_type_filters=None, region=None, raise_errors=False):
+    """
+    Build a CompactInventory from resourcegroupstaggingapi.get_resources without
+    creating a tag dict per resource.
+
+    :param raise_errors: Raise listing errors instead of printing them and returning what was
+        listed so far. Callers that persist the result (snapshots, baselines) must set this, or
+        one failed call would be saved as an empty or partial estate.
+    """
+    inventory = CompactInventory()
+    try:
+        client = boto3.client('resourcegroupstaggingapi', region_name=region)
+        kwargs = {"ResourceTypeFilters": resource_type_filters} if resource_type_filters else {}
+        for page in client.get_paginator('get_resources').paginate(**kwargs):
+            for resource in page.get('ResourceTagMappingList', []):
+                inventory.add(resource['ResourceARN'], resource.get('Tags', []))
+
+    except (NoCredentialsError, PartialCredentialsError):
+        if raise_errors:
+            raise
+        print("AWS credentials not found or incomplete. Please configure your credentials.")
+    except ClientError as e:
+        if raise_errors:
+            raise
+        print(f"AWS ClientError: {e.response['Error']['Message']}")
+    return inventory
@@ -1,44 +1,73 @@
+import time
+
 import boto3
-import re
+from botocore.exceptions import ClientError
+
+from aws_metrics import enable_from_environment
+from circuit_breaker import CircuitOpenError, breaker_key, default_breakers
+from naming import extract_info_from_name
+from profiling import enable_from_command_line, span
+from tag_events import default_sink
+
+# Instrument API calls before any client is created
+enable_from_environment()
 
 # Initialize boto3 client
 ecs_client = boto3.client("ecs")
 
-def extract_info_from_name(name):
-    """Extract 'cust', 'env', and 'appname' from the cluster name using the naming convention."""
-    match = re.match(r"([a-zA-Z0-9]+)-([a-zA-Z0-9]+)-([a-zA-Z0-9]+)-\d{4}-\d+-\d+-\d+", name)
-    if match:
-        return {"cust": match.group(1), "env": match.group(2), "appname": match.group(3)}
-    return {}
-
 def get_existing_tags(resource_arn):
-    """Fetch existing tags for a given resource ARN."""
+    """Fetch existing tags for a given resource ARN. Returns None when they could not be read."""
     try:
-        response = ecs_client.list_tags_for_resource(resourceArn=resource_arn)
+        with span("read-tags"):
+            response = default_breakers().call(breaker_key(resource_arn, "list_tags_for_resource"),
+                                               ecs_client.list_tags_for_resource, resourceArn=resource_arn)
         return {tag['key']: tag['value'] for tag in response.get('tags', [])}
+    except CircuitOpenError as e:
+        default_sink().record(resource_arn, "list-tags", "failed", e.error_code, str(e), failure_class=e.failure_class)
+    except ClientError as e:
+        default_sink().record(resource_arn, "list-tags", "failed", e.response['Error']['Code'], e.response['Error']['Message'])
     except Exception as e:
-        print(f"Error fetching tags for {resource_arn}: {e}")
-        return {}
+        default_sink().record(resource_arn, "list-tags", "failed", type(e).__name__, str(e))
+    # Unknown is not untagged: writing defaults now would overwrite the resource's real values
+    return None
 
 def add_missing_tags(resource_arn, existing_tags, inferred_tags):
-    """Add missing tags inferred from the cluster name if they are not already present."""
-    missing_tags = [
-        {"key": key, "value": inferred_tags[key]}
-        for key in inferred_tags if key not in existing_tags
-    ]
+    """
+    Add missing tags inferred from the cluster name if they are not already present.
+    Nothing is written when the existing tags could not be read (None).
+    """
+    sink = default_sink()
+    if existing_tags is None:
+        sink.record(resource_arn, "ecs-tag", "skipped", reason="existing tags could not be read")
+        return
+    with span("diff"):
+        missing_tags = [
+            {"key": key, "value": inferred_tags[key]}
+            for key in inferred_tags if key not in existing_tags
+        ]
 
     if missing_tags:
+        started = time.perf_counter()
         try:
-            ecs_client.tag_resource(resourceArn=resource_arn, tags=missing_tags)
-            print(f"Added missing tags to {resource_arn}: {missing_tags}")
+            with span("apply"):
+                default_breakers().call(breaker_key(resource_arn, "tag_resource"),
+                                        ecs_client.tag_resource, resourceArn=resource_arn, tags=missing_tags)
+            sink.record_batch([resource_arn], "ecs-tag", latency_ms=(time.perf_counter() - started) * 1000)
+        except CircuitOpenError as e:
+            sink.record(resource_arn, "ecs-tag", "failed", e.error_code, str(e), failure_class=e.failure_class)
+        except ClientError as e:
+            sink.record_batch([resource_arn], "ecs-tag", latency_ms=(time.perf_counter() - started) * 1000,
+                              error_code=e.response['Error']['Code'], error_message=e.response['Error']['Message'])
         except Exception as e:
-            print(f"Error tagging {resource_arn}: {e}")
+            sink.record_batch([resource_arn], "ecs-tag", latency_ms=(time.perf_counter() - started) * 1000,
+                              error_code=type(e).__name__, error_message=str(e))
     else:
-        print(f"All required tags are present for {resource_arn}, skipping update.")
+        sink.record(resource_arn, "ecs-tag", "skipped", reason="all required tags present")
 
 def process_ecs_clusters():
     """Process ECS clusters for missing tags."""
-    clusters = ecs_client.list_clusters().get("clusterArns", [])
+    with span("discovery"):
+        clusters = ecs_client.list_clusters().get("clusterArns", [])
     for cluster_arn in clusters:
         cluster_name = cluster_arn.split("/")[-1]
         inferred_tags = extract_info_from_name(cluster_name)
@@ -52,7 +81,8 @@ def process_ecs_clusters():
 
 def process_ecs_services():
     """Process ECS services and update missing tags using cluster tags."""
-    clusters = ecs_client.list_clusters().get("clusterArns", [])
+    with span("discovery"):
+        clusters = ecs_client.list_clusters().get("clusterArns", [])
     for cluster_arn in clusters:
         cluster_name = cluster_arn.split("/")[-1]
         inferred_tags = extract_info_from_name(cluster_name)
@@ -61,14 +91,16 @@ def process_ecs_services():
             print(f"Skipping services in {cluster_name}: Unable to infer tags.")
             continue
 
-        services = ecs_client.list_services(cluster=cluster_name).get("serviceArns", [])
+        with span("discovery"):
+            services = ecs_client.list_services(cluster=cluster_name).get("serviceArns", [])
         for service_arn in services:
             existing_tags = get_existing_tags(service_arn)
             add_missing_tags(service_arn, existing_tags, inferred_tags)
 
 def process_ecs_tasks():
     """Process ECS tasks and update missing tags using cluster tags."""
-    clusters = ecs_client.list_clusters().get("clusterArns", [])
+    with span("discovery"):
+        clusters = ecs_client.list_clusters().get("clusterArns", [])
     for cluster_arn in clusters:
         cluster_name = cluster_arn.split("/")[-1]
         inferred_tags = extract_info_from_name(cluster_name)
@@ -77,12 +109,15 @@ def process_ecs_tasks():
             print(f"Skipping tasks in {cluster_name}: Unable to infer tags.")
             continue
 
-        tasks = ecs_client.list_tasks(cluster=cluster_name).get("taskArns", [])
+        with span("discovery"):
+            tasks = ecs_client.list_tasks(cluster=cluster_name).get("taskArns", [])
         for task_arn in tasks:
             existing_tags = get_existing_tags(task_arn)
             add_missing_tags(task_arn, existing_tags, inferred_tags)
 
 if __name__ == "__main__":
+    enable_from_command_line()
+
     print("Checking ECS Clusters...")
     process_ecs_clusters()
 
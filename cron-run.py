@@ -1,63 +1,180 @@
+import argparse
+import signal
+import sys
+import time
+
 import boto3
+from botocore.exceptions import ClientError
+
+from aws_metrics import enable_from_environment
+from circuit_breaker import CircuitOpenError, breaker_key, default_breakers
+from profiling import enable_from_command_line, span
+from sweep_schedule import Deadline, SweepState, run_scheduled
+from tag_events import default_sink
 
 # Define required tags
 REQUIRED_TAGS = {"cust": "default_customer", "appname": "default_app"}
 
+# Instrument API calls before any client is created
+enable_from_environment()
+
 # Initialize boto3 clients
 ecs_client = boto3.client("ecs")
 
 def get_existing_tags(resource_arn):
-    """Fetch existing tags for a given resource ARN."""
+    """Fetch existing tags for a given resource ARN. Returns None when they could not be read."""
     try:
-        response = ecs_client.list_tags_for_resource(resourceArn=resource_arn)
+        with span("read-tags"):
+            response = default_breakers().call(breaker_key(resource_arn, "list_tags_for_resource"),
+                                               ecs_client.list_tags_for_resource, resourceArn=resource_arn)
         return {tag['key']: tag['value'] for tag in response.get('tags', [])}
+    except CircuitOpenError as e:
+        default_sink().record(resource_arn, "list-tags", "failed", e.error_code, str(e), failure_class=e.failure_class)
+    except ClientError as e:
+        default_sink().record(resource_arn, "list-tags", "failed", e.response['Error']['Code'], e.response['Error']['Message'])
     except Exception as e:
-        print(f"Error fetching tags for {resource_arn}: {e}")
-        return {}
+        default_sink().record(resource_arn, "list-tags", "failed", type(e).__name__, str(e))
+    # Unknown is not untagged: writing defaults now would overwrite the resource's real values
+    return None
 
 def add_missing_tags(resource_arn, existing_tags):
-    """Add missing required tags to the resource."""
-    missing_tags = [
-        {"key": key, "value": value} for key, value in REQUIRED_TAGS.items() if key not in existing_tags
-    ]
+    """
+    Add missing required tags to the resource. Returns True when the required tags are now present,
+    False when they are not, and None when the existing tags could not be read (nothing is written).
+    """
+    sink = default_sink()
+    if existing_tags is None:
+        sink.record(resource_arn, "ecs-tag", "skipped", reason="existing tags could not be read")
+        return None
+    with span("diff"):
+        missing_tags = [
+            {"key": key, "value": value} for key, value in REQUIRED_TAGS.items() if key not in existing_tags
+        ]
 
     if missing_tags:
+        started = time.perf_counter()
         try:
-            ecs_client.tag_resource(resourceArn=resource_arn, tags=missing_tags)
-            print(f"Added missing tags to {resource_arn}: {missing_tags}")
+            with span("apply"):
+                default_breakers().call(breaker_key(resource_arn, "tag_resource"),
+                                        ecs_client.tag_resource, resourceArn=resource_arn, tags=missing_tags)
+            sink.record_batch([resource_arn], "ecs-tag", latency_ms=(time.perf_counter() - started) * 1000)
+        except CircuitOpenError as e:
+            sink.record(resource_arn, "ecs-tag", "failed", e.error_code, str(e), failure_class=e.failure_class)
+            return False
+        except ClientError as e:
+            sink.record_batch([resource_arn], "ecs-tag", latency_ms=(time.perf_counter() - started) * 1000,
+                              error_code=e.response['Error']['Code'], error_message=e.response['Error']['Message'])
+            return False
         except Exception as e:
-            print(f"Error tagging {resource_arn}: {e}")
+            sink.record_batch([resource_arn], "ecs-tag", latency_ms=(time.perf_counter() - started) * 1000,
+                              error_code=type(e).__name__, error_message=str(e))
+            return False
     else:
-        print(f"All required tags are present for {resource_arn}")
+        sink.record(resource_arn, "ecs-tag", "skipped", reason="all required tags present")
+    return True
 
 def process_ecs_clusters():
     """Process ECS clusters for missing tags."""
-    clusters = ecs_client.list_clusters().get("clusterArns", [])
+    with span("discovery"):
+        clusters = ecs_client.list_clusters().get("clusterArns", [])
     for cluster_arn in clusters:
         tags = get_existing_tags(cluster_arn)
         add_missing_tags(cluster_arn, tags)
 
 def process_ecs_services():
     """Process ECS services for missing tags."""
-    clusters = ecs_client.list_clusters().get("clusterArns", [])
+    with span("discovery"):
+        clusters = ecs_client.list_clusters().get("clusterArns", [])
     for cluster_arn in clusters:
         cluster_name = cluster_arn.split("/")[-1]
-        services = ecs_client.list_services(cluster=cluster_name).get("serviceArns", [])
+        with span("discovery"):
+            services = ecs_client.list_services(cluster=cluster_name).get("serviceArns", [])
         for service_arn in services:
             tags = get_existing_tags(service_arn)
             add_missing_tags(service_arn, tags)
 
 def process_ecs_tasks():
     """Process ECS tasks for missing tags."""
-    clusters = ecs_client.list_clusters().get("clusterArns", [])
+    with span("discovery"):
+        clusters = ecs_client.list_clusters().get("clusterArns", [])
     for cluster_arn in clusters:
         cluster_name = cluster_arn.split("/")[-1]
-        tasks = ecs_client.list_tasks(cluster=cluster_name).get("taskArns", [])
+        with span("discovery"):
+            tasks = ecs_client.list_tasks(cluster=cluster_name).get("taskArns", [])
         for task_arn in tasks:
             tags = get_existing_tags(task_arn)
             add_missing_tags(task_arn, tags)
 
+def discover_ecs_resources(deadline):
+    """
+    List clusters, then each cluster's services and tasks, until the deadline.
+
+    :return: (ARNs found, whether discovery finished).
+    """
+    arns = []
+    with span("discovery"):
+        clusters = []
+        for page in ecs_client.get_paginator("list_clusters").paginate():
+            clusters += page.get("clusterArns", [])
+        arns += clusters
+        # Every page is listed: discovery only counts as finished (and lets the state forget
+        # resources) when nothing was cut off
+        for cluster_arn in clusters:
+            cluster_name = cluster_arn.split("/")[-1]
+            for operation, result_key in (("list_services", "serviceArns"), ("list_tasks", "taskArns")):
+                for page in ecs_client.get_paginator(operation).paginate(cluster=cluster_name):
+                    if deadline.expired():
+                        return arns, False
+                    arns += page.get(result_key, [])
+    return arns, True
+
+def check_resource(resource_arn):
+    """True/False for compliant or not; None (not verified) when the tags could not be read."""
+    return add_missing_tags(resource_arn, get_existing_tags(resource_arn))
+
+def sweep(deadline_s=None, state_path=None):
+    """
+    Check ECS clusters, services and tasks within `deadline_s` seconds, most valuable first
+    (see sweep_schedule); resources not reached are carried over in the state file.
+    """
+    deadline = Deadline(deadline_s)
+    state = SweepState(state_path)
+    try:
+        discovered, complete = discover_ecs_resources(deadline)
+        now = time.time()
+        for arn in discovered:
+            state.seen(arn, now)
+        if complete:
+            state.forget_missing(set(discovered))
+        else:
+            print("Discovery did not finish before the deadline; also checking resources known from earlier runs")
+        result = run_scheduled(list(state.resources), check_resource, state, deadline)
+    finally:
+        state.save()
+    done = ", ".join(f"{count} {name}" for name, count in result["done"].items())
+    left = ", ".join(f"{count} {name}" for name, count in result["left"].items() if count)
+    print(f"Checked {done}; carried over to the next run: {left or 'nothing'}")
+    if result["unverified"]:
+        print(f"{result['unverified']} resources could not be read and stay unverified")
+    return result
+
 if __name__ == "__main__":
+    enable_from_command_line()
+
+    parser = argparse.ArgumentParser(description="Add missing required tags to ECS clusters, services and tasks.")
+    parser.add_argument("--deadline", type=float,
+                        help="Seconds this run may take; resources are then checked by priority "
+                             "(new, noncompliant, least recently verified) and the rest carried over.")
+    parser.add_argument("--state", default="cron-run-state.json",
+                        help="Per-resource metadata kept between scheduled runs (default: %(default)s).")
+    args = parser.parse_args()
+
+    if args.deadline is not None:
+        # Let a scheduler's SIGTERM save the state on the way out
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+        sweep(args.deadline, args.state)
+        sys.exit(0)
+
     print("Checking ECS Clusters...")
     process_ecs_clusters()
 
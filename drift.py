@@ -0,0 +1,205 @@
+"""
+Tag drift between two inventory states, and remediation back to the baseline.
+
+Both sides are CompactInventory columns (usually memory-mapped snapshots), so the
+comparison is a hashed join on ARN: each resource is looked up in the other
+inventory's hash table and only resources whose tag-set hashes differ have their
+tags decoded and compared key by key. Unchanged resources cost one lookup.
+
+The changeset is JSON lines, one per drifted resource, then a summary:
+
+    {"arn": ..., "change": "added", "tags": {...}}
+    {"arn": ..., "change": "removed"}
+    {"arn": ..., "change": "modified", "added": {k: v}, "removed": {k: v}, "changed": {k: [old, new]}}
+    {"change": "summary", "added": 3, "removed": 1, "modified": 12, "unchanged": 99984}
+
+'restore' reads a changeset and puts modified resources back to their baseline
+tags: removed and changed keys are re-applied with their old values, added keys
+are untagged. ARNs needing the same calls are batched together.
+
+    python drift.py diff last-night.snap now.snap --output drift.jsonl
+    python drift.py diff last-night.snap --live --save now.snap --output drift.jsonl
+    python drift.py restore drift.jsonl [--dry-run]
+"""
+import argparse
+import json
+import sys
+
+from botocore.exceptions import NoCredentialsError, PartialCredentialsError, ClientError
+
+from compact_inventory import TagView, load_compact_inventory
+from inventory_snapshot import SnapshotError, SnapshotInventory, write_snapshot
+from tagging import tag_resources, untag_resources
+
+
+def compare_tags(old_tags, new_tags):
+    """Key-level difference of two tag mappings as (added, removed, changed)."""
+    added = {key: value for key, value in new_tags.items() if key not in old_tags}
+    removed = {key: value for key, value in old_tags.items() if key not in new_tags}
+    changed = {key: [old_tags[key], value] for key, value in new_tags.items()
+               if key in old_tags and old_tags[key] != value}
+    return added, removed, changed
+
+
+def diff(old, new, counts=None):
+    """
+    Yield change records for resources that differ between two CompactInventories.
+
+    :param old: Baseline inventory.
+    :param new: Current inventory.
+    :param counts: Optional dict updated with 'added', 'removed', 'modified' and 'unchanged' totals.
+    """
+    counts = counts if counts is not None else {}
+    for change in ("added", "removed", "modified", "unchanged"):
+        counts.setdefault(change, 0)
+
+    for row in range(len(new.hashes)):
+        if not new.live[row]:
+            continue
+        arn = new.arn_at(row)
+        old_row = old.find(arn, new.hashes[row])
+        if old_row is None or not old.live[old_row]:
+            counts["added"] += 1
+            yield {"arn": arn, "change": "added", "tags": dict(TagView(new, row))}
+        elif old.tag_hashes[old_row] == new.tag_hashes[row] and old.tag_counts[old_row] == new.tag_counts[row]:
+            counts["unchanged"] += 1
+        else:
+            added, removed, changed = compare_tags(dict(TagView(old, old_row)), dict(TagView(new, row)))
+            if added or removed or changed:
+                counts["modified"] += 1
+                yield {"arn": arn, "change": "modified", "added": added, "removed": removed, "changed": changed}
+            else:
+                counts["unchanged"] += 1
+
+    for row in range(len(old.hashes)):
+        if not old.live[row]:
+            continue
+        arn = old.arn_at(row)
+        new_row = new.find(arn, old.hashes[row])
+        if new_row is None or not new.live[new_row]:
+            counts["removed"] += 1
+            yield {"arn": arn, "change": "removed"}
+
+
+def write_changes(changes, stream, counts):
+    """Write change records and a trailing summary line as JSON lines."""
+    for change in changes:
+        stream.write(json.dumps(change, separators=(",", ":")) + "\n")
+    stream.write(json.dumps(dict(counts, change="summary"), separators=(",", ":")) + "\n")
+
+
+def read_changes(path):
+    """Change records from a changeset file, without the summary line."""
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                change = json.loads(line)
+                if change.get("change") != "summary":
+                    yield change
+
+
+def restore_plan(changes):
+    """
+    Group the calls that revert modified resources to their baseline tags.
+
+    :return: Tuple of (tag groups, untag groups): lists of (tags dict or key tuple, ARN list).
+    """
+    tag_groups = {}
+    untag_groups = {}
+    for change in changes:
+        if change.get("change") != "modified":
+            continue
+        tags = dict(change.get("removed", {}))
+        tags.update({key: values[0] for key, values in change.get("changed", {}).items()})
+        if tags:
+            tag_groups.setdefault(tuple(sorted(tags.items())), []).append(change["arn"])
+        if change.get("added"):
+            untag_groups.setdefault(tuple(sorted(change["added"])), []).append(change["arn"])
+    return ([(dict(tags), arns) for tags, arns in tag_groups.items()],
+            list(untag_groups.items()))
+
+
+def restore(changes, sink=None, client=None, dry_run=False):
+    """
+    Revert modified resources to their baseline tags. Added and removed resources are left alone.
+
+    :return: Dictionary of failed ARNs to their FailedResourcesMap entry.
+    """
+    tag_groups, untag_groups = restore_plan(changes)
+    failed = {}
+    for tags, arns in tag_groups:
+        if dry_run:
+            print(f"Would tag {len(arns)} resources with {tags}")
+        else:
+            failed.update(tag_resources(arns, tags, sink=sink, client=client))
+    for keys, arns in untag_groups:
+        if dry_run:
+            print(f"Would untag {', '.join(keys)} from {len(arns)} resources")
+        else:
+            failed.update(untag_resources(arns, keys, sink=sink, client=client))
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Detect tag drift between inventory snapshots and revert it.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    compare = commands.add_parser("diff", help="Write the changeset between two snapshots.")
+    compare.add_argument("old", help="Baseline snapshot.")
+    compare.add_argument("new", nargs="?", help="Current snapshot (or use --live).")
+    compare.add_argument("--live", action="store_true", help="Compare against the estate as listed now.")
+    compare.add_argument("--save", help="With --live, also write the current state to this snapshot.")
+    compare.add_argument("--type", action="append", dest="types", help="Tagging API resource type filter for --live.")
+    compare.add_argument("--region")
+    compare.add_argument("--output", help="Write the changeset here instead of stdout.")
+    revert = commands.add_parser("restore", help="Revert modified resources in a changeset to their baseline tags.")
+    revert.add_argument("changes")
+    revert.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.command == "restore":
+        try:
+            failed = restore(list(read_changes(args.changes)), dry_run=args.dry_run)
+        except (NoCredentialsError, PartialCredentialsError):
+            print("AWS credentials not found or incomplete. Please configure your credentials.")
+            return 1
+        except (OSError, ValueError) as e:
+            print(f"Cannot read changeset: {e}")
+            return 1
+        return 2 if failed else 0
+
+    if bool(args.new) == args.live:
+        parser.error("give a current snapshot or --live")
+    try:
+        old = SnapshotInventory(args.old)
+        if args.live:
+            filters = args.types or old.meta.get("resource_type_filters")
+            region = args.region or old.meta.get("region")
+            # A partial listing would report everything it missed as removed (and save it as the baseline)
+            new = load_compact_inventory(filters, region, raise_errors=True)
+            if args.save:
+                write_snapshot(new, args.save, {"resource_type_filters": filters, "region": region})
+        else:
+            new = SnapshotInventory(args.new)
+    except (OSError, SnapshotError) as e:
+        print(f"Cannot open snapshot: {e}")
+        return 1
+    except (NoCredentialsError, PartialCredentialsError):
+        print("AWS credentials not found or incomplete. Please configure your credentials.")
+        return 1
+    except ClientError as e:
+        print(f"AWS ClientError: {e.response['Error']['Message']}; the live listing is incomplete, nothing compared")
+        return 1
+
+    counts = {}
+    if args.output:
+        with open(args.output, "w") as file:
+            write_changes(diff(old, new, counts), file, counts)
+    else:
+        write_changes(diff(old, new, counts), sys.stdout, counts)
+    print(f"{counts['added']} added, {counts['removed']} removed, {counts['modified']} modified, "
+          f"{counts['unchanged']} unchanged", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
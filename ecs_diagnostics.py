@@ -0,0 +1,235 @@
+"""
+Run diagnostics on every task of an ECS service at once.
+
+Python successor to heap.sh and pid.sh: resolves task -> container instance ->
+EC2 instance for all tasks with batched calls (ecs_placement), then runs a
+command per task on a bounded thread pool and reports per-task results.
+
+    python ecs_diagnostics.py --cluster acme-prvl-app --service api --preset java-processes
+    python ecs_diagnostics.py --cluster acme-prvl-app --service api --preset heap-dump --bucket dumps
+    python ecs_diagnostics.py --cluster acme-prvl-app --service api --executor ssh "uptime"
+
+The remote execution layer is pluggable: EcsExecExecutor runs the command inside
+the container with 'aws ecs execute-command', SshExecutor runs it on the
+container instance, LocalExecutor runs it on this machine (for testing). With
+ssh, the presets find the task's own container by its task ARN label, so tasks
+sharing a host do not all report the host's first JVM.
+Commands are templates formatted with the TaskPlacement fields, e.g. {task_id}
+(write literal braces as {{ }}; a command that does not format is reported as
+failed for each task).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from ecs_placement import PlacementIndex, list_task_arns, resolve_placements
+
+DEFAULT_WORKERS = 16
+DEFAULT_TIMEOUT = 120
+
+PRESETS = {
+    "java-processes": "pgrep -fl java",
+    "heap-dump": ("PID=$(pgrep -f java | head -n 1) && "
+                  "jmap -dump:live,format=b,file=/tmp/heapdump_{task_id}.hprof $PID && "
+                  "aws s3 cp /tmp/heapdump_{task_id}.hprof s3://{bucket}/{task_id}/"),
+}
+
+# Presets that must resolve the task's own processes when run on the shared EC2 host (ssh):
+# find the task's container by the agent's task ARN label, then run inside it
+HOST_PRESETS = {
+    "java-processes": ("for C in $(docker ps -q --filter label=com.amazonaws.ecs.task-arn={task_arn}); do "
+                       "docker exec $C pgrep -fl java; done"),
+    "heap-dump": ("for C in $(docker ps -q --filter label=com.amazonaws.ecs.task-arn={task_arn}); do "
+                  "docker exec $C pgrep -f java >/dev/null && CID=$C && break; done; "
+                  "[ -n \"$CID\" ] && "
+                  "docker exec $CID sh -c 'jmap -dump:live,format=b,file=/tmp/heapdump_{task_id}.hprof "
+                  "$(pgrep -f java | head -n 1)' && "
+                  "docker cp $CID:/tmp/heapdump_{task_id}.hprof /tmp/heapdump_{task_id}.hprof && "
+                  "aws s3 cp /tmp/heapdump_{task_id}.hprof s3://{bucket}/{task_id}/"),
+}
+
+CommandResult = namedtuple("CommandResult", ["task_id", "target", "exit_code", "stdout", "stderr", "elapsed_s"])
+
+class ExecutionError(Exception):
+    """A task cannot be reached by the chosen executor."""
+
+class LocalExecutor:
+    """Runs the command on this machine; placement fields are exported as TASK_* environment variables."""
+
+    name = "local"
+
+    def target(self, placement):
+        return "localhost"
+
+    def argv(self, placement, command):
+        return ["/bin/sh", "-c", command]
+
+    def environment(self, placement):
+        env = dict(os.environ)
+        env.update({f"TASK_{field.upper()}": str(value) for field, value in placement._asdict().items()
+                    if value is not None and not isinstance(value, tuple)})
+        return env
+
+    def run(self, placement, command, timeout):
+        started = time.perf_counter()
+        try:
+            completed = subprocess.run(self.argv(placement, command), capture_output=True, text=True,
+                                       timeout=timeout, env=self.environment(placement))
+            exit_code, stdout, stderr = completed.returncode, completed.stdout, completed.stderr
+        except subprocess.TimeoutExpired as e:
+            exit_code, stdout, stderr = None, e.stdout or "", f"Timed out after {timeout}s"
+        if isinstance(stdout, bytes):
+            stdout = stdout.decode(errors="replace")
+        return CommandResult(placement.task_id, self.target(placement), exit_code, stdout, stderr,
+                             round(time.perf_counter() - started, 3))
+
+class SshExecutor(LocalExecutor):
+    """Runs the command on the task's container instance over SSH (public IP, else private IP)."""
+
+    name = "ssh"
+
+    def __init__(self, user="ec2-user", options=("-o", "StrictHostKeyChecking=no", "-o", "BatchMode=yes")):
+        self.user = user
+        self.options = list(options)
+
+    def target(self, placement):
+        address = placement.public_ip or placement.private_ip
+        if not address:
+            raise ExecutionError(f"Task {placement.task_id} has no EC2 host address (Fargate?)")
+        return address
+
+    def argv(self, placement, command):
+        return ["ssh", *self.options, f"{self.user}@{self.target(placement)}", command]
+
+    def environment(self, placement):
+        return None
+
+class EcsExecExecutor(LocalExecutor):
+    """Runs the command inside a container of the task with 'aws ecs execute-command'."""
+
+    name = "ecs-exec"
+
+    def __init__(self, container=None):
+        self.container = container
+
+    def target(self, placement):
+        return f"{placement.task_id}/{self.container_of(placement)}"
+
+    def container_of(self, placement):
+        if self.container:
+            return self.container
+        if len(placement.containers) == 1:
+            return placement.containers[0]
+        raise ExecutionError(f"Task {placement.task_id} has containers {', '.join(placement.containers)}; "
+                             "choose one with --container")
+
+    def argv(self, placement, command):
+        return ["aws", "ecs", "execute-command", "--cluster", placement.cluster_arn, "--task", placement.task_id,
+                "--container", self.container_of(placement), "--interactive",
+                "--command", f"/bin/sh -c {json.dumps(command)}"]
+
+    def environment(self, placement):
+        return None
+
+EXECUTORS = {executor.name: executor for executor in (LocalExecutor, SshExecutor, EcsExecExecutor)}
+
+def run_on_tasks(placements, command, executor, workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT, **template_values):
+    """
+    Run `command` for every placement concurrently.
+
+    :param placements: Iterable of TaskPlacement.
+    :param command: Command template, formatted with the placement fields and `template_values`.
+    :param executor: Object with run(placement, command, timeout) -> CommandResult.
+    :return: List of CommandResult in placement order.
+    """
+    placements = list(placements)
+
+    def run_one(placement):
+        try:
+            formatted = command.format(**placement._asdict(), **template_values)
+        except (KeyError, IndexError, ValueError) as e:
+            return CommandResult(placement.task_id, None, None, "",
+                                 f"Cannot format command ({type(e).__name__}: {e}); write literal braces as {{{{ }}}}",
+                                 0.0)
+        try:
+            return executor.run(placement, formatted, timeout)
+        except (ExecutionError, OSError) as e:
+            return CommandResult(placement.task_id, None, None, "", str(e), 0.0)
+
+    if not placements:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers, len(placements))) as pool:
+        return list(pool.map(run_one, placements))
+
+def print_report(results, stream=sys.stdout):
+    for result in results:
+        status = "ok" if result.exit_code == 0 else f"failed (exit {result.exit_code})"
+        print(f"== {result.task_id} on {result.target or '-'}: {status} in {result.elapsed_s:.1f}s", file=stream)
+        if result.stdout.strip():
+            print(result.stdout.rstrip(), file=stream)
+        if result.stderr.strip():
+            print(result.stderr.rstrip(), file=stream)
+    succeeded = sum(1 for result in results if result.exit_code == 0)
+    print(f"{succeeded}/{len(results)} tasks succeeded", file=stream)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a diagnostic command on every task of an ECS service.")
+    parser.add_argument("--cluster", required=True)
+    parser.add_argument("--service", help="Only tasks of this service (default: every task in the cluster).")
+    parser.add_argument("--container", help="Container to exec into (ecs-exec executor).")
+    parser.add_argument("--executor", choices=sorted(EXECUTORS), default="ecs-exec")
+    parser.add_argument("--ssh-user", default="ec2-user")
+    parser.add_argument("--preset", choices=sorted(PRESETS), help="Use a predefined command.")
+    parser.add_argument("--bucket", help="S3 bucket for the heap-dump preset.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Per-task command timeout in seconds.")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    parser.add_argument("--placement-cache", help="JSON file caching the cluster's placement index between runs; "
+                                                  "only tasks started since the last run are described.")
+    parser.add_argument("command", nargs="?", help="Command template, e.g. 'jcmd 1 Thread.print'.")
+    args = parser.parse_args(argv)
+
+    if args.preset:
+        presets = HOST_PRESETS if args.executor == "ssh" else PRESETS
+        command = presets.get(args.preset, PRESETS[args.preset])
+    else:
+        command = args.command
+    if not command:
+        parser.error("give a command or --preset")
+    if "{bucket}" in command and not args.bucket:
+        parser.error("--bucket is required for this command")
+
+    if args.placement_cache:
+        index = PlacementIndex.load(args.placement_cache, args.cluster)
+        index.refresh()
+        index.save(args.placement_cache)
+        placements = index.for_service(args.service) if args.service else list(index)
+    else:
+        task_arns = list_task_arns(args.cluster, args.service)
+        placements = list(resolve_placements(args.cluster, task_arns).values()) if task_arns else []
+    if not placements:
+        print(f"No running tasks found for {args.service or 'any service'} in cluster {args.cluster}")
+        return 1
+
+    if args.executor == "ssh":
+        executor = SshExecutor(args.ssh_user)
+    elif args.executor == "ecs-exec":
+        executor = EcsExecExecutor(args.container)
+    else:
+        executor = LocalExecutor()
+
+    print(f"Running on {len(placements)} tasks with {args.executor}...", file=sys.stderr)
+    results = run_on_tasks(placements, command, executor, args.workers, args.timeout, bucket=args.bucket)
+    if args.json:
+        print(json.dumps([result._asdict() for result in results], indent=2))
+    else:
+        print_report(results)
+    return 0 if all(result.exit_code == 0 for result in results) else 2
+
+if __name__ == "__main__":
+    sys.exit(main())
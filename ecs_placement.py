@@ -0,0 +1,223 @@
+"""
+Resolve where ECS tasks run: task -> container instance -> EC2 instance -> IPs.
+
+heap.sh follows that chain one call at a time for a single task. Here each hop
+is one batched call per chunk: describe_tasks and describe_container_instances
+take 100 ARNs, describe_instances is filtered by up to 200 instance IDs.
+
+PlacementIndex keeps the mapping for a cluster in memory (optionally cached in a
+JSON file) and refreshes it incrementally: each refresh lists the cluster's tasks
+and only describes tasks, container instances and EC2 instances it has not seen.
+"""
+import json
+import os
+import time
+from collections import namedtuple
+
+import boto3
+
+from tagging import chunked
+
+DESCRIBE_TASKS_BATCH_SIZE = 100
+DESCRIBE_CONTAINER_INSTANCES_BATCH_SIZE = 100
+INSTANCE_ID_FILTER_LIMIT = 200
+
+TaskPlacement = namedtuple("TaskPlacement", [
+    "task_arn", "task_id", "cluster_arn", "group", "last_status", "containers",
+    "container_instance_arn", "instance_id", "private_ip", "public_ip",
+])
+TaskPlacement.__doc__ = """Where one task runs. Host fields are None for Fargate tasks."""
+
+def list_task_arns(cluster, service_name=None, ecs_client=None):
+    """List running task ARNs of a cluster, optionally only those of one service."""
+    ecs_client = ecs_client or boto3.client('ecs')
+    kwargs = {"cluster": cluster}
+    if service_name:
+        kwargs["serviceName"] = service_name
+    arns = []
+    for page in ecs_client.get_paginator('list_tasks').paginate(**kwargs):
+        arns.extend(page.get('taskArns', []))
+    return arns
+
+def describe_tasks(cluster, task_arns, ecs_client):
+    """describe_tasks in batches of 100. Returns task descriptions; tasks that no longer exist are skipped."""
+    tasks = []
+    for batch in chunked(task_arns, DESCRIBE_TASKS_BATCH_SIZE):
+        tasks.extend(ecs_client.describe_tasks(cluster=cluster, tasks=batch).get('tasks', []))
+    return tasks
+
+def describe_container_instances(cluster, container_instance_arns, ecs_client):
+    """Map container instance ARN -> EC2 instance ID, in batches of 100."""
+    instance_ids = {}
+    for batch in chunked(container_instance_arns, DESCRIBE_CONTAINER_INSTANCES_BATCH_SIZE):
+        response = ecs_client.describe_container_instances(cluster=cluster, containerInstances=batch)
+        for container_instance in response.get('containerInstances', []):
+            instance_ids[container_instance['containerInstanceArn']] = container_instance.get('ec2InstanceId')
+    return instance_ids
+
+def describe_instance_addresses(instance_ids, ec2_client):
+    """
+    Map EC2 instance ID -> (private IP, public IP).
+
+    Uses an instance-id filter rather than InstanceIds, so one terminated instance
+    does not fail the whole batch with InvalidInstanceID.NotFound.
+    """
+    addresses = {}
+    paginator = ec2_client.get_paginator('describe_instances')
+    for batch in chunked(instance_ids, INSTANCE_ID_FILTER_LIMIT):
+        for page in paginator.paginate(Filters=[{"Name": "instance-id", "Values": batch}]):
+            for reservation in page.get('Reservations', []):
+                for instance in reservation.get('Instances', []):
+                    addresses[instance['InstanceId']] = (instance.get('PrivateIpAddress'),
+                                                         instance.get('PublicIpAddress'))
+    return addresses
+
+def resolve_placements(cluster, task_arns, ecs_client=None, ec2_client=None):
+    """
+    Resolve task ARNs to TaskPlacements with batched describe calls.
+
+    :param cluster: Cluster name or ARN.
+    :param task_arns: Task ARNs (or IDs) in that cluster.
+    :return: Dictionary of task ARN -> TaskPlacement.
+    """
+    ecs_client = ecs_client or boto3.client('ecs')
+    ec2_client = ec2_client or boto3.client('ec2')
+
+    tasks = describe_tasks(cluster, task_arns, ecs_client)
+    container_instance_arns = sorted({task['containerInstanceArn'] for task in tasks if task.get('containerInstanceArn')})
+    instance_ids = describe_container_instances(cluster, container_instance_arns, ecs_client)
+    addresses = describe_instance_addresses(sorted({i for i in instance_ids.values() if i}), ec2_client)
+    return {task['taskArn']: placement_of(task, instance_ids, addresses) for task in tasks}
+
+def placement_of(task, instance_ids, addresses):
+    container_instance_arn = task.get('containerInstanceArn')
+    instance_id = instance_ids.get(container_instance_arn)
+    private_ip, public_ip = addresses.get(instance_id, (None, None))
+    return TaskPlacement(
+        task_arn=task['taskArn'],
+        task_id=task['taskArn'].split('/')[-1],
+        cluster_arn=task.get('clusterArn'),
+        group=task.get('group'),
+        last_status=task.get('lastStatus'),
+        containers=tuple(container['name'] for container in task.get('containers', [])),
+        container_instance_arn=container_instance_arn,
+        instance_id=instance_id,
+        private_ip=private_ip,
+        public_ip=public_ip,
+    )
+
+class PlacementIndex:
+    """
+    Task -> container instance -> EC2 instance -> IPs for one cluster.
+
+    Lookups are answered from memory; refresh() diffs list_tasks against the index,
+    describes only new tasks and hosts, and drops tasks that stopped.
+    """
+
+    def __init__(self, cluster, ecs_client=None, ec2_client=None):
+        self.cluster = cluster
+        self.ecs_client = ecs_client or boto3.client('ecs')
+        self.ec2_client = ec2_client or boto3.client('ec2')
+        self.placements = {}
+        self.task_ids = {}
+        self.instance_ids = {}
+        self.addresses = {}
+        self.refreshed = None
+
+    def refresh(self, max_age=None):
+        """
+        Bring the index up to date with the cluster's running tasks.
+
+        :param max_age: Skip the refresh if the last one is younger than this many seconds.
+        :return: Tuple of (added task ARNs, removed task ARNs).
+        """
+        if max_age is not None and self.refreshed is not None and time.time() - self.refreshed < max_age:
+            return [], []
+
+        current = set(list_task_arns(self.cluster, ecs_client=self.ecs_client))
+        removed = sorted(self.placements.keys() - current)
+        added = sorted(current - self.placements.keys())
+        for task_arn in removed:
+            del self.task_ids[self.placements.pop(task_arn).task_id]
+
+        tasks = describe_tasks(self.cluster, added, self.ecs_client)
+        new_container_instances = sorted({task['containerInstanceArn'] for task in tasks
+                                          if task.get('containerInstanceArn')} - self.instance_ids.keys())
+        self.instance_ids.update(describe_container_instances(self.cluster, new_container_instances, self.ecs_client))
+        new_instances = sorted({i for i in self.instance_ids.values() if i} - self.addresses.keys())
+        self.addresses.update(describe_instance_addresses(new_instances, self.ec2_client))
+
+        for task in tasks:
+            placement = placement_of(task, self.instance_ids, self.addresses)
+            self.placements[placement.task_arn] = placement
+            self.task_ids[placement.task_id] = placement.task_arn
+
+        # Forget hosts no task runs on any more
+        used = {placement.container_instance_arn for placement in self.placements.values()}
+        self.instance_ids = {arn: i for arn, i in self.instance_ids.items() if arn in used}
+        used_instances = set(self.instance_ids.values())
+        self.addresses = {i: address for i, address in self.addresses.items() if i in used_instances}
+
+        self.refreshed = time.time()
+        return added, removed
+
+    def get(self, task):
+        """TaskPlacement for a task ARN or ID, refreshing once if it is not indexed yet."""
+        task_arn = self.task_ids.get(task, task)
+        if task_arn not in self.placements:
+            self.refresh()
+            task_arn = self.task_ids.get(task, task)
+        return self.placements.get(task_arn)
+
+    def for_service(self, service_name):
+        """Placements of one service's tasks (service name or ARN)."""
+        group = f"service:{service_name.split('/')[-1]}"
+        return [placement for placement in self.placements.values() if placement.group == group]
+
+    def on_instance(self, instance_id):
+        """Placements of the tasks running on one EC2 instance."""
+        return [placement for placement in self.placements.values() if placement.instance_id == instance_id]
+
+    def __len__(self):
+        return len(self.placements)
+
+    def __contains__(self, task):
+        return task in self.placements or task in self.task_ids
+
+    def __iter__(self):
+        return iter(self.placements.values())
+
+    def save(self, path):
+        """Write the index to a JSON cache file."""
+        data = {
+            "cluster": self.cluster,
+            "refreshed": self.refreshed,
+            "placements": [placement._asdict() for placement in self.placements.values()],
+            "instance_ids": self.instance_ids,
+            "addresses": self.addresses,
+        }
+        temporary = f"{path}.tmp.{os.getpid()}"
+        with open(temporary, "w") as file:
+            json.dump(data, file)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path, cluster, ecs_client=None, ec2_client=None):
+        """Load a cached index for `cluster`, or return an empty one if the cache is missing or for another cluster."""
+        index = cls(cluster, ecs_client, ec2_client)
+        try:
+            with open(path) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return index
+        if data.get("cluster") != cluster:
+            return index
+        for fields in data.get("placements", []):
+            fields["containers"] = tuple(fields.get("containers") or ())
+            placement = TaskPlacement(**fields)
+            index.placements[placement.task_arn] = placement
+            index.task_ids[placement.task_id] = placement.task_arn
+        index.instance_ids = data.get("instance_ids", {})
+        index.addresses = {i: tuple(address) for i, address in data.get("addresses", {}).items()}
+        index.refreshed = data.get("refreshed")
+        return index
@@ -0,0 +1,203 @@
+"""
+Queues of AWS event messages: SQS, or a local stand-in for testing and replay.
+
+All queues have the same shape as SQS: receive() returns up to N messages and
+waits up to wait_s for the first one, ack() deletes handled messages and nack()
+makes messages available again. A message body is decoded JSON; events_in()
+unwraps the envelopes an event can arrive in (SNS notification, EventBridge
+event, CloudTrail log file with a Records list) into individual records.
+
+    MemoryQueue              in-process queue, put() events into it
+    FileQueue(path)          JSON lines (or a CloudTrail log file) read once, or tailed with follow=True
+    SqsQueue(queue_url)      an SQS queue fed by an EventBridge rule or CloudTrail
+
+open_queue() picks one from a command-line spec: an SQS URL, '-' for stdin, or a path.
+"""
+import json
+import sys
+import threading
+import time
+from collections import deque, namedtuple
+
+import boto3
+
+from tagging import chunked
+
+SQS_BATCH_SIZE = 10
+SQS_MAX_WAIT_S = 20
+FOLLOW_INTERVAL = 0.2
+
+Message = namedtuple("Message", ["receipt", "body"])
+
+
+def decode(body):
+    """JSON-decode a message body, unwrapping an SNS notification. Returns None for non-JSON bodies."""
+    if isinstance(body, (str, bytes)):
+        try:
+            body = json.loads(body)
+        except ValueError:
+            return None
+    if isinstance(body, dict) and body.get("Type") == "Notification" and isinstance(body.get("Message"), str):
+        return decode(body["Message"])
+    return body
+
+
+def events_in(body):
+    """Individual event records in a decoded message body."""
+    if isinstance(body, list):
+        for item in body:
+            yield from events_in(item)
+    elif isinstance(body, dict):
+        if isinstance(body.get("Records"), list):
+            yield from body["Records"]
+        else:
+            yield body
+
+
+class MemoryQueue:
+    """Thread-safe in-process queue."""
+
+    # Whether messages can still arrive that are not in the queue yet (put() from a producer)
+    live = True
+    # Shortest wait receive() honours; shorter waits are not worth a call
+    min_wait_s = 0.0
+
+    def __init__(self, bodies=()):
+        self.ready = deque()
+        self.in_flight = {}
+        self.condition = threading.Condition()
+        self.next_receipt = 0
+        for body in bodies:
+            self.put(body)
+
+    def put(self, body):
+        with self.condition:
+            self.ready.append(body)
+            self.condition.notify()
+
+    def receive(self, max_messages=SQS_BATCH_SIZE, wait_s=0.0):
+        deadline = time.monotonic() + wait_s
+        with self.condition:
+            while not self.ready:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self.condition.wait(remaining)
+            messages = []
+            while self.ready and len(messages) < max_messages:
+                self.next_receipt += 1
+                body = self.ready.popleft()
+                self.in_flight[self.next_receipt] = body
+                messages.append(Message(self.next_receipt, decode(body)))
+            return messages
+
+    def ack(self, receipts):
+        with self.condition:
+            for receipt in receipts:
+                self.in_flight.pop(receipt, None)
+
+    def nack(self, receipts):
+        with self.condition:
+            for receipt in receipts:
+                if receipt in self.in_flight:
+                    self.ready.append(self.in_flight.pop(receipt))
+            self.condition.notify_all()
+
+    def __len__(self):
+        return len(self.ready)
+
+
+class FileQueue(MemoryQueue):
+    """
+    Messages read from a JSON lines file, one event or envelope per line.
+
+    Without follow the file is read once, and may also be a single JSON document
+    such as a CloudTrail log file. With follow=True it is tailed like 'tail -f'.
+    """
+
+    def __init__(self, path, follow=False):
+        super().__init__()
+        self.file = sys.stdin if path == "-" else open(path)
+        self.follow = follow
+        # Read once, the file has nothing more to give: only nacked messages come back
+        self.live = follow
+        self.partial = ""
+        if not follow:
+            self.read_all()
+
+    def read_all(self):
+        content = self.file.read()
+        try:
+            self.put(json.loads(content))
+        except ValueError:
+            for line in content.splitlines():
+                if line.strip():
+                    self.put(line)
+
+    def read_available(self):
+        while True:
+            line = self.file.readline()
+            if not line:
+                return
+            if not line.endswith("\n"):
+                # The writer is mid-line; finish it on the next read
+                self.partial += line
+                return
+            line, self.partial = self.partial + line, ""
+            if line.strip():
+                self.put(line)
+
+    def receive(self, max_messages=SQS_BATCH_SIZE, wait_s=0.0):
+        if not self.follow:
+            # Everything is read already; wait (without spinning) for nacked messages
+            return super().receive(max_messages, wait_s)
+        deadline = time.monotonic() + wait_s
+        while True:
+            self.read_available()
+            messages = super().receive(max_messages, 0.0)
+            if messages or time.monotonic() >= deadline:
+                return messages
+            time.sleep(min(FOLLOW_INTERVAL, max(0.0, deadline - time.monotonic())))
+
+    def close(self):
+        if self.file is not sys.stdin:
+            self.file.close()
+
+
+class SqsQueue:
+    """An SQS queue; nack() makes messages visible again immediately."""
+
+    live = True
+    # WaitTimeSeconds is whole seconds; less than one is a short poll
+    min_wait_s = 1.0
+
+    def __init__(self, queue_url, client=None):
+        self.queue_url = queue_url
+        self.client = client or boto3.client('sqs')
+
+    def receive(self, max_messages=SQS_BATCH_SIZE, wait_s=0.0):
+        response = self.client.receive_message(QueueUrl=self.queue_url,
+                                               MaxNumberOfMessages=min(max_messages, SQS_BATCH_SIZE),
+                                               WaitTimeSeconds=min(int(wait_s), SQS_MAX_WAIT_S))
+        return [Message(message['ReceiptHandle'], decode(message['Body']))
+                for message in response.get('Messages', [])]
+
+    def ack(self, receipts):
+        for batch in chunked(receipts, SQS_BATCH_SIZE):
+            self.client.delete_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[{"Id": str(index), "ReceiptHandle": receipt} for index, receipt in enumerate(batch)])
+
+    def nack(self, receipts):
+        for batch in chunked(receipts, SQS_BATCH_SIZE):
+            self.client.change_message_visibility_batch(
+                QueueUrl=self.queue_url,
+                Entries=[{"Id": str(index), "ReceiptHandle": receipt, "VisibilityTimeout": 0}
+                         for index, receipt in enumerate(batch)])
+
+
+def open_queue(spec, follow=False):
+    """Queue for a command-line spec: an SQS queue URL, '-' for stdin, or a file path."""
+    if spec.startswith("https://sqs.") or spec.startswith("https://queue.amazonaws.com"):
+        return SqsQueue(spec)
+    return FileQueue(spec, follow)
@@ -0,0 +1,176 @@
+"""
+Classified, persisted tagging failures.
+
+Every ARN that tag_resources / untag_resources could not tag is classified from
+its FailedResourcesMap entry (or the exception of a failed call) and appended
+to a failure log, together with the tags or keys it needed, so a later run can
+retry just those resources (see retry_failed.py) without rediscovering anything.
+
+    retryable   throttling, internal/service errors, timeouts, 5xx and 429
+    auth        access denied, expired or invalid credentials, 401 and 403
+    permanent   everything else: invalid or unsupported ARNs, tag limits, ...
+
+The log is JSON lines, appended to by every run and folded on read (the last
+line for an (action, ARN) wins); retry_failed.py rewrites it to the failures
+still outstanding.
+
+    AWS_TAGGER_FAILURES   path of the failure log (default: aws-tagger-failures.jsonl)
+"""
+import atexit
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+from aws_metrics import THROTTLE_ERROR_CODES
+
+DEFAULT_PATH = "aws-tagger-failures.jsonl"
+
+RETRYABLE = "retryable"
+PERMANENT = "permanent"
+AUTH = "auth"
+
+RETRYABLE_ERROR_CODES = THROTTLE_ERROR_CODES | {
+    "InternalServiceException",
+    "InternalServiceError",
+    "InternalFailure",
+    "InternalError",
+    "ServiceUnavailable",
+    "ServiceUnavailableException",
+    "RequestTimeout",
+    "RequestTimeoutException",
+    "RequestExpired",
+    "PriorRequestNotComplete",
+    "ConcurrentModificationException",
+    # botocore exceptions raised instead of a response
+    "ConnectTimeoutError",
+    "ReadTimeoutError",
+    "EndpointConnectionError",
+    "ConnectionClosedError",
+}
+
+AUTH_ERROR_CODES = {
+    "AccessDenied",
+    "AccessDeniedException",
+    "UnauthorizedOperation",
+    "UnauthorizedException",
+    "AuthFailure",
+    "ExpiredToken",
+    "ExpiredTokenException",
+    "InvalidClientTokenId",
+    "UnrecognizedClientException",
+    "SignatureDoesNotMatch",
+    "NoCredentials",
+}
+
+
+def classify(error_code, status_code=None):
+    """Failure class of an error code and optional HTTP status: 'retryable', 'auth' or 'permanent'."""
+    if error_code in AUTH_ERROR_CODES or status_code in (401, 403):
+        return AUTH
+    if error_code in RETRYABLE_ERROR_CODES or status_code == 429 or (status_code or 0) >= 500:
+        return RETRYABLE
+    return PERMANENT
+
+
+class FailureLog:
+    """
+    Append-only failure log; the file is only created once something fails.
+    With path=None entries are only kept in memory, in `entries`.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.file = None
+        self.entries = []
+        self.counts = Counter()
+
+    def write(self, entry):
+        if self.path is None:
+            self.entries.append(entry)
+            return
+        if self.file is None:
+            self.file = open(self.path, "a")
+        self.file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    def record(self, failed, action, tags=None, keys=None):
+        """
+        Record the failures of one tag or untag operation.
+
+        :param failed: Dictionary of ARN -> FailedResourcesMap entry (ErrorCode, StatusCode, ErrorMessage).
+        :param tags: Tags that were being applied (tag actions).
+        :param keys: Tag keys that were being removed (untag actions).
+        """
+        now = round(time.time(), 3)
+        for arn, details in failed.items():
+            failure_class = classify(details.get("ErrorCode"), details.get("StatusCode"))
+            entry = {"ts": now, "arn": arn, "action": action, "class": failure_class,
+                     "error_code": details.get("ErrorCode"), "status_code": details.get("StatusCode")}
+            if details.get("ErrorMessage"):
+                entry["error_message"] = details["ErrorMessage"]
+            if tags is not None:
+                entry["tags"] = dict(tags)
+            if keys is not None:
+                entry["keys"] = list(keys)
+            self.write(entry)
+            self.counts[failure_class] += 1
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def load_pending(path=DEFAULT_PATH):
+    """
+    Fold a failure log into the failures still outstanding.
+
+    :return: Dictionary of (action, ARN) -> last failure entry, with 'attempts' set to the
+        number of failures recorded for it.
+    """
+    pending = {}
+    attempts = Counter()
+    try:
+        with open(path) as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                key = (entry["action"], entry["arn"])
+                attempts[key] += entry.get("attempts", 1)
+                pending[key] = dict(entry, attempts=attempts[key])
+    except FileNotFoundError:
+        pass
+    return pending
+
+
+def rewrite(path, entries):
+    """Replace the log with `entries` (e.g. the pending set after a retry run)."""
+    temporary = f"{path}.tmp.{os.getpid()}"
+    with open(temporary, "w") as file:
+        for entry in entries:
+            file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+    os.replace(temporary, path)
+
+
+_default_log = None
+
+
+def close_default_log():
+    _default_log.close()
+    if _default_log.counts:
+        counts = ", ".join(f"{count} {failure_class}" for failure_class, count in sorted(_default_log.counts.items()))
+        print(f"Failed resources ({counts}) recorded in {_default_log.path}; "
+              f"retry them with: python retry_failed.py --file {_default_log.path}", file=sys.stderr)
+
+
+def default_failure_log():
+    """Return the process-wide failure log, at $AWS_TAGGER_FAILURES or the default path."""
+    global _default_log
+    if _default_log is None:
+        _default_log = FailureLog(os.environ.get("AWS_TAGGER_FAILURES") or DEFAULT_PATH)
+        atexit.register(close_default_log)
+    return _default_log
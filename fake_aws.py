@@ -0,0 +1,864 @@
+"""
+Fake of the AWS APIs this project calls, for offline benchmarks and load tests.
+
+FakeAWS holds a synthetic estate and hands out clients that look like boto3
+clients (same method names, keyword arguments, response shapes, page sizes and
+get_paginator). Every call is counted per (service, operation) and can be
+delayed by a latency distribution, rejected by per-operation rate limits with
+the service's throttling error, or partially failed in FailedResourcesMap.
+
+In-process:
+
+    fake = FakeAWS(latency="lognormal:5:0.5", rate_limits={"tag_resources": 5}, failure_rate=0.01)
+    fake.populate(resources=10000, tags_per_resource=8, clusters=20, services_per_cluster=10, tasks_per_service=5)
+    with fake.patch_boto3():
+        ...  # code calling boto3.client(...) now talks to the fake
+
+Over HTTP, for JSON-protocol services (tagging API, ECS, Logs, DMS), so that
+real boto3 clients can target it with endpoint_url:
+
+    python fake_aws.py --port 4566 --resources 100000 --latency lognormal:20:0.4 --rate-limit tag_resources=5
+    boto3.client("ecs", endpoint_url="http://127.0.0.1:4566")
+
+The query/REST-XML services (EC2, S3, ElastiCache, ELB, Lambda, EFS) are only
+served in-process.
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import boto3
+from botocore import xform_name
+from botocore.exceptions import ClientError, ParamValidationError
+
+# operation -> (input token, output token, limit key, default page size, result key)
+PAGINATION = {
+    ("resourcegroupstaggingapi", "get_resources"): ("PaginationToken", "PaginationToken", "ResourcesPerPage", 100, "ResourceTagMappingList"),
+    ("resourcegroupstaggingapi", "get_tag_keys"): ("PaginationToken", "PaginationToken", None, 500, "TagKeys"),
+    ("resourcegroupstaggingapi", "get_tag_values"): ("PaginationToken", "PaginationToken", None, 500, "TagValues"),
+    ("ecs", "list_clusters"): ("nextToken", "nextToken", "maxResults", 100, "clusterArns"),
+    ("ecs", "list_services"): ("nextToken", "nextToken", "maxResults", 10, "serviceArns"),
+    ("ecs", "list_tasks"): ("nextToken", "nextToken", "maxResults", 100, "taskArns"),
+    ("ecs", "list_container_instances"): ("nextToken", "nextToken", "maxResults", 100, "containerInstanceArns"),
+    ("ec2", "describe_instances"): ("NextToken", "NextToken", "MaxResults", 1000, "Reservations"),
+    ("ec2", "describe_vpcs"): ("NextToken", "NextToken", "MaxResults", 1000, "Vpcs"),
+    ("lambda", "list_functions"): ("Marker", "NextMarker", "MaxItems", 50, "Functions"),
+    ("dms", "describe_replication_tasks"): ("Marker", "Marker", "MaxRecords", 100, "ReplicationTasks"),
+    ("logs", "describe_log_groups"): ("nextToken", "nextToken", "limit", 50, "logGroups"),
+    ("elasticache", "describe_cache_clusters"): ("Marker", "Marker", "MaxRecords", 100, "CacheClusters"),
+    ("elasticache", "describe_replication_groups"): ("Marker", "Marker", "MaxRecords", 100, "ReplicationGroups"),
+    ("elasticache", "describe_cache_subnet_groups"): ("Marker", "Marker", "MaxRecords", 100, "CacheSubnetGroups"),
+    ("elbv2", "describe_load_balancers"): ("Marker", "NextMarker", "PageSize", 400, "LoadBalancers"),
+    ("efs", "describe_file_systems"): ("Marker", "NextMarker", "MaxItems", 100, "FileSystems"),
+}
+
+SERVICE_ALIASES = {"resourcegroupstaggingapi": "tagging"}
+
+# Error code each service uses when it throttles a caller
+THROTTLE_CODES = {"ec2": "RequestLimitExceeded", "s3": "SlowDown", "lambda": "TooManyRequestsException"}
+
+# X-Amz-Target prefix -> service, for the HTTP endpoint
+JSON_TARGETS = {
+    "ResourceGroupsTaggingAPI_20170126": "resourcegroupstaggingapi",
+    "AmazonEC2ContainerServiceV20141113": "ecs",
+    "Logs_20140328": "logs",
+    "AmazonDMSv20160101": "dms",
+}
+
+EPOCH = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def client_error(code, message, operation_name, status_code=400):
+    return ClientError({"Error": {"Code": code, "Message": message},
+                        "ResponseMetadata": {"HTTPStatusCode": status_code}}, operation_name)
+
+
+def parse_latency(spec):
+    """
+    Build a latency sampler returning seconds.
+
+    String specs are in milliseconds: 'fixed:5' (or '5'), 'uniform:2:10',
+    'lognormal:5:0.5' (median, sigma). A bare number is seconds. Callables
+    taking a random.Random are used as-is.
+    """
+    if spec is None or callable(spec):
+        return spec
+    if isinstance(spec, (int, float)):
+        return (lambda rng: spec) if spec else None
+    kind, _, args = str(spec).partition(":")
+    if not args:
+        kind, args = "fixed", kind
+    numbers = [float(value) for value in args.split(":")]
+    if kind == "fixed":
+        seconds = numbers[0] / 1000.0
+        return lambda rng: seconds
+    if kind == "uniform":
+        low, high = numbers[0] / 1000.0, numbers[1] / 1000.0
+        return lambda rng: rng.uniform(low, high)
+    if kind == "lognormal":
+        mu, sigma = math.log(numbers[0] / 1000.0), numbers[1]
+        return lambda rng: rng.lognormvariate(mu, sigma)
+    raise ValueError(f"Unknown latency distribution '{kind}' (expected fixed, uniform or lognormal)")
+
+
+class TokenBucket:
+    """Requests-per-second limiter; take() is non-blocking and reports whether a token was available."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(rate, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class FakePaginator:
+    def __init__(self, client, operation):
+        self.client = client
+        self.operation = operation
+        self.input_token, self.output_token, _, _, _ = PAGINATION[(client.service_name, operation)]
+
+    def paginate(self, PaginationConfig=None, **kwargs):
+        token = None
+        while True:
+            params = dict(kwargs)
+            if token:
+                params[self.input_token] = token
+            page = getattr(self.client, self.operation)(**params)
+            yield page
+            token = page.get(self.output_token)
+            if not token:
+                return
+
+
+class FakeClient:
+    """Stand-in for a boto3 client of one service; calls are dispatched to the FakeAWS backend."""
+
+    def __init__(self, backend, service_name, region_name):
+        self.backend = backend
+        self.service_name = service_name
+        self.region_name = region_name
+
+    def get_paginator(self, operation):
+        if (self.service_name, operation) not in PAGINATION:
+            raise NotImplementedError(f"No fake paginator for {self.service_name}.{operation}")
+        return FakePaginator(self, operation)
+
+    def __getattr__(self, operation):
+        handler = self.backend.handler(self.service_name, operation)
+        if handler is None:
+            raise AttributeError(f"Fake {self.service_name} client has no operation '{operation}'")
+
+        def call(**kwargs):
+            return self.backend.invoke(self.service_name, operation, handler, kwargs)
+
+        return call
+
+
+class FakeAWS:
+    """Synthetic AWS estate with boto3-shaped clients."""
+
+    def __init__(self, region="us-east-1", account_id="123456789012", latency_s=0.0, seed=0,
+                 latency=None, operation_latency=None, rate_limits=None, failure_rate=0.0,
+                 failure_codes=(("InternalServiceException", 500),), provision_s=0.0):
+        """
+        :param latency_s: Fixed latency per call in seconds.
+        :param latency: Latency spec for every call, see parse_latency (overrides latency_s).
+        :param operation_latency: Dict of operation name -> latency spec.
+        :param rate_limits: Dict of operation name (or '*') -> requests per second; calls over the
+            limit raise the service's throttling error.
+        :param failure_rate: Probability that each ARN in tag/untag_resources lands in FailedResourcesMap.
+        :param failure_codes: (ErrorCode, StatusCode) pairs drawn for those failures.
+        :param provision_s: Seconds a created ElastiCache cluster or replication group stays 'creating'.
+        """
+        self.region = region
+        self.account_id = account_id
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.throttled = Counter()
+
+        self.latency = parse_latency(latency if latency is not None else latency_s)
+        self.operation_latency = {op: parse_latency(spec) for op, spec in (operation_latency or {}).items()}
+        self.rate_limits = {op: TokenBucket(rate) for op, rate in (rate_limits or {}).items()}
+        self.failure_rate = failure_rate
+        self.failure_codes = list(failure_codes)
+        self.provision_s = provision_s
+
+        # Every taggable resource, as the tagging API sees it
+        self.tags = {}
+        self.clusters = {}
+        self.services = {}
+        self.tasks = {}
+        self.cluster_services = {}
+        self.cluster_tasks = {}
+        self.container_instances = {}
+        self.cluster_container_instances = {}
+        self.query_cache = {}
+        self.buckets = []
+        self.functions = []
+        self.instances = {}
+        self.vpcs = []
+        self.vpc_endpoints = []
+        self.replication_tasks = []
+        self.log_groups = []
+        self.cache_clusters = []
+        self.replication_groups = []
+        self.subnet_groups = {}
+        self.ready_at = {}
+        self.load_balancers = []
+        self.file_systems = []
+
+    # -- client plumbing -------------------------------------------------
+
+    def client(self, service_name, region_name=None, **kwargs):
+        return FakeClient(self, service_name, region_name or self.region)
+
+    @contextlib.contextmanager
+    def patch_boto3(self):
+        """
+        Route boto3.client() to this fake for the duration of the block. The fake's region is
+        also the session region then, unless one is configured already.
+        """
+        original = boto3.client
+        boto3.client = self.client
+        set_region = not os.environ.get("AWS_DEFAULT_REGION") and not boto3.session.Session().region_name
+        if set_region:
+            os.environ["AWS_DEFAULT_REGION"] = self.region
+        try:
+            yield self
+        finally:
+            boto3.client = original
+            if set_region:
+                os.environ.pop("AWS_DEFAULT_REGION", None)
+
+    def handler(self, service_name, operation):
+        return getattr(self, f"{SERVICE_ALIASES.get(service_name, service_name)}_{operation}", None)
+
+    def invoke(self, service_name, operation, handler, kwargs):
+        sampler = self.operation_latency.get(operation, self.latency)
+        with self.lock:
+            self.calls[(service_name, operation)] += 1
+            delay = sampler(self.random) if sampler else 0.0
+        if delay:
+            time.sleep(delay)
+
+        bucket = self.rate_limits.get(operation) or self.rate_limits.get("*")
+        if bucket is not None and not bucket.take():
+            with self.lock:
+                self.throttled[(service_name, operation)] += 1
+            raise client_error(THROTTLE_CODES.get(service_name, "ThrottlingException"), "Rate exceeded",
+                               "".join(part.capitalize() for part in operation.split("_")))
+
+        with self.lock:
+            return handler(**kwargs)
+
+    def reset_calls(self):
+        with self.lock:
+            self.calls.clear()
+            self.throttled.clear()
+
+    def paginate(self, service, operation, items, kwargs):
+        """Slice `items` into the page described by the operation's token and limit keys."""
+        input_token, output_token, limit_key, default_limit, result_key = PAGINATION[(service, operation)]
+        start = int(kwargs.get(input_token) or 0)
+        limit = int(kwargs.get(limit_key) or default_limit) if limit_key else default_limit
+        response = {result_key: items[start:start + limit]}
+        if start + limit < len(items):
+            response[output_token] = str(start + limit)
+        return response
+
+    def partial_failures(self, arns):
+        """Draw the FailedResourcesMap entries injected by failure_rate."""
+        failed = {}
+        if self.failure_rate:
+            for arn in arns:
+                if self.random.random() < self.failure_rate:
+                    code, status = self.random.choice(self.failure_codes)
+                    failed[arn] = {"StatusCode": status, "ErrorCode": code, "ErrorMessage": "Injected failure"}
+        return failed
+
+    # -- synthetic inventory ---------------------------------------------
+
+    def arn(self, service, resource, region=None, account=None):
+        region = self.region if region is None else region
+        account = self.account_id if account is None else account
+        return f"arn:aws:{service}:{region}:{account}:{resource}"
+
+    def random_tags(self, count, key_pool=40, value_pool=25):
+        keys = self.random.sample(range(key_pool), min(count, key_pool))
+        return {f"key{key}": f"value{self.random.randrange(value_pool)}" for key in keys}
+
+    def add_instance(self, instance_id, tags, private_ip=None, public_ip=None):
+        self.instances[instance_id] = {"private_ip": private_ip, "public_ip": public_ip}
+        self.tags[self.arn("ec2", f"instance/{instance_id}")] = tags
+
+    def populate(self, resources=1000, tags_per_resource=5, clusters=0, services_per_cluster=0,
+                 tasks_per_service=0, untagged_fraction=0.1, hosts_per_cluster=2):
+        """
+        Create a synthetic estate.
+
+        :param resources: Number of non-ECS resources, spread over S3, Lambda, EC2, VPC, DMS,
+            CloudWatch Logs, ElastiCache, ELBv2 and EFS.
+        :param tags_per_resource: Tags on each tagged resource.
+        :param clusters: ECS clusters, each with services_per_cluster services of tasks_per_service tasks,
+            placed on hosts_per_cluster EC2 container instances.
+        :param untagged_fraction: Share of resources created without tags.
+        """
+        def tags():
+            return {} if self.random.random() < untagged_fraction else self.random_tags(tags_per_resource)
+
+        for index in range(resources):
+            kind = index % 9
+            name = f"res-{index:07d}"
+            if kind == 0:
+                self.buckets.append(name)
+                self.tags[f"arn:aws:s3:::{name}"] = tags()
+            elif kind == 1:
+                arn = self.arn("lambda", f"function:{name}")
+                self.functions.append({"FunctionName": name, "FunctionArn": arn})
+                self.tags[arn] = tags()
+            elif kind == 2:
+                self.add_instance(f"i-{index:017x}", tags(), f"10.0.{index // 250 % 250}.{index % 250 + 1}")
+            elif kind == 3:
+                vpc_id = f"vpc-{index:017x}"
+                self.vpcs.append(vpc_id)
+                self.tags[self.arn("ec2", f"vpc/{vpc_id}")] = tags()
+            elif kind == 4:
+                arn = self.arn("dms", f"task:{name.upper()}")
+                self.replication_tasks.append({"ReplicationTaskIdentifier": name, "ReplicationTaskArn": arn,
+                                               "Status": "running", "ReplicationTaskSettings": "{}" * 200})
+                self.tags[arn] = tags()
+            elif kind == 5:
+                arn = self.arn("logs", f"log-group:/app/{name}")
+                self.log_groups.append({"logGroupName": f"/app/{name}", "arn": arn + ":*"})
+                self.tags[arn] = tags()
+            elif kind == 6:
+                arn = self.arn("elasticache", f"cluster:{name}")
+                self.cache_clusters.append({"CacheClusterId": name, "ARN": arn, "CacheClusterStatus": "available",
+                                            "Engine": "redis"})
+                self.tags[arn] = tags()
+            elif kind == 7:
+                arn = self.arn("elasticloadbalancing", f"loadbalancer/app/{name}/{index:016x}")
+                self.load_balancers.append({"LoadBalancerName": name, "LoadBalancerArn": arn})
+                self.tags[arn] = tags()
+            else:
+                file_system_id = f"fs-{index:08x}"
+                arn = self.arn("elasticfilesystem", f"file-system/{file_system_id}")
+                self.file_systems.append({"FileSystemId": file_system_id, "FileSystemArn": arn})
+                self.tags[arn] = tags()
+
+        for cluster_index in range(clusters):
+            cluster_name = f"acme-prvl-app{cluster_index}-2024-1-2-3"
+            cluster_arn = self.arn("ecs", f"cluster/{cluster_name}")
+            self.clusters[cluster_arn] = cluster_name
+            self.cluster_services[cluster_arn] = []
+            self.cluster_tasks[cluster_arn] = []
+            self.cluster_container_instances[cluster_arn] = []
+            self.tags[cluster_arn] = tags()
+
+            for host_index in range(hosts_per_cluster):
+                instance_id = f"i-0ec5{cluster_index:06x}{host_index:07x}"
+                self.add_instance(instance_id, tags(), f"10.1.{cluster_index % 250}.{host_index + 1}",
+                                  f"52.0.{cluster_index % 250}.{host_index + 1}")
+                container_instance_arn = self.arn(
+                    "ecs", f"container-instance/{cluster_name}/{cluster_index:04x}{host_index:028x}")
+                self.container_instances[container_instance_arn] = (cluster_arn, instance_id)
+                self.cluster_container_instances[cluster_arn].append(container_instance_arn)
+
+            hosts = self.cluster_container_instances[cluster_arn]
+            for service_index in range(services_per_cluster):
+                service_arn = self.arn("ecs", f"service/{cluster_name}/svc-{service_index}")
+                self.services[service_arn] = cluster_arn
+                self.cluster_services[cluster_arn].append(service_arn)
+                self.tags[service_arn] = tags()
+                for task_index in range(tasks_per_service):
+                    task_arn = self.arn("ecs", f"task/{cluster_name}/{service_index:04x}{task_index:028x}")
+                    host = hosts[(service_index + task_index) % len(hosts)] if hosts else None
+                    created = EPOCH + datetime.timedelta(minutes=service_index * tasks_per_service + task_index)
+                    self.tasks[task_arn] = (cluster_arn, service_arn, host, created)
+                    self.cluster_tasks[cluster_arn].append(task_arn)
+                    self.tags[task_arn] = tags()
+        return self
+
+    def cluster_arn(self, cluster):
+        if cluster is None:
+            return next(iter(self.clusters), None)
+        if cluster.startswith("arn:"):
+            return cluster
+        return self.arn("ecs", f"cluster/{cluster}")
+
+    def tag_list(self, arn, key="Key", value="Value"):
+        return [{key: k, value: v} for k, v in self.tags.get(arn, {}).items()]
+
+    # -- resourcegroupstaggingapi ----------------------------------------
+
+    def tagging_get_resources(self, ResourceARNList=None, TagFilters=None, ResourceTypeFilters=None, **kwargs):
+        if ResourceARNList is not None and len(ResourceARNList) > 100:
+            raise ParamValidationError(report="ResourceARNList accepts at most 100 ARNs")
+
+        # Filter once per query and serve later pages from the cached result
+        query = repr((ResourceARNList, TagFilters, ResourceTypeFilters))
+        candidates = self.query_cache.get(query) if kwargs.get("PaginationToken") else None
+        if candidates is None:
+            if ResourceARNList is not None:
+                candidates = [arn for arn in ResourceARNList if arn in self.tags]
+            else:
+                candidates = list(self.tags)
+            if ResourceTypeFilters:
+                patterns = [f"arn:aws:{type_filter.replace(':', ':*:*:', 1)}" for type_filter in ResourceTypeFilters]
+                candidates = [arn for arn in candidates if any(self.type_matches(arn, pattern) for pattern in patterns)]
+            for tag_filter in TagFilters or []:
+                key, values = tag_filter["Key"], tag_filter.get("Values")
+                candidates = [arn for arn in candidates
+                              if key in self.tags[arn] and (not values or self.tags[arn][key] in values)]
+            self.query_cache[query] = candidates
+
+        page = self.paginate("resourcegroupstaggingapi", "get_resources", candidates, kwargs)
+        page["ResourceTagMappingList"] = [{"ResourceARN": arn, "Tags": self.tag_list(arn)}
+                                          for arn in page["ResourceTagMappingList"]]
+        return page
+
+    def tagging_get_tag_keys(self, **kwargs):
+        keys = sorted({key for tags in self.tags.values() for key in tags})
+        return self.paginate("resourcegroupstaggingapi", "get_tag_keys", keys, kwargs)
+
+    def tagging_get_tag_values(self, Key, **kwargs):
+        values = sorted({tags[Key] for tags in self.tags.values() if Key in tags})
+        return self.paginate("resourcegroupstaggingapi", "get_tag_values", values, kwargs)
+
+    @staticmethod
+    def type_matches(arn, pattern):
+        # pattern is 'arn:aws:<service>:*:*:<type>' or 'arn:aws:<service>'
+        arn_parts = arn.split(":", 5)
+        pattern_parts = pattern.split(":", 5)
+        if arn_parts[2] != pattern_parts[2]:
+            return False
+        if len(pattern_parts) < 6:
+            return True
+        resource = arn_parts[5]
+        return resource.startswith(pattern_parts[5] + "/") or resource.startswith(pattern_parts[5] + ":")
+
+    def tagging_tag_resources(self, ResourceARNList, Tags):
+        if len(ResourceARNList) > 20:
+            raise ParamValidationError(report="ResourceARNList accepts at most 20 ARNs")
+        failed = self.partial_failures(ResourceARNList)
+        for arn in ResourceARNList:
+            if arn in failed:
+                continue
+            if arn not in self.tags:
+                failed[arn] = {"StatusCode": 400, "ErrorCode": "InvalidParameterException",
+                               "ErrorMessage": f"Resource {arn} not found"}
+                continue
+            self.tags[arn].update(Tags)
+        return {"FailedResourcesMap": failed}
+
+    def tagging_untag_resources(self, ResourceARNList, TagKeys):
+        if len(ResourceARNList) > 20:
+            raise ParamValidationError(report="ResourceARNList accepts at most 20 ARNs")
+        failed = self.partial_failures(ResourceARNList)
+        for arn in ResourceARNList:
+            if arn in failed:
+                continue
+            if arn not in self.tags:
+                failed[arn] = {"StatusCode": 400, "ErrorCode": "InvalidParameterException",
+                               "ErrorMessage": f"Resource {arn} not found"}
+                continue
+            for key in TagKeys:
+                self.tags[arn].pop(key, None)
+        return {"FailedResourcesMap": failed}
+
+    # -- ecs -------------------------------------------------------------
+
+    def ecs_list_clusters(self, **kwargs):
+        return self.paginate("ecs", "list_clusters", list(self.clusters), kwargs)
+
+    def ecs_list_services(self, cluster=None, **kwargs):
+        services = self.cluster_services.get(self.cluster_arn(cluster), [])
+        return self.paginate("ecs", "list_services", services, kwargs)
+
+    def ecs_list_tasks(self, cluster=None, serviceName=None, **kwargs):
+        tasks = self.cluster_tasks.get(self.cluster_arn(cluster), [])
+        if serviceName is not None:
+            tasks = [arn for arn in tasks
+                     if self.tasks[arn][1] == serviceName or self.tasks[arn][1].endswith("/" + serviceName)]
+        return self.paginate("ecs", "list_tasks", tasks, kwargs)
+
+    def ecs_list_container_instances(self, cluster=None, **kwargs):
+        instances = self.cluster_container_instances.get(self.cluster_arn(cluster), [])
+        return self.paginate("ecs", "list_container_instances", instances, kwargs)
+
+    def ecs_describe_clusters(self, clusters=None, include=None):
+        if len(clusters or []) > 100:
+            raise ParamValidationError(report="clusters accepts at most 100 entries")
+        found, failures = [], []
+        for cluster in clusters or []:
+            cluster_arn = self.cluster_arn(cluster)
+            if cluster_arn not in self.clusters:
+                failures.append({"arn": cluster_arn, "reason": "MISSING"})
+                continue
+            item = {"clusterArn": cluster_arn, "clusterName": self.clusters[cluster_arn], "status": "ACTIVE"}
+            if include and "TAGS" in include:
+                item["tags"] = self.tag_list(cluster_arn, "key", "value")
+            found.append(item)
+        return {"clusters": found, "failures": failures}
+
+    def ecs_describe_services(self, services, cluster=None, include=None):
+        if len(services) > 10:
+            raise ParamValidationError(report="services accepts at most 10 entries")
+        cluster_arn = self.cluster_arn(cluster)
+        found, failures = [], []
+        for service in services:
+            service_arn = service if service.startswith("arn:") else self.arn(
+                "ecs", f"service/{self.clusters.get(cluster_arn, '')}/{service}")
+            if self.services.get(service_arn) != cluster_arn:
+                failures.append({"arn": service_arn, "reason": "MISSING"})
+                continue
+            item = {"serviceArn": service_arn, "serviceName": service_arn.split("/")[-1],
+                    "clusterArn": cluster_arn, "status": "ACTIVE"}
+            if include and "TAGS" in include:
+                item["tags"] = self.tag_list(service_arn, "key", "value")
+            found.append(item)
+        return {"services": found, "failures": failures}
+
+    def ecs_describe_tasks(self, tasks, cluster=None, include=None):
+        if len(tasks) > 100:
+            raise ParamValidationError(report="tasks accepts at most 100 entries")
+        cluster_arn = self.cluster_arn(cluster)
+        found, failures = [], []
+        for task in tasks:
+            task_arn = task if task.startswith("arn:") else self.arn(
+                "ecs", f"task/{self.clusters.get(cluster_arn, '')}/{task}")
+            if task_arn not in self.tasks:
+                failures.append({"arn": task_arn, "reason": "MISSING"})
+                continue
+            owner, service_arn, host, created = self.tasks[task_arn]
+            item = {"taskArn": task_arn, "clusterArn": owner, "lastStatus": "RUNNING",
+                    "group": f"service:{service_arn.split('/')[-1]}", "createdAt": created,
+                    "containers": [{"name": "app", "runtimeId": task_arn.split("/")[-1][:12]}]}
+            if host:
+                item["containerInstanceArn"] = host
+            if include and "TAGS" in include:
+                item["tags"] = self.tag_list(task_arn, "key", "value")
+            found.append(item)
+        return {"tasks": found, "failures": failures}
+
+    def ecs_describe_container_instances(self, containerInstances, cluster=None):
+        if len(containerInstances) > 100:
+            raise ParamValidationError(report="containerInstances accepts at most 100 entries")
+        found, failures = [], []
+        for container_instance_arn in containerInstances:
+            if container_instance_arn not in self.container_instances:
+                failures.append({"arn": container_instance_arn, "reason": "MISSING"})
+                continue
+            found.append({"containerInstanceArn": container_instance_arn,
+                          "ec2InstanceId": self.container_instances[container_instance_arn][1],
+                          "status": "ACTIVE"})
+        return {"containerInstances": found, "failures": failures}
+
+    def ecs_list_tags_for_resource(self, resourceArn):
+        if resourceArn not in self.tags:
+            raise client_error("InvalidParameterException", "The specified resource could not be found.",
+                               "ListTagsForResource")
+        return {"tags": self.tag_list(resourceArn, "key", "value")}
+
+    def ecs_tag_resource(self, resourceArn, tags):
+        if resourceArn not in self.tags:
+            raise client_error("InvalidParameterException", "The specified resource could not be found.",
+                               "TagResource")
+        self.tags[resourceArn].update({tag["key"]: tag["value"] for tag in tags})
+        return {}
+
+    # -- ec2 -------------------------------------------------------------
+
+    def ec2_arn(self, resource_id):
+        kind = {"i": "instance", "vpc": "vpc", "vpce": "vpc-endpoint"}.get(resource_id.split("-")[0], "resource")
+        return self.arn("ec2", f"{kind}/{resource_id}")
+
+    def ec2_describe_instances(self, InstanceIds=None, Filters=None, **kwargs):
+        instances = list(self.instances)
+        if InstanceIds:
+            missing = [instance_id for instance_id in InstanceIds if instance_id not in self.instances]
+            if missing:
+                raise client_error("InvalidInstanceID.NotFound",
+                                   f"The instance IDs '{', '.join(missing)}' do not exist", "DescribeInstances")
+            instances = list(InstanceIds)
+        for instance_filter in Filters or []:
+            values = set(instance_filter["Values"])
+            if instance_filter["Name"] == "instance-id":
+                instances = [instance_id for instance_id in instances if instance_id in values]
+            elif instance_filter["Name"].startswith("tag:"):
+                key = instance_filter["Name"][4:]
+                instances = [instance_id for instance_id in instances
+                             if self.tags[self.ec2_arn(instance_id)].get(key) in values]
+        reservations = []
+        for instance_id in instances:
+            instance = {"InstanceId": instance_id, "Tags": self.tag_list(self.ec2_arn(instance_id))}
+            addresses = self.instances[instance_id]
+            if addresses["private_ip"]:
+                instance["PrivateIpAddress"] = addresses["private_ip"]
+            if addresses["public_ip"]:
+                instance["PublicIpAddress"] = addresses["public_ip"]
+            reservations.append({"OwnerId": self.account_id, "Instances": [instance]})
+        return self.paginate_ec2("describe_instances", reservations, kwargs)
+
+    def ec2_describe_vpcs(self, **kwargs):
+        vpcs = [{"VpcId": vpc_id, "OwnerId": self.account_id, "Tags": self.tag_list(self.ec2_arn(vpc_id))}
+                for vpc_id in self.vpcs]
+        return self.paginate_ec2("describe_vpcs", vpcs, kwargs)
+
+    def paginate_ec2(self, operation, items, kwargs):
+        """EC2 describe calls only page when asked to: without MaxResults or NextToken they return everything."""
+        if not kwargs.get("MaxResults") and not kwargs.get("NextToken"):
+            return {PAGINATION[("ec2", operation)][4]: items}
+        return self.paginate("ec2", operation, items, kwargs)
+
+    def ec2_describe_vpc_endpoints(self, **kwargs):
+        return {"VpcEndpoints": [{"VpcEndpointId": endpoint_id} for endpoint_id in self.vpc_endpoints]}
+
+    def ec2_create_tags(self, Resources, Tags):
+        for resource_id in Resources:
+            if self.ec2_arn(resource_id) not in self.tags:
+                raise client_error("InvalidID", f"The ID '{resource_id}' is not valid", "CreateTags")
+        for resource_id in Resources:
+            self.tags[self.ec2_arn(resource_id)].update({tag["Key"]: tag["Value"] for tag in Tags})
+        return {}
+
+    # -- s3 / lambda / dms / logs / elasticache / elb / efs --------------
+
+    def s3_list_buckets(self, **kwargs):
+        return {"Buckets": [{"Name": name} for name in self.buckets]}
+
+    def lambda_list_functions(self, **kwargs):
+        return self.paginate("lambda", "list_functions", self.functions, kwargs)
+
+    def dms_describe_replication_tasks(self, Filters=None, WithoutSettings=False, **kwargs):
+        tasks = self.replication_tasks
+        for task_filter in Filters or []:
+            values = set(task_filter["Values"])
+            field = {"replication-task-id": "ReplicationTaskIdentifier",
+                     "replication-task-arn": "ReplicationTaskArn"}.get(task_filter["Name"])
+            if field:
+                tasks = [task for task in tasks if task[field] in values]
+        if not tasks:
+            raise client_error("ResourceNotFoundFault", "No replication tasks found", "DescribeReplicationTasks")
+        if WithoutSettings:
+            tasks = [{key: value for key, value in task.items() if key != "ReplicationTaskSettings"}
+                     for task in tasks]
+        return self.paginate("dms", "describe_replication_tasks", tasks, kwargs)
+
+    def logs_describe_log_groups(self, logGroupNamePrefix=None, **kwargs):
+        groups = self.log_groups
+        if logGroupNamePrefix:
+            groups = [group for group in groups if group["logGroupName"].startswith(logGroupNamePrefix)]
+        return self.paginate("logs", "describe_log_groups", groups, kwargs)
+
+    def refresh_status(self, items, id_key, status_key):
+        now = time.monotonic()
+        for item in items:
+            if item[status_key] == "creating" and self.ready_at.get(item[id_key], 0) <= now:
+                item[status_key] = "available"
+
+    def elasticache_describe_cache_subnet_groups(self, CacheSubnetGroupName=None, **kwargs):
+        groups = [{"CacheSubnetGroupName": name, "Subnets": [{"SubnetIdentifier": subnet} for subnet in subnets]}
+                  for name, subnets in self.subnet_groups.items()
+                  if CacheSubnetGroupName is None or name == CacheSubnetGroupName]
+        if CacheSubnetGroupName and not groups:
+            raise client_error("CacheSubnetGroupNotFoundFault", f"{CacheSubnetGroupName} not found",
+                               "DescribeCacheSubnetGroups")
+        return self.paginate("elasticache", "describe_cache_subnet_groups", groups, kwargs)
+
+    def elasticache_create_cache_subnet_group(self, CacheSubnetGroupName, CacheSubnetGroupDescription, SubnetIds,
+                                              **kwargs):
+        if CacheSubnetGroupName in self.subnet_groups:
+            raise client_error("CacheSubnetGroupAlreadyExists", f"{CacheSubnetGroupName} already exists",
+                               "CreateCacheSubnetGroup")
+        self.subnet_groups[CacheSubnetGroupName] = list(SubnetIds)
+        return {"CacheSubnetGroup": {"CacheSubnetGroupName": CacheSubnetGroupName}}
+
+    def check_subnet_group(self, name, operation_name):
+        if name and name not in self.subnet_groups:
+            raise client_error("CacheSubnetGroupNotFoundFault", f"{name} not found", operation_name)
+
+    def elasticache_create_cache_cluster(self, CacheClusterId, Tags=None, CacheSubnetGroupName=None, **kwargs):
+        if any(cluster["CacheClusterId"] == CacheClusterId for cluster in self.cache_clusters):
+            raise client_error("CacheClusterAlreadyExists", f"{CacheClusterId} already exists", "CreateCacheCluster")
+        self.check_subnet_group(CacheSubnetGroupName, "CreateCacheCluster")
+        arn = self.arn("elasticache", f"cluster:{CacheClusterId}")
+        cluster = {"CacheClusterId": CacheClusterId, "ARN": arn, "CacheClusterStatus": "creating", "Engine": "redis"}
+        self.cache_clusters.append(cluster)
+        self.ready_at[CacheClusterId] = time.monotonic() + self.provision_s
+        self.tags[arn] = {tag["Key"]: tag["Value"] for tag in Tags or []}
+        return {"CacheCluster": dict(cluster)}
+
+    def elasticache_create_replication_group(self, ReplicationGroupId, ReplicationGroupDescription, Tags=None,
+                                             CacheSubnetGroupName=None, **kwargs):
+        if any(group["ReplicationGroupId"] == ReplicationGroupId for group in self.replication_groups):
+            raise client_error("ReplicationGroupAlreadyExistsFault", f"{ReplicationGroupId} already exists",
+                               "CreateReplicationGroup")
+        self.check_subnet_group(CacheSubnetGroupName, "CreateReplicationGroup")
+        arn = self.arn("elasticache", f"replicationgroup:{ReplicationGroupId}")
+        group = {"ReplicationGroupId": ReplicationGroupId, "ARN": arn, "Status": "creating",
+                 "Description": ReplicationGroupDescription}
+        self.replication_groups.append(group)
+        self.ready_at[ReplicationGroupId] = time.monotonic() + self.provision_s
+        self.tags[arn] = {tag["Key"]: tag["Value"] for tag in Tags or []}
+        return {"ReplicationGroup": dict(group)}
+
+    def elasticache_describe_replication_groups(self, ReplicationGroupId=None, **kwargs):
+        groups = self.replication_groups
+        if ReplicationGroupId:
+            groups = [group for group in groups if group["ReplicationGroupId"] == ReplicationGroupId]
+            if not groups:
+                raise client_error("ReplicationGroupNotFoundFault", f"{ReplicationGroupId} not found",
+                                   "DescribeReplicationGroups")
+        self.refresh_status(groups, "ReplicationGroupId", "Status")
+        return self.paginate("elasticache", "describe_replication_groups", [dict(group) for group in groups], kwargs)
+
+    def elasticache_describe_cache_clusters(self, CacheClusterId=None, **kwargs):
+        clusters = self.cache_clusters
+        if CacheClusterId:
+            clusters = [cluster for cluster in clusters if cluster["CacheClusterId"] == CacheClusterId]
+            if not clusters:
+                raise client_error("CacheClusterNotFound", f"{CacheClusterId} not found", "DescribeCacheClusters")
+        self.refresh_status(clusters, "CacheClusterId", "CacheClusterStatus")
+        return self.paginate("elasticache", "describe_cache_clusters", [dict(cluster) for cluster in clusters], kwargs)
+
+    def elb_describe_load_balancers(self, **kwargs):
+        return {"LoadBalancerDescriptions": []}
+
+    def elbv2_describe_load_balancers(self, **kwargs):
+        return self.paginate("elbv2", "describe_load_balancers", self.load_balancers, kwargs)
+
+    def elbv2_describe_tags(self, ResourceArns):
+        if len(ResourceArns) > 20:
+            raise ParamValidationError(report="ResourceArns accepts at most 20 ARNs")
+        return {"TagDescriptions": [{"ResourceArn": arn, "Tags": self.tag_list(arn)} for arn in ResourceArns]}
+
+    def efs_describe_file_systems(self, **kwargs):
+        file_systems = [dict(file_system, Tags=self.tag_list(file_system["FileSystemArn"]))
+                        for file_system in self.file_systems]
+        return self.paginate("efs", "describe_file_systems", file_systems, kwargs)
+
+    def sts_get_caller_identity(self, **kwargs):
+        return {"Account": self.account_id, "Arn": f"arn:aws:iam::{self.account_id}:user/fake", "UserId": "FAKE"}
+
+    def __repr__(self):
+        return (f"FakeAWS({len(self.tags)} resources, {len(self.clusters)} clusters, "
+                f"{len(self.services)} services, {len(self.tasks)} tasks)")
+
+
+class FakeAWSRequestHandler(BaseHTTPRequestHandler):
+    """Serves JSON-protocol (x-amz-json-1.1) operations from a FakeAWS instance."""
+
+    backend = None
+
+    def do_POST(self):
+        target = self.headers.get("X-Amz-Target", "")
+        prefix, _, operation_name = target.partition(".")
+        service = JSON_TARGETS.get(prefix)
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if service is None:
+            return self.reply(400, {"__type": "UnknownOperationException", "message": f"Unsupported target {target}"})
+
+        operation = xform_name(operation_name)
+        handler = self.backend.handler(service, operation)
+        if handler is None:
+            return self.reply(400, {"__type": "UnknownOperationException", "message": f"{target} is not implemented"})
+        try:
+            params = json.loads(body or b"{}")
+            response = self.backend.invoke(service, operation, handler, params)
+        except ClientError as e:
+            error = e.response["Error"]
+            return self.reply(e.response["ResponseMetadata"]["HTTPStatusCode"],
+                              {"__type": error["Code"], "message": error["Message"]})
+        except (ParamValidationError, TypeError, KeyError) as e:
+            return self.reply(400, {"__type": "ValidationException", "message": str(e)})
+        self.reply(200, response)
+
+    def reply(self, status, payload):
+        body = json.dumps(payload, default=lambda value: value.timestamp()).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/x-amz-json-1.1")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("x-amzn-RequestId", "fake-aws")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(backend, host="127.0.0.1", port=4566):
+    """Return an HTTP server for `backend`; call serve_forever() on it (or run it in a thread)."""
+    handler = type("BoundFakeAWSRequestHandler", (FakeAWSRequestHandler,), {"backend": backend})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def parse_assignments(values, convert):
+    assignments = {}
+    for value in values or []:
+        key, _, setting = value.partition("=")
+        assignments[key] = convert(setting)
+    return assignments
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a fake AWS tagging backend on localhost.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4566)
+    parser.add_argument("--resources", type=int, default=10000)
+    parser.add_argument("--tags-per-resource", type=int, default=8)
+    parser.add_argument("--clusters", type=int, default=10)
+    parser.add_argument("--services-per-cluster", type=int, default=10)
+    parser.add_argument("--tasks-per-service", type=int, default=5)
+    parser.add_argument("--latency", help="Latency for every call: fixed:MS, uniform:MIN:MAX or lognormal:MEDIAN:SIGMA.")
+    parser.add_argument("--operation-latency", action="append", metavar="OPERATION=SPEC",
+                        help="Per-operation latency, e.g. get_resources=lognormal:40:0.3.")
+    parser.add_argument("--rate-limit", action="append", metavar="OPERATION=RPS",
+                        help="Per-operation requests per second ('*' for all), e.g. tag_resources=5.")
+    parser.add_argument("--failure-rate", type=float, default=0.0,
+                        help="Share of ARNs returned in FailedResourcesMap by tag/untag_resources.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    backend = FakeAWS(latency=args.latency, seed=args.seed,
+                      operation_latency=parse_assignments(args.operation_latency, str),
+                      rate_limits=parse_assignments(args.rate_limit, float),
+                      failure_rate=args.failure_rate)
+    backend.populate(resources=args.resources, tags_per_resource=args.tags_per_resource, clusters=args.clusters,
+                     services_per_cluster=args.services_per_cluster, tasks_per_service=args.tasks_per_service)
+    server = serve(backend, args.host, args.port)
+    print(f"Serving {backend!r} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Calls: {dict(backend.calls)}")
+        print(f"Throttled: {dict(backend.throttled)}")
+
+
+if __name__ == "__main__":
+    main()
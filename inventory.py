@@ -0,0 +1,196 @@
+import boto3
+from botocore.exceptions import NoCredentialsError, PartialCredentialsError, ClientError
+
+from profiling import span
+
+# (service, resource type in the ARN) -> resource type name used by the scripts
+ARN_RESOURCE_TYPES = {
+    ("ec2", "instance"): "ec2",
+    ("ec2", "vpc"): "vpc",
+    ("ec2", "vpc-endpoint"): "vpc-endpoint",
+    ("s3", ""): "s3",
+    ("elasticfilesystem", "file-system"): "efs",
+    ("lambda", "function"): "lambda",
+    ("ecs", "cluster"): "ecs-cluster",
+    ("ecs", "service"): "ecs-service",
+    ("ecs", "task"): "ecs-task",
+    ("dms", "task"): "dms",
+    ("elasticloadbalancing", "loadbalancer"): "elb",
+    ("logs", "log-group"): "logs",
+    ("elasticache", "cluster"): "redis",
+    ("elasticache", "replicationgroup"): "redis",
+}
+
+
+def split_arn_resource(arn):
+    """Split an ARN into (service, resource type, resource id)."""
+    parts = arn.split(":", 5)
+    if len(parts) < 6:
+        return "", "", arn
+    service, resource = parts[2], parts[5]
+    positions = [resource.find(separator) for separator in ("/", ":") if separator in resource]
+    if positions:
+        split_at = min(positions)
+        return service, resource[:split_at], resource[split_at + 1:]
+    if service == "s3":
+        return service, "", resource
+    return service, resource, ""
+
+
+def resource_type_from_arn(arn):
+    """Return the script-level resource type name for an ARN (e.g. 'ecs-service')."""
+    service, resource_type, _ = split_arn_resource(arn)
+    return ARN_RESOURCE_TYPES.get((service, resource_type), f"{service}:{resource_type}" if resource_type else service)
+
+
+def tagging_type_from_arn(arn):
+    """Return the tagging API ResourceTypeFilters value for an ARN (e.g. 'ecs:service', 's3')."""
+    service, resource_type, _ = split_arn_resource(arn)
+    return f"{service}:{resource_type}" if resource_type else service
+
+
+def resource_name_from_arn(arn):
+    """Return the last path segment of the resource id (service name, bucket, function...)."""
+    service, resource_type, resource_id = split_arn_resource(arn)
+    if service == "logs":
+        # Log group names contain slashes; the ARN may end with ':*'
+        return resource_id.removesuffix(":*")
+    return resource_id.rstrip("/").split("/")[-1] or resource_type
+
+
+class NameTrie:
+    """Prefix trie from resource name to the ARNs carrying that name."""
+
+    def __init__(self):
+        self.root = {}
+
+    def insert(self, name, arn):
+        node = self.root
+        for char in name:
+            node = node.setdefault(char, {})
+        node.setdefault(None, set()).add(arn)
+
+    def remove(self, name, arn):
+        node = self.root
+        for char in name:
+            node = node.get(char)
+            if node is None:
+                return
+        node.get(None, set()).discard(arn)
+
+    def with_prefix(self, prefix):
+        """Return every ARN whose name starts with `prefix`."""
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return set()
+        arns = set()
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            for key, child in node.items():
+                if key is None:
+                    arns.update(child)
+                else:
+                    stack.append(child)
+        return arns
+
+
+class Inventory:
+    """
+    In-memory resource inventory indexed for selection queries.
+
+    Keeps a type index, a tag key -> value -> ARNs inverted index and a name
+    prefix trie, so lookups never scan every resource.
+    """
+
+    def __init__(self):
+        self.tags = {}
+        self.names = {}
+        self.types = {}
+        self.by_type = {}
+        self.tag_index = {}
+        self.name_trie = NameTrie()
+
+    def __len__(self):
+        return len(self.tags)
+
+    def __contains__(self, arn):
+        return arn in self.tags
+
+    def __iter__(self):
+        return iter(self.tags)
+
+    def add(self, arn, tags, name=None):
+        """Add or replace a resource. The name defaults to its Name tag, then its ARN."""
+        if arn in self.tags:
+            self.remove(arn)
+        name = name or tags.get("Name") or resource_name_from_arn(arn)
+        resource_type = resource_type_from_arn(arn)
+
+        self.tags[arn] = dict(tags)
+        self.names[arn] = name
+        self.types[arn] = resource_type
+        self.by_type.setdefault(resource_type, set()).add(arn)
+        for key, value in tags.items():
+            self.tag_index.setdefault(key, {}).setdefault(value, set()).add(arn)
+        self.name_trie.insert(name, arn)
+
+    def remove(self, arn):
+        tags = self.tags.pop(arn, None)
+        if tags is None:
+            return
+        self.by_type[self.types.pop(arn)].discard(arn)
+        for key, value in tags.items():
+            self.tag_index[key][value].discard(arn)
+        self.name_trie.remove(self.names.pop(arn), arn)
+
+    def get_tags(self, arn):
+        return self.tags.get(arn, {})
+
+    def arns(self):
+        return set(self.tags)
+
+    def with_type(self, resource_type):
+        return set(self.by_type.get(resource_type, ()))
+
+    def with_tag(self, key, value=None):
+        """Return ARNs carrying tag `key`, optionally restricted to one value."""
+        values = self.tag_index.get(key, {})
+        if value is not None:
+            return set(values.get(value, ()))
+        arns = set()
+        for value_arns in values.values():
+            arns.update(value_arns)
+        return arns
+
+    def with_name_prefix(self, prefix):
+        return self.name_trie.with_prefix(prefix)
+
+
+def load_inventory(resource_type_filters=None, region=None, client=None):
+    """
+    Build an Inventory from resourcegroupstaggingapi.get_resources.
+
+    :param resource_type_filters: Optional tagging API type filters (e.g. ['ecs:service']).
+    :param region: AWS region, defaults to the session region.
+    :param client: Optional resourcegroupstaggingapi client to read with; replaces `region`.
+    :return: Inventory of every resource the tagging API knows about.
+    """
+    inventory = Inventory()
+    try:
+        client = client or boto3.client('resourcegroupstaggingapi', region_name=region)
+        paginator = client.get_paginator('get_resources')
+        kwargs = {"ResourceTypeFilters": resource_type_filters} if resource_type_filters else {}
+        with span("discovery"):
+            for page in paginator.paginate(**kwargs):
+                for resource in page.get('ResourceTagMappingList', []):
+                    tags = {tag['Key']: tag['Value'] for tag in resource.get('Tags', [])}
+                    inventory.add(resource['ResourceARN'], tags)
+
+    except (NoCredentialsError, PartialCredentialsError):
+        print("AWS credentials not found or incomplete. Please configure your credentials.")
+    except ClientError as e:
+        print(f"AWS ClientError: {e.response['Error']['Message']}")
+    return inventory
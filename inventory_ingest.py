@@ -0,0 +1,404 @@
+"""
+Keep an inventory snapshot fresh from AWS Config and CloudTrail change records.
+
+Instead of re-listing the estate, change records are applied to the inventory
+as streaming upserts and deletes:
+
+    AWS Config          configuration item change notifications (SNS/SQS or EventBridge),
+                        and configurationItems lists from Config snapshot files
+    CloudTrail          tag and untag calls (tagging API, ECS, EC2, Lambda, S3, ElastiCache),
+                        ECS and ElastiCache creates (see tag_watcher) and deletes
+    EventBridge         'Tag Change on Resource' events
+
+Records come from an event_queue queue (SQS, a JSON lines file or stdin).
+
+A resource type is re-listed with get_resources only when the change stream has
+a gap for it: a change for a resource the inventory has never seen (its create
+was missed), a type the inventory has never listed, or a stream that was last
+drained longer ago than the queue's retention, after which any type may have
+lost events. Oversized Config notifications, which leave out the item, refresh
+just their resource. The ingest state is kept in the snapshot's metadata.
+
+    python inventory_ingest.py --snapshot inventory.snap --queue config-events.jsonl --once
+    python inventory_ingest.py --snapshot inventory.snap --queue https://sqs.../inventory-changes
+"""
+import argparse
+import sys
+import time
+from collections import Counter, namedtuple
+
+import boto3
+from botocore.exceptions import NoCredentialsError, PartialCredentialsError, ClientError
+
+from compact_inventory import load_compact_inventory
+from event_queue import events_in, open_queue
+from inventory import tagging_type_from_arn
+from inventory_snapshot import SnapshotError, SnapshotInventory, write_snapshot
+from tag_watcher import created_resources, field, parse_time
+from tagging import chunked
+
+# Default SQS message retention; a longer pause in consumption may have lost records
+DEFAULT_RETENTION_S = 4 * 24 * 3600
+DEFAULT_FLUSH_INTERVAL = 60
+GET_RESOURCES_ARN_LIMIT = 100
+
+CONFIG_DELETED = {"ResourceDeleted", "ResourceDeletedNotRecorded"}
+
+EC2_ID_TYPES = {
+    "i": "instance",
+    "vpc": "vpc",
+    "vpce": "vpc-endpoint",
+    "subnet": "subnet",
+    "sg": "security-group",
+    "vol": "volume",
+    "snap": "snapshot",
+    "ami": "image",
+    "eni": "network-interface",
+    "igw": "internet-gateway",
+    "nat": "natgateway",
+    "rtb": "route-table",
+}
+
+Change = namedtuple("Change", ["op", "arn", "tags", "keys", "time"])
+Change.__doc__ = """
+One inventory change. op is 'replace' (tags is the full tag set), 'merge' (tags
+are added or overwritten), 'untag' (keys are removed), 'create' (tags from the
+create request), 'delete' or 'refresh' (re-read the resource from the tagging API).
+"""
+
+
+def tag_dict(tags):
+    """Tags from a CloudTrail tag list ({key, value} or {Key, Value}) or dict."""
+    if isinstance(tags, dict):
+        return dict(tags)
+    return {field(tag, "key"): field(tag, "value") or "" for tag in tags or [] if field(tag, "key")}
+
+
+def ec2_arn(record, resource_id):
+    prefix = resource_id.split("-", 1)[0]
+    resource_type = EC2_ID_TYPES.get(prefix)
+    if resource_type is None:
+        return None
+    return f"arn:aws:ec2:{record.get('awsRegion', '')}:{record.get('recipientAccountId', '')}:{resource_type}/{resource_id}"
+
+
+def tagging_api_changes(record, when):
+    parameters = record.get("requestParameters") or {}
+    arns = parameters.get("resourceARNList") or []
+    if record["eventName"] == "TagResources":
+        return [Change("merge", arn, tag_dict(parameters.get("tags")), (), when) for arn in arns]
+    return [Change("untag", arn, {}, tuple(parameters.get("tagKeys") or ()), when) for arn in arns]
+
+
+def single_resource_changes(arn_field):
+    """Changes of TagResource / UntagResource style calls naming one resource in `arn_field`."""
+    def changes(record, when):
+        parameters = record.get("requestParameters") or {}
+        arn = field(parameters, arn_field)
+        if not arn:
+            return []
+        if "Untag" in record["eventName"] or "Remove" in record["eventName"]:
+            return [Change("untag", arn, {}, tuple(field(parameters, "tagKeys") or ()), when)]
+        return [Change("merge", arn, tag_dict(field(parameters, "tags")), (), when)]
+    return changes
+
+
+def ec2_tag_changes(record, when):
+    parameters = record.get("requestParameters") or {}
+    resource_ids = [item.get("resourceId") for item in (parameters.get("resourcesSet") or {}).get("items", [])]
+    tags = (parameters.get("tagSet") or {}).get("items", [])
+    arns = [arn for arn in (ec2_arn(record, resource_id) for resource_id in resource_ids if resource_id) if arn]
+    if record["eventName"] == "CreateTags":
+        return [Change("merge", arn, tag_dict(tags), (), when) for arn in arns]
+    return [Change("untag", arn, {}, tuple(field(tag, "key") for tag in tags), when) for arn in arns]
+
+
+def s3_tag_changes(record, when):
+    parameters = record.get("requestParameters") or {}
+    arn = f"arn:aws:s3:::{parameters.get('bucketName')}"
+    if record["eventName"] == "DeleteBucketTagging":
+        return [Change("replace", arn, {}, (), when)]
+    tag_set = ((parameters.get("Tagging") or {}).get("TagSet") or {}).get("Tag") or []
+    return [Change("replace", arn, tag_dict(tag_set if isinstance(tag_set, list) else [tag_set]), (), when)]
+
+
+def deleted(*path):
+    """Changes of a delete call whose ARN is at `path` in the response elements."""
+    def changes(record, when):
+        value = record.get("responseElements") or {}
+        for name in path:
+            value = field(value, name)
+        return [Change("delete", value, {}, (), when)] if isinstance(value, str) else []
+    return changes
+
+
+def s3_deleted(record, when):
+    bucket = (record.get("requestParameters") or {}).get("bucketName")
+    return [Change("delete", f"arn:aws:s3:::{bucket}", {}, (), when)] if bucket else []
+
+
+def ec2_terminated(record, when):
+    items = ((record.get("responseElements") or {}).get("instancesSet") or {}).get("items", [])
+    return [Change("delete", ec2_arn(record, item["instanceId"]), {}, (), when)
+            for item in items if item.get("instanceId")]
+
+
+# (eventSource, eventName) -> function(record, event time) returning Changes
+CLOUDTRAIL_CHANGES = {
+    ("tagging.amazonaws.com", "TagResources"): tagging_api_changes,
+    ("tagging.amazonaws.com", "UntagResources"): tagging_api_changes,
+    ("ecs.amazonaws.com", "TagResource"): single_resource_changes("resourceArn"),
+    ("ecs.amazonaws.com", "UntagResource"): single_resource_changes("resourceArn"),
+    ("elasticache.amazonaws.com", "AddTagsToResource"): single_resource_changes("resourceName"),
+    ("elasticache.amazonaws.com", "RemoveTagsFromResource"): single_resource_changes("resourceName"),
+    ("lambda.amazonaws.com", "TagResource20170331v2"): single_resource_changes("resource"),
+    ("lambda.amazonaws.com", "UntagResource20170331v2"): single_resource_changes("resource"),
+    ("ec2.amazonaws.com", "CreateTags"): ec2_tag_changes,
+    ("ec2.amazonaws.com", "DeleteTags"): ec2_tag_changes,
+    ("s3.amazonaws.com", "PutBucketTagging"): s3_tag_changes,
+    ("s3.amazonaws.com", "DeleteBucketTagging"): s3_tag_changes,
+    ("ecs.amazonaws.com", "DeleteCluster"): deleted("cluster", "clusterArn"),
+    ("ecs.amazonaws.com", "DeleteService"): deleted("service", "serviceArn"),
+    ("ecs.amazonaws.com", "StopTask"): deleted("task", "taskArn"),
+    ("elasticache.amazonaws.com", "DeleteCacheCluster"): deleted("aRN"),
+    ("elasticache.amazonaws.com", "DeleteReplicationGroup"): deleted("aRN"),
+    ("s3.amazonaws.com", "DeleteBucket"): s3_deleted,
+    ("ec2.amazonaws.com", "TerminateInstances"): ec2_terminated,
+}
+
+
+def config_item_changes(item):
+    arn = item.get("ARN") or item.get("arn")
+    if not arn:
+        return []
+    when = parse_time(item.get("configurationItemCaptureTime"))
+    if item.get("configurationItemStatus") in CONFIG_DELETED:
+        return [Change("delete", arn, {}, (), when)]
+    return [Change("replace", arn, dict(item.get("tags") or {}), (), when)]
+
+
+def changes_in(event):
+    """Inventory changes described by one event record (see the module docstring for the formats)."""
+    detail_type = event.get("detail-type")
+    if detail_type == "Config Configuration Item Change":
+        event = event.get("detail") or {}
+    elif detail_type == "Tag Change on Resource":
+        when = parse_time(event.get("time"))
+        tags = (event.get("detail") or {}).get("tags") or {}
+        return [Change("replace", arn, dict(tags), (), when) for arn in event.get("resources", [])]
+    elif detail_type == "AWS API Call via CloudTrail":
+        event = event.get("detail") or {}
+
+    if "configurationItem" in event:
+        return config_item_changes(event["configurationItem"])
+    if "configurationItems" in event:
+        return [change for item in event["configurationItems"] for change in config_item_changes(item)]
+    if event.get("messageType") == "OversizedConfigurationItemChangeNotification":
+        summary = event.get("configurationItemSummary") or {}
+        arn = summary.get("ARN") or summary.get("arn")
+        return [Change("refresh", arn, {}, (), parse_time(summary.get("configurationItemCaptureTime")))] if arn else []
+
+    if "eventSource" not in event or event.get("errorCode"):
+        return []
+    when = parse_time(event.get("eventTime"))
+    handler = CLOUDTRAIL_CHANGES.get((event["eventSource"], event.get("eventName")))
+    if handler is not None:
+        return [change for change in handler(event, when) if change.arn]
+    return [Change("create", arn, tags, (), when) for arn, _, tags, _ in created_resources(event)]
+
+
+class InventoryIngest:
+    """
+    Applies change records to a writable inventory (Inventory or CompactInventory).
+
+    Types in `complete_types` are known to be fully listed; changes for other types,
+    or for resources the inventory does not hold, mark the type for re-listing.
+    """
+
+    def __init__(self, inventory, complete_types=(), resource_type_filters=None, region=None, client=None):
+        self.inventory = inventory
+        self.complete_types = set(complete_types)
+        self.resource_type_filters = resource_type_filters
+        self.region = region
+        self.client = client
+        self.gaps = set()
+        self.refresh = set()
+        self.last_change = {}
+        self.stats = Counter()
+
+    def in_scope(self, resource_type):
+        if not self.resource_type_filters:
+            return True
+        return any(resource_type == type_filter or resource_type.startswith(type_filter + ":")
+                   for type_filter in self.resource_type_filters)
+
+    def apply(self, change):
+        resource_type = tagging_type_from_arn(change.arn)
+        if not self.in_scope(resource_type):
+            self.stats["out_of_scope"] += 1
+            return
+        if resource_type not in self.complete_types or resource_type in self.gaps:
+            # The type will be re-listed, which supersedes any change to it
+            self.gaps.add(resource_type)
+            self.stats["deferred"] += 1
+            return
+        if change.time is not None:
+            if change.time < self.last_change.get(change.arn, float("-inf")):
+                self.stats["stale"] += 1
+                return
+            self.last_change[change.arn] = change.time
+
+        current = dict(self.inventory.get_tags(change.arn)) if change.arn in self.inventory else None
+        if change.op == "delete":
+            self.inventory.remove(change.arn)
+        elif change.op == "replace":
+            self.inventory.add(change.arn, change.tags)
+        elif change.op == "create":
+            self.inventory.add(change.arn, {**change.tags, **(current or {})})
+        elif change.op == "refresh":
+            self.refresh.add(change.arn)
+        elif current is None:
+            # A tag change for a resource we never saw: its create was missed
+            self.gaps.add(resource_type)
+            self.stats["missed_create"] += 1
+            return
+        elif change.op == "merge":
+            self.inventory.add(change.arn, {**current, **change.tags})
+        elif change.op == "untag":
+            self.inventory.add(change.arn, {key: value for key, value in current.items() if key not in change.keys})
+        self.stats[change.op] += 1
+
+    def ingest(self, events):
+        for event in events:
+            for change in changes_in(event):
+                self.apply(change)
+
+    def resync(self):
+        """Re-list every type with a gap and re-read refreshed resources. Returns the re-listed types."""
+        client = self.client or boto3.client('resourcegroupstaggingapi', region_name=self.region)
+        relisted = sorted(self.gaps)
+        for resource_type in relisted:
+            listed = {}
+            for page in client.get_paginator('get_resources').paginate(ResourceTypeFilters=[resource_type]):
+                for resource in page.get('ResourceTagMappingList', []):
+                    listed[resource['ResourceARN']] = resource.get('Tags', [])
+            stale = [arn for arn in self.inventory
+                     if tagging_type_from_arn(arn) == resource_type and arn not in listed]
+            for arn in stale:
+                self.inventory.remove(arn)
+            for arn, tags in listed.items():
+                self.inventory.add(arn, {tag['Key']: tag.get('Value', '') for tag in tags})
+            self.complete_types.add(resource_type)
+            self.stats["relisted"] += len(listed)
+        self.gaps.clear()
+
+        refresh = sorted(arn for arn in self.refresh if tagging_type_from_arn(arn) not in relisted)
+        for batch in chunked(refresh, GET_RESOURCES_ARN_LIMIT):
+            found = set()
+            for resource in client.get_resources(ResourceARNList=batch).get('ResourceTagMappingList', []):
+                found.add(resource['ResourceARN'])
+                self.inventory.add(resource['ResourceARN'],
+                                   {tag['Key']: tag.get('Value', '') for tag in resource.get('Tags', [])})
+            for arn in batch:
+                if arn not in found:
+                    self.inventory.remove(arn)
+        self.refresh.clear()
+        return relisted
+
+    def mark_all_stale(self):
+        """Treat every listed type as having a gap (the stream was not consumed within its retention)."""
+        self.gaps.update(type_ for type_ in self.complete_types if self.in_scope(type_))
+
+
+def open_inventory(path, resource_type_filters=None, region=None):
+    """
+    Load the snapshot at `path` into a writable CompactInventory with its ingest state,
+    listing the estate first when there is no snapshot yet.
+
+    :return: Tuple of (inventory, meta).
+    """
+    try:
+        with SnapshotInventory(path) as snapshot:
+            meta = dict(snapshot.meta)
+            inventory = snapshot.to_compact()
+        if "ingest" not in meta:
+            meta["ingest"] = {"complete_types": sorted({tagging_type_from_arn(arn) for arn in inventory}),
+                              "consumed_until": meta.get("created")}
+        return inventory, meta
+    except (OSError, SnapshotError):
+        pass
+
+    started = time.time()
+    inventory = load_compact_inventory(resource_type_filters, region, raise_errors=True)
+    meta = {"resource_type_filters": resource_type_filters, "region": region,
+            "ingest": {"complete_types": sorted({tagging_type_from_arn(arn) for arn in inventory}),
+                       "consumed_until": started}}
+    return inventory, meta
+
+
+def save_inventory(path, inventory, meta, ingest):
+    inventory.compact()
+    meta = dict(meta, ingest={"complete_types": sorted(ingest.complete_types), "consumed_until": time.time()})
+    meta.pop("created", None)
+    write_snapshot(inventory, path, meta)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply AWS Config / CloudTrail change records to an inventory snapshot.")
+    parser.add_argument("--snapshot", required=True, help="Inventory snapshot to update (built if missing).")
+    parser.add_argument("--queue", required=True, help="SQS queue URL, a JSON lines file, or '-' for stdin.")
+    parser.add_argument("--follow", action="store_true", help="Keep reading a file or stdin as it grows.")
+    parser.add_argument("--once", action="store_true", help="Exit when the queue is empty.")
+    parser.add_argument("--retention", type=float, default=DEFAULT_RETENTION_S,
+                        help="Queue retention in seconds; a longer pause since the last run re-lists every type.")
+    parser.add_argument("--flush-interval", type=float, default=DEFAULT_FLUSH_INTERVAL,
+                        help="Seconds between snapshot writes when running continuously.")
+    parser.add_argument("--type", action="append", dest="types", help="Resource type filter when building the snapshot.")
+    parser.add_argument("--region")
+    args = parser.parse_args(argv)
+
+    try:
+        inventory, meta = open_inventory(args.snapshot, args.types, args.region)
+        state = meta["ingest"]
+        ingest = InventoryIngest(inventory, state.get("complete_types", ()), meta.get("resource_type_filters"),
+                                 meta.get("region"))
+        if time.time() - (state.get("consumed_until") or 0) > args.retention:
+            print("Change stream not consumed within its retention; re-listing every type.", file=sys.stderr)
+            ingest.mark_all_stale()
+
+        queue = open_queue(args.queue, args.follow)
+        flushed = time.monotonic()
+        while True:
+            messages = queue.receive(100, 0.0 if args.once else 20.0)
+            for message in messages:
+                ingest.ingest(events_in(message.body))
+            if ingest.gaps or ingest.refresh:
+                relisted = ingest.resync()
+                if relisted:
+                    print(f"Re-listed {', '.join(relisted)}", file=sys.stderr)
+            queue.ack([message.receipt for message in messages])
+            if not messages and args.once:
+                break
+            if not args.once and time.monotonic() - flushed >= args.flush_interval:
+                save_inventory(args.snapshot, inventory, meta, ingest)
+                flushed = time.monotonic()
+    except (NoCredentialsError, PartialCredentialsError):
+        print("AWS credentials not found or incomplete. Please configure your credentials.")
+        return 1
+    except ClientError as e:
+        print(f"AWS ClientError: {e.response['Error']['Message']}")
+        return 1
+    except OSError as e:
+        print(f"Cannot read queue: {e}")
+        return 1
+    except KeyboardInterrupt:
+        pass
+
+    save_inventory(args.snapshot, inventory, meta, ingest)
+    print(f"{len(inventory)} resources; " + ", ".join(f"{key} {count}" for key, count in sorted(ingest.stats.items())),
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,319 @@
+"""
+Binary inventory snapshots opened with mmap.
+
+A snapshot is a CompactInventory's columns written as-is: a header, a section
+table, then string tables and fixed-width arrays, each 8-byte aligned. Opening
+one maps the file read-only and casts memoryviews over the sections, so there
+is nothing to parse: queries can start immediately, pages are read on demand,
+and worker processes opening the same file share the page cache.
+
+Snapshots are written to a temporary file and renamed into place, so readers
+never see a partial file.
+
+    python inventory_snapshot.py build inventory.snap [--type ecs:service]
+    python inventory_snapshot.py info inventory.snap
+
+Set AWS_TAGGER_SNAPSHOT=PATH to have the selection script query a snapshot
+(rebuilt when older than AWS_TAGGER_SNAPSHOT_MAX_AGE seconds, default 3600)
+instead of listing the estate on every run.
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+
+from botocore.exceptions import NoCredentialsError, PartialCredentialsError, ClientError
+
+from compact_inventory import CompactInventory, StringTable, load_compact_inventory
+
+MAGIC = b"AWSTINV1"
+VERSION = 2
+DEFAULT_MAX_AGE = 3600
+
+# magic, version, byte order (0 little, 1 big), section count, rows, live rows
+HEADER = struct.Struct("<8sBBHQQ")
+SECTION = struct.Struct("<QQ")
+ALIGNMENT = 8
+
+# Section name -> array typecode, in file order
+SECTIONS = (
+    ("meta", "B"),
+    ("string_offsets", "Q"),
+    ("string_blob", "B"),
+    ("prefix_ids", "I"),
+    ("suffix_offsets", "Q"),
+    ("suffix_blob", "B"),
+    ("type_ids", "I"),
+    ("hashes", "I"),
+    ("live", "B"),
+    ("tag_starts", "Q"),
+    ("tag_counts", "H"),
+    ("tag_hashes", "I"),
+    ("tag_pairs", "I"),
+    ("slots", "q"),
+)
+
+
+class SnapshotError(Exception):
+    """The file is not a readable inventory snapshot."""
+
+
+class MappedStringTable:
+    """StringTable over a mapped blob; strings are decoded on first access."""
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+        self.cache = [None] * (len(offsets) - 1)
+        self.ids = None
+
+    def __getitem__(self, string_id):
+        string = self.cache[string_id]
+        if string is None:
+            string = self.cache[string_id] = str(
+                self.blob[self.offsets[string_id]:self.offsets[string_id + 1]], "utf-8")
+        return string
+
+    def get(self, string):
+        if self.ids is None:
+            self.ids = {self[string_id]: string_id for string_id in range(len(self))}
+        return self.ids.get(string)
+
+    def __len__(self):
+        return len(self.cache)
+
+
+def write_snapshot(inventory, path, meta=None):
+    """
+    Write a CompactInventory to `path` atomically.
+
+    :param meta: JSON-serialisable metadata stored with the snapshot (e.g. the type filters used).
+    """
+    encoded = [string.encode() for string in inventory.strings.strings]
+    string_offsets = array("Q", [0])
+    for string in encoded:
+        string_offsets.append(string_offsets[-1] + len(string))
+    meta = dict(meta or {}, created=time.time())
+
+    sections = {
+        "meta": json.dumps(meta).encode(),
+        "string_offsets": string_offsets,
+        "string_blob": b"".join(encoded),
+        "prefix_ids": inventory.prefix_ids,
+        "suffix_offsets": inventory.suffix_offsets,
+        "suffix_blob": inventory.suffix_blob,
+        "type_ids": inventory.type_ids,
+        "hashes": inventory.hashes,
+        "live": inventory.live,
+        "tag_starts": inventory.tag_starts,
+        "tag_counts": inventory.tag_counts,
+        "tag_hashes": inventory.tag_hashes,
+        "tag_pairs": inventory.tag_pairs,
+        "slots": inventory.slots,
+    }
+
+    offset = HEADER.size + SECTION.size * len(SECTIONS)
+    table = []
+    for name, _ in SECTIONS:
+        offset += -offset % ALIGNMENT
+        length = memoryview(sections[name]).nbytes
+        table.append((offset, length))
+        offset += length
+
+    temporary = f"{path}.tmp.{os.getpid()}"
+    with open(temporary, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, 0 if sys.byteorder == "little" else 1, len(SECTIONS),
+                               len(inventory.hashes), len(inventory)))
+        for section_offset, length in table:
+            file.write(SECTION.pack(section_offset, length))
+        for (name, _), (section_offset, _) in zip(SECTIONS, table):
+            file.write(b"\0" * (section_offset - file.tell()))
+            file.write(sections[name])
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+class SnapshotInventory(CompactInventory):
+    """
+    Read-only CompactInventory backed by a memory-mapped snapshot.
+
+    Supports the same mapping and query API; add(), remove() and compact() raise TypeError.
+    Use as a context manager, or call close(), to unmap the file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError as e:
+            self.file.close()
+            raise SnapshotError(f"{path}: {e}")
+        self.views = []
+        try:
+            self.open_sections()
+        except (SnapshotError, struct.error, TypeError, ValueError) as e:
+            self.close()
+            raise SnapshotError(f"{path}: {e}")
+
+    def open_sections(self):
+        view = memoryview(self.map)
+        self.views.append(view)
+        magic, version, byte_order, section_count, rows, live_rows = HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            raise SnapshotError("not an inventory snapshot (or an unsupported version)")
+        if byte_order != (0 if sys.byteorder == "little" else 1) or section_count != len(SECTIONS):
+            raise SnapshotError("snapshot was written on an incompatible platform")
+
+        columns = {}
+        for index, (name, typecode) in enumerate(SECTIONS):
+            offset, length = SECTION.unpack_from(view, HEADER.size + SECTION.size * index)
+            section = view[offset:offset + length]
+            if typecode != "B":
+                section = section.cast(typecode)
+            self.views.append(section)
+            columns[name] = section
+
+        self.meta = json.loads(str(columns["meta"], "utf-8"))
+        self.strings = MappedStringTable(columns["string_offsets"], columns["string_blob"])
+        for name in ("prefix_ids", "suffix_offsets", "suffix_blob", "type_ids", "hashes", "live",
+                     "tag_starts", "tag_counts", "tag_hashes", "tag_pairs", "slots"):
+            setattr(self, name, columns[name])
+        if len(self.hashes) != rows:
+            raise SnapshotError("row count does not match the header")
+        self.count = live_rows
+        self.postings = None
+
+    def add(self, arn, tags):
+        raise TypeError("inventory snapshots are read-only")
+
+    def remove(self, arn):
+        raise TypeError("inventory snapshots are read-only")
+
+    def compact(self):
+        raise TypeError("inventory snapshots are read-only")
+
+    def to_compact(self):
+        """Copy the snapshot into a writable CompactInventory, column by column."""
+        inventory = CompactInventory()
+        inventory.strings = StringTable(self.strings[string_id] for string_id in range(len(self.strings)))
+        for name, typecode in SECTIONS:
+            if not hasattr(inventory, name):
+                continue
+            column = getattr(self, name)
+            if typecode == "B":
+                setattr(inventory, name, bytearray(column))
+            else:
+                copy = array(typecode)
+                copy.frombytes(column.cast("B"))
+                setattr(inventory, name, copy)
+        inventory.count = self.count
+        return inventory
+
+    def memory_usage(self):
+        """Bytes mapped from the file (shared between processes and paged in on demand)."""
+        return len(self.map)
+
+    @property
+    def created(self):
+        return self.meta.get("created", 0.0)
+
+    def close(self):
+        self.postings = None
+        self.strings = None
+        for view in reversed(self.views):
+            view.release()
+        self.views = []
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+def cached_inventory(path, max_age=DEFAULT_MAX_AGE, resource_type_filters=None, region=None):
+    """
+    Open the snapshot at `path`, rebuilding it from the tagging API first when it is
+    missing, older than `max_age` seconds, or was built with different filters.
+
+    A failed listing never replaces the snapshot: the stale snapshot (when it was built with
+    the same filters) is served instead, otherwise an empty inventory that is not written.
+    """
+    wanted = {"resource_type_filters": resource_type_filters, "region": region}
+    stale = None
+    try:
+        snapshot = SnapshotInventory(path)
+        if all(snapshot.meta.get(key) == value for key, value in wanted.items()):
+            if time.time() - snapshot.created < max_age:
+                return snapshot
+            stale = snapshot
+        else:
+            snapshot.close()
+    except (OSError, SnapshotError):
+        pass
+
+    try:
+        inventory = load_compact_inventory(resource_type_filters, region, raise_errors=True)
+    except (NoCredentialsError, PartialCredentialsError, ClientError) as e:
+        if isinstance(e, ClientError):
+            print(f"AWS ClientError: {e.response['Error']['Message']}")
+        else:
+            print("AWS credentials not found or incomplete. Please configure your credentials.")
+        if stale is None:
+            return CompactInventory()
+        print(f"Using the stale snapshot {path} ({time.time() - stale.created:.0f}s old)")
+        return stale
+    if stale is not None:
+        stale.close()
+    write_snapshot(inventory, path, wanted)
+    return SnapshotInventory(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or inspect memory-mapped inventory snapshots.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Load the inventory from AWS and write a snapshot.")
+    build.add_argument("path")
+    build.add_argument("--type", action="append", dest="types", help="Tagging API resource type filter (repeatable).")
+    build.add_argument("--region")
+    info = commands.add_parser("info", help="Describe a snapshot.")
+    info.add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        started = time.perf_counter()
+        try:
+            inventory = load_compact_inventory(args.types, args.region, raise_errors=True)
+        except (NoCredentialsError, PartialCredentialsError):
+            print("AWS credentials not found or incomplete. Please configure your credentials.")
+            return 1
+        except ClientError as e:
+            print(f"AWS ClientError: {e.response['Error']['Message']}; snapshot not written")
+            return 1
+        write_snapshot(inventory, args.path, {"resource_type_filters": args.types, "region": args.region})
+        print(f"Wrote {len(inventory)} resources to {args.path} in {time.perf_counter() - started:.1f}s")
+        return 0
+
+    try:
+        with SnapshotInventory(args.path) as snapshot:
+            age = time.time() - snapshot.created
+            print(f"{args.path}: {len(snapshot)} resources, {len(snapshot.strings)} strings, "
+                  f"{snapshot.memory_usage()} bytes, {age:.0f}s old")
+            print(f"  filters: {snapshot.meta.get('resource_type_filters')}, region: {snapshot.meta.get('region')}")
+    except (OSError, SnapshotError) as e:
+        print(f"Cannot open snapshot: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
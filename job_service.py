@@ -0,0 +1,482 @@
+"""
+Local tagging job service: HTTP/JSON on localhost, a persistent job queue and a
+warm worker pool.
+
+Every ad hoc script run pays for interpreter startup, credentials, client
+creation and discovery. This service pays them once: its workers share the
+tagging clients (one per region, behind one rate limiter), circuit breakers, a
+TagCache (tag_cache.py) and an inventory loaded on first use, and jobs queued
+close together are merged: their resources are grouped by action, tags and
+(account, region), so one tag_resources batch can carry ARNs from many jobs.
+Jobs that write the same tag of a resource differently are not merged; they
+run in submission order, one round each.
+
+    python job_service.py --port 8787 --state jobs.jsonl --workers 8 --rate 5
+
+    POST /jobs        {"type": "tag", "arns": [...], "tags": {"env": "prod"}}
+                      {"type": "untag", "select": "type=ecs-task AND tag:tmp", "keys": ["tmp"]}
+                      {"type": "retag", "arns": [...], "tags": {...}}      only where values differ
+                      {"type": "remediate", "select": "type=ecs-service", "required": {"cust": "default"}}
+                      -> 202 {"id": ..., "status": "queued"}
+    GET  /jobs/ID     status and, once finished, the result
+    GET  /jobs        all jobs (?status=queued|running|done|failed)
+    GET  /health      queue depth and cache statistics
+
+Resources are given as "arns" or as a "select" expression (resource_query.py)
+over the shared inventory. Job state is appended to a JSON lines journal, so
+queued jobs survive a restart; jobs that were running when the service stopped
+are queued again.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import boto3
+
+from arns import ArnError, parse_arn
+from inventory import load_inventory
+from resource_query import QuerySyntaxError, select
+from tag_cache import TagCache
+from tag_events import default_sink
+from tagging import tag_resources, untag_resources
+
+DEFAULT_PORT = 8787
+DEFAULT_STATE_PATH = "aws-tagger-jobs.jsonl"
+DEFAULT_WORKERS = 8
+DEFAULT_MERGE_WINDOW_S = 1.0
+DEFAULT_RATE = 5.0
+DEFAULT_INVENTORY_TTL_S = 900.0
+# Finished jobs are dropped from the journal when it is compacted at startup after this long
+RETENTION_S = 7 * 24 * 3600
+
+JOB_TYPES = ("tag", "untag", "retag", "remediate")
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class JobError(ValueError):
+    """A job request that cannot be run."""
+
+
+def validate(request):
+    """Check a job request; returns it normalized. Raises JobError."""
+    if not isinstance(request, dict) or request.get("type") not in JOB_TYPES:
+        raise JobError(f"'type' must be one of {', '.join(JOB_TYPES)}")
+    if bool(request.get("arns")) == bool(request.get("select")):
+        raise JobError("give exactly one of 'arns' (a list) or 'select' (an expression)")
+    if request.get("arns") is not None and not isinstance(request["arns"], list):
+        raise JobError("'arns' must be a list")
+    field = {"tag": "tags", "retag": "tags", "untag": "keys", "remediate": "required"}[request["type"]]
+    expected = list if field == "keys" else dict
+    if not request.get(field) or not isinstance(request[field], expected):
+        raise JobError(f"'{request['type']}' jobs need a non-empty '{field}' {expected.__name__}")
+    return {key: request[key] for key in ("type", "arns", "select", field) if request.get(key) is not None}
+
+
+class JobStore:
+    """Jobs by id, journaled to a JSON lines file (the last line for a job wins)."""
+
+    def __init__(self, path=DEFAULT_STATE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.jobs = {}
+        self.load()
+        self.file = open(path, "a") if path else None
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path) as file:
+            for line in file:
+                if line.strip():
+                    job = json.loads(line)
+                    self.jobs[job["id"]] = job
+        now = time.time()
+        for job_id, job in list(self.jobs.items()):
+            if job["status"] == RUNNING:
+                job["status"] = QUEUED
+            elif job["status"] in (DONE, FAILED) and now - job.get("finished", now) > RETENTION_S:
+                del self.jobs[job_id]
+        # Compact the journal to one line per job
+        temporary = f"{self.path}.tmp.{os.getpid()}"
+        with open(temporary, "w") as file:
+            for job in self.jobs.values():
+                file.write(json.dumps(job, separators=(",", ":")) + "\n")
+        os.replace(temporary, self.path)
+
+    def save(self, job):
+        """Journal a job's current state. Call with the lock held."""
+        if self.file is not None:
+            self.file.write(json.dumps(job, separators=(",", ":")) + "\n")
+            self.file.flush()
+
+    def submit(self, request):
+        job = {"id": uuid.uuid4().hex, "status": QUEUED, "submitted": round(time.time(), 3), "request": request}
+        with self.lock:
+            self.jobs[job["id"]] = job
+            self.save(job)
+            self.changed.notify_all()
+        return dict(job)
+
+    def update(self, job_id, **fields):
+        with self.lock:
+            job = self.jobs[job_id]
+            job.update(fields)
+            self.save(job)
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def listing(self, status=None):
+        with self.lock:
+            return [{key: value for key, value in job.items() if key not in ("request", "result")}
+                    for job in self.jobs.values() if status is None or job["status"] == status]
+
+    def wait_for_queued(self, timeout):
+        """Queued job ids, in submission order, waiting up to `timeout` for one to arrive."""
+        with self.lock:
+            self.changed.wait_for(lambda: any(job["status"] == QUEUED for job in self.jobs.values()), timeout)
+            queued = [job for job in self.jobs.values() if job["status"] == QUEUED]
+            return [job["id"] for job in sorted(queued, key=lambda job: job["submitted"])]
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class RateLimiter:
+    """Token bucket shared by the workers: at most `rate` calls per second on average."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(rate, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimitedPaginator:
+    """Paginator proxy taking a RateLimiter token before each page is fetched."""
+
+    def __init__(self, paginator, limiter):
+        self.paginator = paginator
+        self.limiter = limiter
+
+    def paginate(self, **kwargs):
+        pages = iter(self.paginator.paginate(**kwargs))
+        while True:
+            self.limiter.acquire()
+            try:
+                page = next(pages)
+            except StopIteration:
+                return
+            yield page
+
+
+class RateLimitedClient:
+    """Client proxy taking a RateLimiter token before each API call, paginated ones included."""
+
+    def __init__(self, client, limiter):
+        self.client = client
+        self.limiter = limiter
+
+    def get_paginator(self, operation_name):
+        return RateLimitedPaginator(self.client.get_paginator(operation_name), self.limiter)
+
+    def __getattr__(self, name):
+        attribute = getattr(self.client, name)
+        if not callable(attribute) or name in ("can_paginate", "get_waiter"):
+            return attribute
+
+        def limited(*args, **kwargs):
+            self.limiter.acquire()
+            return attribute(*args, **kwargs)
+        return limited
+
+
+def arn_partition(arn):
+    """(account, region) of an ARN; jobs are only merged within one."""
+    try:
+        parsed = parse_arn(arn)
+    except ArnError:
+        return ("", "")
+    return (parsed.account, parsed.region)
+
+
+def unit_writes(units):
+    """(ARN, key) -> value written (None for a removal) by a job's work units."""
+    writes = {}
+    for action, payload, arn in units:
+        if action == "tag":
+            writes.update(((arn, key), value) for key, value in payload)
+        else:
+            writes.update(((arn, key), None) for key in payload)
+    return writes
+
+
+class JobService:
+    """Resolves queued jobs into work, merges it across jobs and runs it on the worker pool."""
+
+    def __init__(self, store, workers=DEFAULT_WORKERS, merge_window_s=DEFAULT_MERGE_WINDOW_S, rate=DEFAULT_RATE,
+                 inventory_ttl_s=DEFAULT_INVENTORY_TTL_S, sink=None):
+        self.store = store
+        self.merge_window_s = merge_window_s
+        self.inventory_ttl_s = inventory_ttl_s
+        self.sink = sink or default_sink()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tag-worker")
+        self.limiter = RateLimiter(rate)
+        self.clients = {}
+        self.clients_lock = threading.Lock()
+        # Current tags are read in each ARN's region, like the writes in run_group
+        self.cache = TagCache(region_client=self.client)
+        self.inventory = None
+        self.inventory_loaded = 0.0
+        self.stopping = threading.Event()
+        self.rounds = 0
+        self.groups_run = 0
+
+    def client(self, region):
+        with self.clients_lock:
+            if region not in self.clients:
+                self.clients[region] = RateLimitedClient(
+                    boto3.client('resourcegroupstaggingapi', region_name=region), self.limiter)
+            return self.clients[region]
+
+    def shared_inventory(self):
+        if self.inventory is None or time.monotonic() - self.inventory_loaded > self.inventory_ttl_s:
+            # Through the shared, rate limited client of the default region
+            self.inventory = load_inventory(client=self.client(None))
+            self.inventory_loaded = time.monotonic()
+        return self.inventory
+
+    def resolve(self, request):
+        """
+        Work of one job: list of (action, payload, ARN), where payload is a sorted tag tuple
+        (tag) or key tuple (untag), plus the number of ARNs that need nothing.
+        """
+        if request.get("select"):
+            try:
+                arns = sorted(select(self.shared_inventory(), request["select"]))
+            except QuerySyntaxError as e:
+                raise JobError(f"bad select expression: {e}")
+        else:
+            arns = list(dict.fromkeys(request["arns"]))
+
+        job_type = request["type"]
+        if job_type == "tag":
+            payload = tuple(sorted(request["tags"].items()))
+            return [("tag", payload, arn) for arn in arns], 0
+        if job_type == "untag":
+            payload = tuple(sorted(request["keys"]))
+            return [("untag", payload, arn) for arn in arns], 0
+
+        current = self.cache.get_tags(arns)
+        work = []
+        for arn in arns:
+            if job_type == "retag":
+                needed = {key: value for key, value in request["tags"].items() if current[arn].get(key) != value}
+            else:
+                needed = {key: value for key, value in request["required"].items() if key not in current[arn]}
+            if needed:
+                work.append(("tag", tuple(sorted(needed.items())), arn))
+        return work, len(arns) - len(work)
+
+    def run_group(self, action, payload, partition, arns):
+        client = self.client(partition[1] or None)
+        if action == "tag":
+            return tag_resources(arns, dict(payload), sink=self.sink, client=client, cache=self.cache)
+        return untag_resources(arns, payload, sink=self.sink, client=client, cache=self.cache)
+
+    def run_round(self, job_ids):
+        """
+        Run queued jobs together: one tag_resources / untag_resources group per compatible set.
+
+        Groups run concurrently, so a job that would set or remove a key an earlier job of the
+        round writes differently is queued again for the next round, and so is any later job
+        touching a key of a deferred one; writes to one key still land in submission order.
+        """
+        work, writes, deferred = {}, {}, set()
+        for job_id in job_ids:
+            self.store.update(job_id, status=RUNNING, started=round(time.time(), 3))
+            try:
+                units, unchanged = self.resolve(self.store.get(job_id)["request"])
+            except Exception as e:
+                self.store.update(job_id, status=FAILED, finished=round(time.time(), 3), error=str(e))
+                continue
+            job_writes = unit_writes(units)
+            if any(key in deferred or writes.get(key, effect) != effect for key, effect in job_writes.items()):
+                self.store.update(job_id, status=QUEUED)
+                deferred.update(job_writes)
+                continue
+            writes.update(job_writes)
+            work[job_id] = (units, unchanged)
+
+        groups = {}
+        for units, _ in work.values():
+            for action, payload, arn in units:
+                groups.setdefault((action, payload, arn_partition(arn)), set()).add(arn)
+        futures = {key: self.pool.submit(self.run_group, key[0], key[1], key[2], sorted(arns))
+                   for key, arns in groups.items()}
+        failed = {}
+        for key, future in futures.items():
+            try:
+                failed[key] = future.result()
+            except Exception as e:
+                failed[key] = {arn: {"ErrorCode": type(e).__name__, "ErrorMessage": str(e)} for arn in groups[key]}
+
+        for job_id, (units, unchanged) in work.items():
+            job_failed = {}
+            for action, payload, arn in units:
+                details = failed[(action, payload, arn_partition(arn))].get(arn)
+                if details:
+                    job_failed[arn] = {"error_code": details.get("ErrorCode"), "error_message": details.get("ErrorMessage")}
+            result = {"resources": len(units) + unchanged, "changed": len(units) - len(job_failed),
+                      "unchanged": unchanged, "failed": job_failed}
+            self.store.update(job_id, status=DONE, finished=round(time.time(), 3), result=result)
+        self.update_inventory(work, failed)
+        self.rounds += 1
+        self.groups_run += len(groups)
+
+    def update_inventory(self, work, failed):
+        """Keep the shared inventory in step with the tags just written."""
+        if self.inventory is None:
+            return
+        for units, _ in work.values():
+            for action, payload, arn in units:
+                if arn not in self.inventory or arn in failed[(action, payload, arn_partition(arn))]:
+                    continue
+                tags = self.inventory.get_tags(arn)
+                if action == "tag":
+                    tags = {**tags, **dict(payload)}
+                else:
+                    tags = {key: value for key, value in tags.items() if key not in payload}
+                self.inventory.add(arn, tags)
+
+    def run(self):
+        """Dispatch loop: wait for jobs, let the merge window fill, run them as one round."""
+        while not self.stopping.is_set():
+            if not self.store.wait_for_queued(timeout=1.0):
+                continue
+            self.stopping.wait(self.merge_window_s)
+            job_ids = self.store.wait_for_queued(timeout=0)
+            if job_ids:
+                self.run_round(job_ids)
+
+    def health(self):
+        statuses = {}
+        for job in self.store.listing():
+            statuses[job["status"]] = statuses.get(job["status"], 0) + 1
+        return {"jobs": statuses, "rounds": self.rounds, "groups_run": self.groups_run,
+                "cache": dict(self.cache.stats, entries=len(self.cache)),
+                "inventory": len(self.inventory) if self.inventory is not None else None}
+
+    def stop(self):
+        self.stopping.set()
+        self.pool.shutdown(wait=True)
+        self.store.close()
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """HTTP/JSON front end of a JobService."""
+
+    service = None
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            return self.reply(404, {"error": f"no such endpoint {self.path}"})
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"null")
+            job = self.service.store.submit(validate(request))
+        except (ValueError, JobError) as e:
+            return self.reply(400, {"error": str(e)})
+        self.reply(202, {"id": job["id"], "status": job["status"]})
+
+    def do_GET(self):
+        path, _, query = self.path.partition("?")
+        path = path.rstrip("/")
+        if path == "/health":
+            return self.reply(200, self.service.health())
+        if path == "/jobs":
+            status = dict(part.partition("=")[::2] for part in query.split("&") if part).get("status")
+            return self.reply(200, {"jobs": self.service.store.listing(status)})
+        if path.startswith("/jobs/"):
+            job = self.service.store.get(path[len("/jobs/"):])
+            if job is None:
+                return self.reply(404, {"error": "no such job"})
+            return self.reply(200, job)
+        self.reply(404, {"error": f"no such endpoint {self.path}"})
+
+    def reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(service, host="127.0.0.1", port=DEFAULT_PORT):
+    """Return an HTTP server for `service`; call serve_forever() on it (or run it in a thread)."""
+    handler = type("BoundJobRequestHandler", (JobRequestHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the local tagging job service.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--state", default=DEFAULT_STATE_PATH, help="Job journal (JSON lines).")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--merge-window", type=float, default=DEFAULT_MERGE_WINDOW_S,
+                        help="Seconds to collect jobs into one round after the first arrives.")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE,
+                        help="Tagging API calls per second, shared by all workers.")
+    parser.add_argument("--inventory-ttl", type=float, default=DEFAULT_INVENTORY_TTL_S,
+                        help="Seconds before the shared inventory is reloaded for 'select' jobs.")
+    args = parser.parse_args(argv)
+
+    try:
+        service = JobService(JobStore(args.state), args.workers, args.merge_window, args.rate, args.inventory_ttl)
+    except (OSError, ValueError) as e:
+        print(f"Cannot open job journal: {e}")
+        return 1
+    server = serve(service, port=args.port)
+    threading.Thread(target=server.serve_forever, name="http", daemon=True).start()
+    print(f"Job service listening on http://127.0.0.1:{args.port}, journal {args.state}", file=sys.stderr)
+    try:
+        service.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        service.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
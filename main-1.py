@@ -1,6 +1,10 @@
-import boto3
 from botocore.exceptions import NoCredentialsError, PartialCredentialsError
 
+from arns import split_valid_arns
+from tag_cache import TagCache
+from tag_validation import TagValidationError, parse_tags
+from tagging import tag_resources
+
 def retag_resources(resource_arns, new_tags):
     """
     Retag multiple AWS resources.
@@ -8,19 +12,10 @@ def retag_resources(resource_arns, new_tags):
     :param resource_arns: List of ARNs of the resources to retag.
     :param new_tags: Dictionary of new tags to apply.
     """
-    client = boto3.client('resourcegroupstaggingapi')
-
     try:
-        for arn in resource_arns:
-            print(f"Updating tags for resource: {arn}")
-            response = client.tag_resources(
-                ResourceARNList=[arn],
-                Tags=new_tags
-            )
-            if response.get('FailedResourcesMap'):
-                print(f"Failed to update tags for resource: {arn}")
-            else:
-                print(f"Successfully updated tags for resource: {arn}")
+        # Current tags, so the tag limit is checked on the merged tag set
+        existing_tags = TagCache().get_tags(split_valid_arns(resource_arns)[0])
+        tag_resources(resource_arns, new_tags, existing_tags=existing_tags)
 
     except NoCredentialsError:
         print("AWS credentials not found. Please configure your credentials.")
@@ -31,10 +26,13 @@ def retag_resources(resource_arns, new_tags):
 
 if __name__ == "__main__":
     # Prompt user for ARNs
-    resource_arns = input("Enter resource ARNs separated by commas: ").split(',')
+    resource_arns = [arn.strip() for arn in input("Enter resource ARNs separated by commas: ").split(',') if arn.strip()]
 
     # Prompt user for tags
     new_tags_input = input("Enter tags as key=value pairs separated by commas: ")
-    new_tags = dict(tag.split('=') for tag in new_tags_input.split(','))
-
-    retag_resources(resource_arns, new_tags)
+    try:
+        new_tags = parse_tags(new_tags_input)
+    except TagValidationError as e:
+        print(f"Invalid tags: {e}")
+    else:
+        retag_resources(resource_arns, new_tags)
@@ -1,6 +1,9 @@
-import boto3
 from botocore.exceptions import NoCredentialsError, PartialCredentialsError
 
+from arns import split_valid_arns
+from tag_cache import TagCache
+from tagging import tag_resources
+
 def retag_resources(resource_arns, new_tags):
     """
     Retag multiple AWS resources.
@@ -8,22 +11,10 @@ def retag_resources(resource_arns, new_tags):
     :param resource_arns: List of ARNs of the resources to retag.
     :param new_tags: Dictionary of new tags to apply.
     """
-    client = boto3.client('resourcegroupstaggingapi')
-
     try:
-        # Convert tags dictionary to required format
-        tags = [{"Key": k, "Value": v} for k, v in new_tags.items()]
-
-        for arn in resource_arns:
-            print(f"Updating tags for resource: {arn}")
-            response = client.tag_resources(
-                ResourceARNList=[arn],
-                Tags=new_tags
-            )
-            if response.get('FailedResourcesMap'):
-                print(f"Failed to update tags for resource: {arn}")
-            else:
-                print(f"Successfully updated tags for resource: {arn}")
+        # Current tags, so the tag limit is checked on the merged tag set
+        existing_tags = TagCache().get_tags(split_valid_arns(resource_arns)[0])
+        tag_resources(resource_arns, new_tags, existing_tags=existing_tags)
 
     except NoCredentialsError:
         print("AWS credentials not found. Please configure your credentials.")
@@ -41,8 +32,8 @@ if __name__ == "__main__":
     # Example tags to apply
     new_tags = {
         "Environment": "Production",
-        "Project": "ProjectX"
-        "cust": "mt"
+        "Project": "ProjectX",
+        "cust": "mt",
         "env": "prvl"
     }
 
@@ -2,6 +2,9 @@ import boto3
 import re
 from botocore.exceptions import NoCredentialsError, PartialCredentialsError, ClientError
 
+from arns import build_arn
+from tagging import tag_resources
+
 def get_resource_arns_by_name(resource_name):
     """Retrieve AWS resource ARNs by resource name."""
     try:
@@ -9,7 +12,7 @@ def get_resource_arns_by_name(resource_name):
         if resource_name == "ec2":
             ec2_client = boto3.client('ec2')
             for vpc in ec2_client.describe_vpcs().get('Vpcs', []):
-                arns.append(vpc['VpcId'])
+                arns.append(build_arn("vpc", vpc['VpcId'], account=vpc.get('OwnerId')))
 
         elif resource_name == "s3":
             s3_client = boto3.client('s3')
@@ -48,12 +51,12 @@ def get_resource_arns_by_name(resource_name):
         elif resource_name == "vpc":
             ec2_client = boto3.client('ec2')
             for vpc in ec2_client.describe_vpcs().get('Vpcs', []):
-                arns.append(f"arn:aws:ec2:{boto3.session.Session().region_name}:{boto3.client('sts').get_caller_identity().get('Account')}:vpc/{vpc['VpcId']}")
+                arns.append(build_arn("vpc", vpc['VpcId'], account=vpc.get('OwnerId')))
 
         elif resource_name == "elb":
             elb_client = boto3.client('elb')
             for lb in elb_client.describe_load_balancers().get('LoadBalancerDescriptions', []):
-                arns.append(f"arn:aws:elasticloadbalancing:{boto3.session.Session().region_name}:{boto3.client('sts').get_caller_identity().get('Account')}:loadbalancer/{lb['LoadBalancerName']}")
+                arns.append(build_arn("elb", lb['LoadBalancerName']))
 
             elbv2_client = boto3.client('elbv2')
             for lb in elbv2_client.describe_load_balancers().get('LoadBalancers', []):
@@ -62,7 +65,7 @@ def get_resource_arns_by_name(resource_name):
         elif resource_name == "cloudwatch-log-group":
             logs_client = boto3.client('logs')
             for log_group in logs_client.describe_log_groups().get('logGroups', []):
-                arns.append(f"arn:aws:logs:{boto3.session.Session().region_name}:{boto3.client('sts').get_caller_identity().get('Account')}:log-group:{log_group['logGroupName']}")
+                arns.append(build_arn("logs", log_group['logGroupName']))
 
         elif resource_name == "redis":
             redis_client = boto3.client('elasticache')
@@ -85,13 +88,7 @@ def get_resource_arns_by_name(resource_name):
 def tag_individual_resource(resource_arn, tags):
     """Apply tags to an AWS resource."""
     try:
-        tagging_client = boto3.client('resourcegroupstaggingapi')
-        response = tagging_client.tag_resources(ResourceARNList=[resource_arn], Tags=tags)
-
-        if response.get('FailedResourcesMap'):
-            print(f"Failed to tag resource: {resource_arn}")
-        else:
-            print(f"Successfully tagged resource: {resource_arn}")
+        tag_resources([resource_arn], tags)
 
     except (NoCredentialsError, PartialCredentialsError):
         print("AWS credentials not found or incomplete.")
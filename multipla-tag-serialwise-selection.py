@@ -1,6 +1,18 @@
+import os
+
 import boto3
 from botocore.exceptions import NoCredentialsError, PartialCredentialsError, ClientError
 
+from arns import build_arn, split_valid_arns
+from inventory import load_inventory
+from inventory_snapshot import DEFAULT_MAX_AGE, cached_inventory
+from resource_query import QuerySyntaxError, select
+from tag_cache import TagCache
+from aws_metrics import enable_from_environment
+from profiling import enable_from_command_line, span
+from tag_validation import TagValidationError, parse_tags
+from tagging import tag_resources
+
 def list_supported_resources():
     return [
         "ec2", "s3", "efs", "lambda", "ecs-cluster", "ecs-service", "ecs-task",
@@ -19,7 +31,7 @@ def get_resource_arns_by_name(resource_name):
             instances = ec2_client.describe_instances()
             for reservation in instances['Reservations']:
                 for instance in reservation['Instances']:
-                    arns.append(f"arn:aws:ec2:{boto3.session.Session().region_name}::instance/{instance['InstanceId']}")
+                    arns.append(build_arn("ec2", instance['InstanceId'], account=reservation.get('OwnerId')))
 
         elif resource_name == "s3":
             s3_client = boto3.client('s3')
@@ -68,7 +80,7 @@ def get_resource_arns_by_name(resource_name):
             ec2_client = boto3.client('ec2')
             vpcs = ec2_client.describe_vpcs()['Vpcs']
             for vpc in vpcs:
-                arns.append(f"arn:aws:ec2:{boto3.session.Session().region_name}::vpc/{vpc['VpcId']}")
+                arns.append(build_arn("vpc", vpc['VpcId'], account=vpc.get('OwnerId')))
 
         elif resource_name == "elb":
             elb_client = boto3.client('elbv2')
@@ -80,7 +92,7 @@ def get_resource_arns_by_name(resource_name):
             logs_client = boto3.client('logs')
             log_groups = logs_client.describe_log_groups()['logGroups']
             for log_group in log_groups:
-                arns.append(f"arn:aws:logs:{boto3.session.Session().region_name}:{log_group['logGroupName']}")
+                arns.append(build_arn("logs", log_group['logGroupName']))
 
         elif resource_name == "redis":
             elasticache_client = boto3.client('elasticache')
@@ -101,20 +113,17 @@ def get_resource_arns_by_name(resource_name):
         print(f"An error occurred: {e}")
     return []
 
-def tag_multiple_resources(resource_arns, tags):
+def tag_multiple_resources(resource_arns, tags, existing_tags=None):
     """
     Tag multiple AWS resources with specific tags.
+
+    :param existing_tags: Optional mapping of ARN -> current tags; read from the tagging API
+        when not given, so the tag limit is checked on the merged tag set.
     """
     try:
-        client = boto3.client('resourcegroupstaggingapi')
-        response = client.tag_resources(
-            ResourceARNList=resource_arns,
-            Tags=tags
-        )
-        if response.get('FailedResourcesMap'):
-            print("Failed to tag some resources.")
-        else:
-            print(f"Successfully tagged resources: {resource_arns}")
+        if existing_tags is None:
+            existing_tags = TagCache().get_tags(split_valid_arns(resource_arns)[0])
+        tag_resources(resource_arns, tags, existing_tags=existing_tags)
 
     except (NoCredentialsError, PartialCredentialsError):
         print("AWS credentials not found or incomplete. Please configure your credentials.")
@@ -123,7 +132,56 @@ def tag_multiple_resources(resource_arns, tags):
     except Exception as e:
         print(f"An error occurred while tagging resources: {e}")
 
+def select_by_query(expression):
+    """
+    Select ARNs with a query over the tagged-resource inventory.
+
+    Queries the snapshot at $AWS_TAGGER_SNAPSHOT when set (see inventory_snapshot),
+    otherwise loads the inventory from the tagging API.
+
+    :param expression: e.g. 'type=ecs-service AND tag:env=prvl AND name~^acme-'
+    :return: (sorted list of matching ARNs, dictionary of ARN -> current tags).
+    """
+    snapshot_path = os.environ.get("AWS_TAGGER_SNAPSHOT")
+    if snapshot_path:
+        max_age = float(os.environ.get("AWS_TAGGER_SNAPSHOT_MAX_AGE") or DEFAULT_MAX_AGE)
+        inventory = cached_inventory(snapshot_path, max_age)
+    else:
+        inventory = load_inventory()
+    try:
+        arns = sorted(select(inventory, expression))
+    except QuerySyntaxError as e:
+        print(f"Invalid query: {e}")
+        return [], {}
+    return arns, {arn: dict(inventory.get_tags(arn) or {}) for arn in arns}
+
+def prompt_and_tag(selected_arns, existing_tags=None):
+    tags_input = input("Enter new tags as key=value pairs separated by commas: ")
+    try:
+        tags = parse_tags(tags_input)
+        tag_multiple_resources(selected_arns, tags, existing_tags)
+    except TagValidationError as e:
+        print(f"Invalid tag format: {e}. Use key=value pairs.")
+
 if __name__ == "__main__":
+    enable_from_environment()
+    enable_from_command_line()
+
+    expression = input("Enter a selection query (e.g. type=ecs-service AND tag:env=prvl AND name~^acme-), "
+                       "or press Enter to choose by serial number: ").strip()
+    if expression:
+        selected_arns, existing_tags = select_by_query(expression)
+        if not selected_arns:
+            print("No resources match the query.")
+            exit()
+        print(f"{len(selected_arns)} resources match the query:")
+        for arn in selected_arns[:20]:
+            print(f"  {arn}")
+        if len(selected_arns) > 20:
+            print(f"  ... and {len(selected_arns) - 20} more")
+        prompt_and_tag(selected_arns, existing_tags)
+        exit()
+
     resource_types = list_supported_resources()
     print("Select the AWS resource type:")
     for i, res_type in enumerate(resource_types, 1):
@@ -136,7 +194,8 @@ if __name__ == "__main__":
         print("Invalid selection.")
         exit()
 
-    resource_arns = get_resource_arns_by_name(resource_name)
+    with span("discovery"):
+        resource_arns = get_resource_arns_by_name(resource_name)
 
     if resource_arns:
         print(f"Retrieved ARNs for {resource_name}:")
@@ -148,12 +207,7 @@ if __name__ == "__main__":
         selected_arns = [resource_arns[i-1] for i in selected_indices if 1 <= i <= len(resource_arns)]
 
         if selected_arns:
-            tags_input = input("Enter new tags as key=value pairs separated by commas: ")
-            try:
-                tags = dict(tag.split('=') for tag in tags_input.split(','))
-                tag_multiple_resources(selected_arns, tags)
-            except ValueError:
-                print("Invalid tag format. Use key=value pairs.")
+            prompt_and_tag(selected_arns)
         else:
             print("Invalid selection.")
     else:
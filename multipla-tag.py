@@ -1,6 +1,11 @@
 import boto3
 from botocore.exceptions import NoCredentialsError, PartialCredentialsError
 
+from arns import split_valid_arns
+from tag_cache import TagCache
+from tag_validation import TagValidationError, parse_tags
+from tagging import tag_resources
+
 def get_resource_arns_by_name(resource_name):
     """
     Get AWS resource ARNs for a specific resource name.
@@ -113,16 +118,9 @@ def tag_multiple_resources(resource_arns, tags):
     :param tags: Dictionary of tags to apply.
     """
     try:
-        client = boto3.client('resourcegroupstaggingapi')
-        response = client.tag_resources(
-            ResourceARNList=resource_arns,
-            Tags=tags
-        )
-
-        if response.get('FailedResourcesMap'):
-            print(f"Failed to tag some resources.")
-        else:
-            print(f"Successfully tagged resources: {resource_arns}")
+        # Current tags, so the tag limit is checked on the merged tag set
+        existing_tags = TagCache().get_tags(split_valid_arns(resource_arns)[0])
+        tag_resources(resource_arns, tags, existing_tags=existing_tags)
 
     except NoCredentialsError:
         print("AWS credentials not found. Please configure your credentials.")
@@ -150,10 +148,13 @@ if __name__ == "__main__":
         if selected_arns:
             # Prompt user for new tags
             tags_input = input("Enter new tags as key=value pairs separated by commas: ")
-            tags = dict(tag.split('=') for tag in tags_input.split(','))
-
-            # Tag the selected resources
-            tag_multiple_resources(selected_arns, tags)
+            try:
+                tags = parse_tags(tags_input)
+            except TagValidationError as e:
+                print(f"Invalid tag format: {e}. Use key=value pairs.")
+            else:
+                # Tag the selected resources
+                tag_multiple_resources(selected_arns, tags)
         else:
             print("Invalid ARNs selected.")
     else:
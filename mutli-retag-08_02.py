@@ -1,6 +1,13 @@
 import boto3
 from botocore.exceptions import NoCredentialsError, PartialCredentialsError, ClientError
 
+from arns import build_arn, split_valid_arns
+from aws_metrics import enable_from_environment
+from profiling import enable_from_command_line, span
+from tag_cache import TagCache
+from tag_validation import TagValidationError, parse_tags
+from tagging import tag_resources
+
 def list_supported_resources():
     return [
         "ec2", "s3", "efs", "lambda", "ecs-cluster", "ecs-service", "ecs-task",
@@ -19,7 +26,7 @@ def get_resource_arns_by_name(resource_name):
             instances = ec2_client.describe_instances()
             for reservation in instances['Reservations']:
                 for instance in reservation['Instances']:
-                    arns.append(f"arn:aws:ec2:{boto3.session.Session().region_name}::instance/{instance['InstanceId']}")
+                    arns.append(build_arn("ec2", instance['InstanceId'], account=reservation.get('OwnerId')))
 
         elif resource_name == "s3":
             s3_client = boto3.client('s3')
@@ -68,7 +75,7 @@ def get_resource_arns_by_name(resource_name):
             ec2_client = boto3.client('ec2')
             vpcs = ec2_client.describe_vpcs()['Vpcs']
             for vpc in vpcs:
-                arns.append(f"arn:aws:ec2:{boto3.session.Session().region_name}::vpc/{vpc['VpcId']}")
+                arns.append(build_arn("vpc", vpc['VpcId'], account=vpc.get('OwnerId')))
 
         elif resource_name == "elb":
             elb_client = boto3.client('elbv2')
@@ -80,7 +87,7 @@ def get_resource_arns_by_name(resource_name):
             logs_client = boto3.client('logs')
             log_groups = logs_client.describe_log_groups()['logGroups']
             for log_group in log_groups:
-                arns.append(f"arn:aws:logs:{boto3.session.Session().region_name}:{log_group['logGroupName']}")
+                arns.append(build_arn("logs", log_group['logGroupName']))
 
         elif resource_name == "redis":
             elasticache_client = boto3.client('elasticache')
@@ -92,7 +99,7 @@ def get_resource_arns_by_name(resource_name):
             ec2_client = boto3.client('ec2')
             vpc_endpoints = ec2_client.describe_vpc_endpoints()['VpcEndpoints']
             for vpc_endpoint in vpc_endpoints:
-                arns.append(f"arn:aws:ec2:{boto3.session.Session().region_name}::vpc-endpoint/{vpc_endpoint['VpcEndpointId']}")
+                arns.append(build_arn("vpc-endpoint", vpc_endpoint['VpcEndpointId'], account=vpc_endpoint.get('OwnerId')))
 
         else:
             print(f"Resource name {resource_name} is not supported.")
@@ -112,15 +119,9 @@ def tag_multiple_resources(resource_arns, tags):
     Tag multiple AWS resources with specific tags.
     """
     try:
-        client = boto3.client('resourcegroupstaggingapi')
-        response = client.tag_resources(
-            ResourceARNList=resource_arns,
-            Tags=tags
-        )
-        if response.get('FailedResourcesMap'):
-            print("Failed to tag some resources.")
-        else:
-            print(f"Successfully tagged resources: {resource_arns}")
+        # Current tags, so the tag limit is checked on the merged tag set
+        existing_tags = TagCache().get_tags(split_valid_arns(resource_arns)[0])
+        tag_resources(resource_arns, tags, existing_tags=existing_tags)
 
     except (NoCredentialsError, PartialCredentialsError):
         print("AWS credentials not found or incomplete. Please configure your credentials.")
@@ -130,6 +131,9 @@ def tag_multiple_resources(resource_arns, tags):
         print(f"An error occurred while tagging resources: {e}")
 
 if __name__ == "__main__":
+    enable_from_environment()
+    enable_from_command_line()
+
     resource_types = list_supported_resources()
     print("Select the AWS resource type:")
     for i, res_type in enumerate(resource_types, 1):
@@ -142,7 +146,8 @@ if __name__ == "__main__":
         print("Invalid selection.")
         exit()
 
-    resource_arns = get_resource_arns_by_name(resource_name)
+    with span("discovery"):
+        resource_arns = get_resource_arns_by_name(resource_name)
 
     if resource_arns:
         print(f"Retrieved ARNs for {resource_name}:")
@@ -155,10 +160,10 @@ if __name__ == "__main__":
         if selected_arns:
             tags_input = input("Enter new tags as key=value pairs separated by commas: ")
             try:
-                tags = dict(tag.split('=') for tag in tags_input.split(','))
+                tags = parse_tags(tags_input)
                 tag_multiple_resources(selected_arns, tags)
-            except ValueError:
-                print("Invalid tag format. Use key=value pairs.")
+            except TagValidationError as e:
+                print(f"Invalid tag format: {e}. Use key=value pairs.")
         else:
             print("No valid ARNs entered.")
     else:
@@ -0,0 +1,11 @@
+import re
+
+# cust-env-appname-YYYY-N-N-N, e.g. acme-prvl-billing-2024-1-2-3
+NAME_PATTERN = re.compile(r"([a-zA-Z0-9]+)-([a-zA-Z0-9]+)-([a-zA-Z0-9]+)-\d{4}-\d+-\d+-\d+")
+
+def extract_info_from_name(name):
+    """Extract 'cust', 'env', and 'appname' from a resource name using the naming convention."""
+    match = NAME_PATTERN.match(name)
+    if match:
+        return {"cust": match.group(1), "env": match.group(2), "appname": match.group(3)}
+    return {}
@@ -0,0 +1,182 @@
+"""
+Opt-in profiling for tagging runs.
+
+Pass --profile[=PREFIX] to a script (or set AWS_TAGGER_PROFILE=PREFIX) to run it
+under cProfile and tracemalloc. At exit it writes:
+
+    PREFIX.pstats     cProfile statistics (python -m pstats PREFIX.pstats, snakeviz)
+    PREFIX.memory.txt peak traced memory and the top allocation sites
+    PREFIX.folded     span timings as collapsed stacks (flamegraph.pl, speedscope)
+
+Spans are named timers around the stages of a run (discovery, diff,
+batch-build, apply); nested spans form a stack. They cost one global lookup
+when profiling is off. cProfile only sees the thread that started it; spans
+are recorded from every thread.
+"""
+import atexit
+import cProfile
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+TOP_ALLOCATIONS = 25
+
+
+class SpanRecorder:
+    """Accumulates self time per span stack, in microseconds."""
+
+    def __init__(self, root):
+        self.root = root
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.self_us = Counter()
+        self.counts = Counter()
+
+    def stack(self):
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def enter(self, name):
+        # [name, started, time spent in child spans]
+        self.stack().append([name, time.perf_counter(), 0.0])
+
+    def exit(self):
+        stack = self.stack()
+        if not stack:
+            return
+        path = ";".join([self.root] + [frame[0] for frame in stack])
+        name, started, children = stack.pop()
+        elapsed = time.perf_counter() - started
+        if stack:
+            stack[-1][2] += elapsed
+        with self.lock:
+            self.self_us[path] += int((elapsed - children) * 1_000_000)
+            self.counts[path] += 1
+
+    def collapsed(self):
+        """Lines of 'root;outer;inner <self microseconds>'."""
+        with self.lock:
+            return [f"{path} {max(value, 0)}" for path, value in sorted(self.self_us.items())]
+
+
+class Span:
+    __slots__ = ("recorder", "name")
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.recorder.enter(self.name)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.recorder.exit()
+        return False
+
+
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = NullSpan()
+_recorder = None
+
+
+def span(name):
+    """Time a stage of the run: `with span("discovery"): ...`. No-op unless profiling is on."""
+    recorder = _recorder
+    return _NULL_SPAN if recorder is None else Span(recorder, name)
+
+
+class Profiler:
+    """cProfile + tracemalloc + span recording for one run."""
+
+    def __init__(self, prefix, trace_frames=10):
+        self.prefix = prefix
+        self.trace_frames = trace_frames
+        self.profile = None
+        self.spans = SpanRecorder(os.path.basename(sys.argv[0] or "python") or "python")
+        self.started = None
+
+    def start(self):
+        global _recorder
+        tracemalloc.start(self.trace_frames)
+        self.profile = cProfile.Profile()
+        self.started = time.perf_counter()
+        _recorder = self.spans
+        self.profile.enable()
+        return self
+
+    def stop(self):
+        """Stop profiling and write the report files. Returns their paths."""
+        global _recorder
+        if self.profile is None:
+            return []
+        self.profile.disable()
+        elapsed = time.perf_counter() - self.started
+        _recorder = None
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        directory = os.path.dirname(self.prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        paths = [f"{self.prefix}.pstats", f"{self.prefix}.memory.txt", f"{self.prefix}.folded"]
+        self.profile.dump_stats(paths[0])
+        with open(paths[1], "w") as file:
+            file.write(f"elapsed_s {elapsed:.3f}\n")
+            file.write(f"peak_bytes {peak}\n")
+            file.write(f"current_bytes {current}\n\n")
+            file.write(f"Top {TOP_ALLOCATIONS} allocation sites by size:\n")
+            for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+                file.write(f"{stat}\n")
+        with open(paths[2], "w") as file:
+            file.write("\n".join(self.spans.collapsed()) + "\n")
+        self.profile = None
+        return paths
+
+
+def enable_from_command_line(argv=None):
+    """
+    Start profiling when --profile[=PREFIX] is in argv or AWS_TAGGER_PROFILE is set.
+
+    The flag is removed from argv so the script's own argument handling never sees it.
+    Reports are written at exit.
+
+    :return: The Profiler, or None when profiling was not requested.
+    """
+    argv = sys.argv if argv is None else argv
+    prefix = os.environ.get("AWS_TAGGER_PROFILE")
+    for argument in list(argv[1:]):
+        if argument == "--profile" or argument.startswith("--profile="):
+            prefix = argument.partition("=")[2] or prefix or ""
+            argv.remove(argument)
+    if prefix is None:
+        return None
+    if not prefix:
+        script = os.path.splitext(os.path.basename(argv[0] or "python"))[0]
+        prefix = f"profile-{script}-{time.strftime('%Y%m%d-%H%M%S')}"
+
+    profiler = Profiler(prefix).start()
+
+    def finish():
+        paths = profiler.stop()
+        if paths:
+            print(f"Profile written to {', '.join(paths)}", file=sys.stderr)
+
+    atexit.register(finish)
+    return profiler
@@ -2,6 +2,10 @@ import boto3
 import re
 from botocore.exceptions import NoCredentialsError, PartialCredentialsError, ClientError
 
+from arns import build_arn
+from tag_validation import TagValidationError, parse_tags
+from tagging import tag_resources
+
 def get_resource_arns_by_name(resource_name):
     """Retrieve AWS resource ARNs by resource name."""
     try:
@@ -9,7 +13,7 @@ def get_resource_arns_by_name(resource_name):
         if resource_name == "ec2":
             ec2_client = boto3.client('ec2')
             for vpc in ec2_client.describe_vpcs().get('Vpcs', []):
-                arns.append(vpc['VpcId'])
+                arns.append(build_arn("vpc", vpc['VpcId'], account=vpc.get('OwnerId')))
 
         elif resource_name == "s3":
             s3_client = boto3.client('s3')
@@ -48,12 +52,12 @@ def get_resource_arns_by_name(resource_name):
         elif resource_name == "vpc":
             ec2_client = boto3.client('ec2')
             for vpc in ec2_client.describe_vpcs().get('Vpcs', []):
-                arns.append(f"arn:aws:ec2:{boto3.session.Session().region_name}::vpc/{vpc['VpcId']}")
+                arns.append(build_arn("vpc", vpc['VpcId'], account=vpc.get('OwnerId')))
 
         elif resource_name == "elb":
             elb_client = boto3.client('elb')
             for lb in elb_client.describe_load_balancers().get('LoadBalancerDescriptions', []):
-                arns.append(f"arn:aws:elasticloadbalancing:{boto3.session.Session().region_name}::{lb['LoadBalancerName']}")
+                arns.append(build_arn("elb", lb['LoadBalancerName']))
 
             elbv2_client = boto3.client('elbv2')
             for lb in elbv2_client.describe_load_balancers().get('LoadBalancers', []):
@@ -62,12 +66,12 @@ def get_resource_arns_by_name(resource_name):
         elif resource_name == "cloudwatch-log-group":
             logs_client = boto3.client('logs')
             for log_group in logs_client.describe_log_groups().get('logGroups', []):
-                arns.append(f"arn:aws:logs:{boto3.session.Session().region_name}::log-group:{log_group['logGroupName']}")
+                arns.append(build_arn("logs", log_group['logGroupName']))
 
         elif resource_name == "redis":
             redis_client = boto3.client('elasticache')
             for cluster in redis_client.describe_cache_clusters().get('CacheClusters', []):
-                arns.append(cluster['CacheClusterId'])
+                arns.append(build_arn("redis", cluster['CacheClusterId']))
 
         else:
             print(f"Resource name {resource_name} is not supported.")
@@ -101,13 +105,7 @@ def list_existing_tags(resource_arn):
 def tag_individual_resource(resource_arn, tags):
     """Apply tags to an AWS resource."""
     try:
-        tagging_client = boto3.client('resourcegroupstaggingapi')
-        response = tagging_client.tag_resources(ResourceARNList=[resource_arn], Tags=tags)
-
-        if response.get('FailedResourcesMap'):
-            print(f"Failed to tag resource: {resource_arn}")
-        else:
-            print(f"Successfully tagged resource: {resource_arn}")
+        tag_resources([resource_arn], tags)
 
     except (NoCredentialsError, PartialCredentialsError):
         print("AWS credentials not found or incomplete.")
@@ -156,10 +154,10 @@ if __name__ == "__main__":
     user_tags_input = input("Enter additional tags as key=value pairs (comma-separated): ").strip()
     if user_tags_input:
         try:
-            user_tags = dict(tag.split('=') for tag in user_tags_input.split(',') if '=' in tag)
+            user_tags = parse_tags(user_tags_input)
             tags_to_add.update(user_tags)
-        except ValueError:
-            print("Invalid tag format. Use 'key=value' pairs separated by commas.")
+        except TagValidationError as e:
+            print(f"Invalid tag format: {e}. Use 'key=value' pairs separated by commas.")
             exit(1)
 
     if tags_to_add:
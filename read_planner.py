@@ -0,0 +1,455 @@
+"""
+Plan the cheapest way to discover resources and read their tags, per type.
+
+The scripts list each resource type with its service API and then read tags
+one ARN at a time, which costs one call per resource. Depending on the type
+there are cheaper paths:
+
+    native        the listing already returns tags (EC2 DescribeInstances and
+                  DescribeVpcs, EFS DescribeFileSystems), or a batched describe
+                  does (ECS describe_* with include=TAGS, ELBv2 DescribeTags in 20s)
+    tagging-api   resourcegroupstaggingapi GetResources with a type filter,
+                  100 resources per page; never-tagged resources are not returned
+    list+lookup   the service listing, then GetResources with ResourceARNList
+                  for 100 ARNs per call
+    list+per-arn  the service listing, then one tag read per ARN (what the
+                  scripts do today)
+
+Call counts are estimated from the resource counts of a cached inventory
+snapshot (or --count) and the page limits of each API, and the cheapest
+strategy is chosen for every type. With --complete only strategies that also
+find never-tagged resources are considered.
+
+    python read_planner.py --snapshot inventory.snap --explain
+    python read_planner.py --count ecs-service=4000 --count ecs-cluster=40 --type ecs-service --explain
+    python read_planner.py --snapshot inventory.snap --output fresh.snap   # run the plan
+"""
+import argparse
+import os
+import sys
+from collections import Counter
+
+import boto3
+from botocore.exceptions import ClientError, NoCredentialsError, PartialCredentialsError
+
+from compact_inventory import CompactInventory
+from inventory import ARN_RESOURCE_TYPES, resource_type_from_arn, split_arn_resource
+from inventory_snapshot import SnapshotError, SnapshotInventory, write_snapshot
+
+NATIVE = "native"
+TAGGING_API = "tagging-api"
+LIST_LOOKUP = "list+lookup"
+LIST_PER_ARN = "list+per-arn"
+
+# Preference order when estimates tie
+STRATEGIES = (NATIVE, TAGGING_API, LIST_LOOKUP, LIST_PER_ARN)
+COMPLETE_STRATEGIES = (NATIVE, LIST_LOOKUP, LIST_PER_ARN)
+
+GET_RESOURCES_PAGE = 100
+ARN_LIST_LIMIT = 100
+DEFAULT_ASSUMED_COUNT = 1000
+
+# Resource type -> (listing operation, resources per page or None for unpaginated)
+LISTINGS = {
+    "ec2": ("ec2.DescribeInstances", 1000),
+    "vpc": ("ec2.DescribeVpcs", 1000),
+    "efs": ("efs.DescribeFileSystems", 100),
+    "s3": ("s3.ListBuckets", None),
+    "lambda": ("lambda.ListFunctions", 50),
+    "logs": ("logs.DescribeLogGroups", 50),
+    "redis": ("elasticache.DescribeCacheClusters", 100),
+    "dms": ("dms.DescribeReplicationTasks", 100),
+    "elb": ("elbv2.DescribeLoadBalancers", 400),
+}
+ECS_TYPES = ("ecs-cluster", "ecs-service", "ecs-task")
+
+# Types whose listing returns the tags
+TAGS_IN_LISTING = {"ec2", "vpc", "efs"}
+
+# Type -> (batched tag read, resources per call); ECS services and tasks are batched per cluster
+BATCH_TAG_READS = {
+    "elb": ("elbv2.DescribeTags", 20),
+    "ecs-cluster": ("ecs.DescribeClusters", 100),
+    "ecs-service": ("ecs.DescribeServices", 10),
+    "ecs-task": ("ecs.DescribeTasks", 100),
+}
+
+
+def pages(count, page_size):
+    """Calls to list `count` items `page_size` at a time; listing nothing still takes one call."""
+    if not page_size:
+        return 1
+    return max(1, -(-count // page_size))
+
+
+def batches(count, batch_size):
+    """Calls to process `count` items `batch_size` at a time (none for no items)."""
+    return -(-count // batch_size)
+
+
+def type_filters(resource_type):
+    """Tagging API ResourceTypeFilters values for a script-level type (e.g. 'redis' -> two filters)."""
+    filters = [f"{service}:{arn_type}" if arn_type else service
+               for (service, arn_type), name in ARN_RESOURCE_TYPES.items() if name == resource_type]
+    return filters or [resource_type]
+
+
+class EstateSizes:
+    """Resource counts per type, plus ECS services and tasks per cluster where known."""
+
+    def __init__(self, counts=None, per_cluster=None, assumed=()):
+        self.counts = dict(counts or {})
+        self.per_cluster = per_cluster or {}
+        self.assumed = set(assumed)
+
+    @classmethod
+    def from_inventory(cls, inventory, resource_types):
+        counts, per_cluster = {}, {}
+        for resource_type in set(resource_types) | {"ecs-cluster"}:
+            arns = inventory.with_type(resource_type)
+            counts[resource_type] = len(arns)
+            if resource_type in ("ecs-service", "ecs-task"):
+                by_cluster = Counter()
+                for arn in arns:
+                    # New-format ARNs embed the cluster: service/CLUSTER/NAME, task/CLUSTER/ID
+                    path = split_arn_resource(arn)[2].split("/")
+                    by_cluster[path[0] if len(path) > 1 else None] += 1
+                if None not in by_cluster:
+                    per_cluster[resource_type] = dict(by_cluster)
+        return cls(counts, per_cluster)
+
+    def count(self, resource_type):
+        return self.counts.get(resource_type, 0)
+
+    def cluster_counts(self, resource_type):
+        """Per-cluster counts of ECS services or tasks, spread evenly when not known."""
+        clusters = self.count("ecs-cluster")
+        by_cluster = self.per_cluster.get(resource_type)
+        if by_cluster is not None:
+            return list(by_cluster.values()) + [0] * max(0, clusters - len(by_cluster))
+        total = self.count(resource_type)
+        clusters = max(1, clusters)
+        return [total // clusters + (1 if index < total % clusters else 0) for index in range(clusters)]
+
+
+def listing_calls(resource_type, sizes):
+    """Calls to list every resource of a type with its service API, or None if there is no listing."""
+    if resource_type in ECS_TYPES:
+        calls = Counter({"ecs.ListClusters": pages(sizes.count("ecs-cluster"), 100)})
+        if resource_type == "ecs-service":
+            calls["ecs.ListServices"] = sum(pages(count, 10) for count in sizes.cluster_counts(resource_type))
+        elif resource_type == "ecs-task":
+            calls["ecs.ListTasks"] = sum(pages(count, 100) for count in sizes.cluster_counts(resource_type))
+        return calls
+    if resource_type not in LISTINGS:
+        return None
+    operation, page_size = LISTINGS[resource_type]
+    return Counter({operation: pages(sizes.count(resource_type), page_size)})
+
+
+def native_tag_calls(resource_type, sizes):
+    """Calls to read tags without the tagging API on top of the listing, or None if there is no such path."""
+    if resource_type in TAGS_IN_LISTING:
+        return Counter()
+    if resource_type not in BATCH_TAG_READS:
+        return None
+    operation, batch_size = BATCH_TAG_READS[resource_type]
+    if resource_type in ("ecs-service", "ecs-task"):
+        return Counter({operation: sum(batches(count, batch_size) for count in sizes.cluster_counts(resource_type))})
+    return Counter({operation: batches(sizes.count(resource_type), batch_size)})
+
+
+def estimate(resource_type, strategy, sizes):
+    """
+    Expected calls of one strategy for one type.
+
+    :return: Counter of operation -> calls, or None when the strategy does not apply to the type.
+    """
+    count = sizes.count(resource_type)
+    if strategy == TAGGING_API:
+        return Counter({"tagging.GetResources": pages(count, GET_RESOURCES_PAGE)})
+    listing = listing_calls(resource_type, sizes)
+    if listing is None:
+        return None
+    if strategy == NATIVE:
+        tag_reads = native_tag_calls(resource_type, sizes)
+        return None if tag_reads is None else listing + tag_reads
+    if strategy == LIST_LOOKUP:
+        return listing + Counter({"tagging.GetResources": batches(count, ARN_LIST_LIMIT)})
+    return listing + Counter({"tagging.GetResources": count})
+
+
+class PlanEntry:
+    def __init__(self, resource_type, strategy, estimates):
+        """
+        :param strategy: The chosen strategy.
+        :param estimates: Dictionary of every applicable strategy -> Counter of expected calls.
+        """
+        self.resource_type = resource_type
+        self.strategy = strategy
+        self.estimates = estimates
+
+    @property
+    def calls(self):
+        return sum(self.estimates[self.strategy].values())
+
+
+def plan(resource_types, sizes, complete=False):
+    """Choose the cheapest strategy for each type; with `complete`, only ones that find untagged resources."""
+    allowed = COMPLETE_STRATEGIES if complete else STRATEGIES
+    entries = []
+    for resource_type in resource_types:
+        estimates = {}
+        for strategy in STRATEGIES:
+            calls = estimate(resource_type, strategy, sizes)
+            if calls is not None:
+                estimates[strategy] = calls
+        candidates = [strategy for strategy in allowed if strategy in estimates] or [TAGGING_API]
+        chosen = min(candidates, key=lambda strategy: sum(estimates[strategy].values()))
+        entries.append(PlanEntry(resource_type, chosen, estimates))
+    return entries
+
+
+def explain(entries, sizes):
+    """Human-readable plan: the chosen strategy per type, its calls, and the alternatives."""
+    lines = [f"{'type':<13} {'resources':>9}  {'strategy':<13} {'calls':>7}  alternatives"]
+    for entry in entries:
+        count = f"{sizes.count(entry.resource_type)}{'*' if entry.resource_type in sizes.assumed else ''}"
+        alternatives = ", ".join(f"{strategy} {sum(calls.values())}" for strategy, calls in entry.estimates.items()
+                                 if strategy != entry.strategy)
+        lines.append(f"{entry.resource_type:<13} {count:>9}  {entry.strategy:<13} {entry.calls:>7}  {alternatives}")
+        for operation, calls in sorted(entry.estimates[entry.strategy].items()):
+            lines.append(f"{'':<36}{calls:>7}  {operation}")
+    baseline = sum(sum(entry.estimates.get(LIST_PER_ARN, entry.estimates[entry.strategy]).values())
+                   for entry in entries)
+    lines.append(f"Total: {sum(entry.calls for entry in entries)} calls "
+                 f"(listing plus per-ARN tag reads: {baseline})")
+    if sizes.assumed:
+        lines.append(f"* no cached count, assumed {DEFAULT_ASSUMED_COUNT}")
+    return "\n".join(lines)
+
+
+def tags_dict(tags):
+    """Tag list ({Key, Value} or ECS {key, value}) as a dict."""
+    return {tag.get("Key", tag.get("key")): tag.get("Value", tag.get("value", "")) for tag in tags or []}
+
+
+class PlanRunner:
+    """Runs a plan, counting the calls it makes."""
+
+    def __init__(self, region=None):
+        self.region = region
+        self.clients = {}
+        self.calls = Counter()
+
+    def client(self, service):
+        if service not in self.clients:
+            self.clients[service] = boto3.client(service, region_name=self.region)
+        return self.clients[service]
+
+    def paginate(self, service, operation, label, **kwargs):
+        for page in self.client(service).get_paginator(operation).paginate(**kwargs):
+            self.calls[label] += 1
+            yield page
+
+    def call(self, service, operation, label, **kwargs):
+        self.calls[label] += 1
+        return getattr(self.client(service), operation)(**kwargs)
+
+    def region_name(self):
+        return self.region or boto3.session.Session().region_name
+
+    def list_resources(self, resource_type, with_tags):
+        """Yield (ARN, tags or None) for every resource of a type, using its service API."""
+        if resource_type in ECS_TYPES:
+            yield from self.list_ecs(resource_type, with_tags)
+        elif resource_type in ("ec2", "vpc"):
+            region = self.region_name()
+            # EC2 returns everything in one response unless asked to page; page as LISTINGS assumes
+            page_size = LISTINGS[resource_type][1]
+            if resource_type == "ec2":
+                for page in self.paginate("ec2", "describe_instances", "ec2.DescribeInstances", MaxResults=page_size):
+                    for reservation in page.get("Reservations", []):
+                        for instance in reservation.get("Instances", []):
+                            yield (f"arn:aws:ec2:{region}:{reservation['OwnerId']}:instance/{instance['InstanceId']}",
+                                   tags_dict(instance.get("Tags")))
+            else:
+                for page in self.paginate("ec2", "describe_vpcs", "ec2.DescribeVpcs", MaxResults=page_size):
+                    for vpc in page.get("Vpcs", []):
+                        yield f"arn:aws:ec2:{region}:{vpc['OwnerId']}:vpc/{vpc['VpcId']}", tags_dict(vpc.get("Tags"))
+        elif resource_type == "efs":
+            for page in self.paginate("efs", "describe_file_systems", "efs.DescribeFileSystems"):
+                for file_system in page.get("FileSystems", []):
+                    yield file_system["FileSystemArn"], tags_dict(file_system.get("Tags"))
+        elif resource_type == "s3":
+            for bucket in self.call("s3", "list_buckets", "s3.ListBuckets").get("Buckets", []):
+                yield f"arn:aws:s3:::{bucket['Name']}", None
+        elif resource_type == "elb":
+            arns = [balancer["LoadBalancerArn"]
+                    for page in self.paginate("elbv2", "describe_load_balancers", "elbv2.DescribeLoadBalancers")
+                    for balancer in page.get("LoadBalancers", [])]
+            if not with_tags:
+                yield from ((arn, None) for arn in arns)
+                return
+            for start in range(0, len(arns), 20):
+                response = self.call("elbv2", "describe_tags", "elbv2.DescribeTags", ResourceArns=arns[start:start + 20])
+                for description in response.get("TagDescriptions", []):
+                    yield description["ResourceArn"], tags_dict(description.get("Tags"))
+        else:
+            service, operation, items_key, arn_key = {
+                "lambda": ("lambda", "list_functions", "Functions", "FunctionArn"),
+                "logs": ("logs", "describe_log_groups", "logGroups", "arn"),
+                "redis": ("elasticache", "describe_cache_clusters", "CacheClusters", "ARN"),
+                "dms": ("dms", "describe_replication_tasks", "ReplicationTasks", "ReplicationTaskArn"),
+            }[resource_type]
+            try:
+                for page in self.paginate(service, operation, LISTINGS[resource_type][0]):
+                    for item in page.get(items_key, []):
+                        # Log group ARNs from DescribeLogGroups end with ':*'; the tagging API omits it
+                        yield item[arn_key].removesuffix(":*"), None
+            except ClientError as e:
+                # DMS reports an empty account as an error
+                if e.response["Error"]["Code"] != "ResourceNotFoundFault":
+                    raise
+
+    def list_ecs(self, resource_type, with_tags):
+        clusters = [arn for page in self.paginate("ecs", "list_clusters", "ecs.ListClusters")
+                    for arn in page.get("clusterArns", [])]
+        include = ["TAGS"] if with_tags else []
+        if resource_type == "ecs-cluster":
+            if not with_tags:
+                yield from ((arn, None) for arn in clusters)
+                return
+            for start in range(0, len(clusters), 100):
+                response = self.call("ecs", "describe_clusters", "ecs.DescribeClusters",
+                                     clusters=clusters[start:start + 100], include=include)
+                for cluster in response.get("clusters", []):
+                    yield cluster["clusterArn"], tags_dict(cluster.get("tags"))
+            return
+
+        listing, describe, batch_size = {
+            "ecs-service": (("list_services", "serviceArns", "ecs.ListServices"),
+                            ("describe_services", "services", "serviceArn", "ecs.DescribeServices"), 10),
+            "ecs-task": (("list_tasks", "taskArns", "ecs.ListTasks"),
+                         ("describe_tasks", "tasks", "taskArn", "ecs.DescribeTasks"), 100),
+        }[resource_type]
+        for cluster in clusters:
+            arns = [arn for page in self.paginate("ecs", listing[0], listing[2], cluster=cluster)
+                    for arn in page.get(listing[1], [])]
+            if not with_tags:
+                yield from ((arn, None) for arn in arns)
+                continue
+            operation, items_key, arn_key, label = describe
+            for start in range(0, len(arns), batch_size):
+                response = self.call("ecs", operation, label, cluster=cluster, include=include,
+                                     **{items_key: arns[start:start + batch_size]})
+                for item in response.get(items_key, []):
+                    yield item[arn_key], tags_dict(item.get("tags"))
+
+    def lookup_tags(self, arns, batch_size):
+        """Tags of known ARNs from the tagging API; ARNs it does not return have no tags."""
+        found = dict.fromkeys(arns, None)
+        for start in range(0, len(arns), batch_size):
+            response = self.call("resourcegroupstaggingapi", "get_resources", "tagging.GetResources",
+                                 ResourceARNList=arns[start:start + batch_size])
+            for resource in response.get("ResourceTagMappingList", []):
+                found[resource["ResourceARN"]] = tags_dict(resource.get("Tags"))
+        return [(arn, tags or {}) for arn, tags in found.items()]
+
+    def read(self, entry):
+        """Resources of one plan entry as (ARN, tags) pairs."""
+        if entry.strategy == TAGGING_API:
+            return [(resource["ResourceARN"], tags_dict(resource.get("Tags")))
+                    for page in self.paginate("resourcegroupstaggingapi", "get_resources", "tagging.GetResources",
+                                              ResourceTypeFilters=type_filters(entry.resource_type))
+                    for resource in page.get("ResourceTagMappingList", [])
+                    if resource_type_from_arn(resource["ResourceARN"]) == entry.resource_type]
+        listed = list(self.list_resources(entry.resource_type, entry.strategy == NATIVE))
+        if entry.strategy == NATIVE:
+            return listed
+        batch_size = ARN_LIST_LIMIT if entry.strategy == LIST_LOOKUP else 1
+        return self.lookup_tags([arn for arn, _ in listed], batch_size)
+
+
+def run_plan(entries, region=None):
+    """
+    Read every planned type.
+
+    :return: (CompactInventory of the resources found, Counter of calls made per operation).
+    """
+    runner = PlanRunner(region)
+    inventory = CompactInventory()
+    for entry in entries:
+        for arn, tags in runner.read(entry):
+            inventory.add(arn, tags)
+    return inventory, runner.calls
+
+
+def parse_counts(values):
+    counts = {}
+    for value in values or []:
+        resource_type, _, count = value.partition("=")
+        counts[resource_type] = int(count)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plan (and run) the cheapest tag read per resource type.")
+    parser.add_argument("--snapshot", default=os.environ.get("AWS_TAGGER_SNAPSHOT"),
+                        help="Inventory snapshot to take resource counts from (default: $AWS_TAGGER_SNAPSHOT).")
+    parser.add_argument("--count", action="append", metavar="TYPE=N", help="Resource count for a type (repeatable).")
+    parser.add_argument("--type", action="append", dest="types", choices=sorted(set(ARN_RESOURCE_TYPES.values())),
+                        help="Resource type to plan (repeatable, default: all).")
+    parser.add_argument("--complete", action="store_true",
+                        help="Only use strategies that also find never-tagged resources.")
+    parser.add_argument("--explain", action="store_true", help="Print the plan and expected calls, and stop.")
+    parser.add_argument("--output", help="Write the resources read to this inventory snapshot.")
+    parser.add_argument("--region")
+    args = parser.parse_args(argv)
+
+    resource_types = args.types or sorted(set(ARN_RESOURCE_TYPES.values()))
+    try:
+        counts = parse_counts(args.count)
+    except ValueError:
+        print("--count takes TYPE=N, e.g. --count ecs-service=4000")
+        return 1
+    sizes = EstateSizes()
+    if args.snapshot:
+        try:
+            with SnapshotInventory(args.snapshot) as snapshot:
+                sizes = EstateSizes.from_inventory(snapshot, resource_types)
+        except (OSError, SnapshotError) as e:
+            print(f"Cannot open snapshot: {e}")
+            return 1
+    sizes.counts.update(counts)
+    if not args.snapshot:
+        for resource_type in set(resource_types) | {"ecs-cluster"}:
+            if resource_type not in sizes.counts:
+                sizes.counts[resource_type] = DEFAULT_ASSUMED_COUNT
+                sizes.assumed.add(resource_type)
+
+    entries = plan(resource_types, sizes, args.complete)
+    print(explain(entries, sizes), file=sys.stdout if args.explain else sys.stderr)
+    if args.explain:
+        return 0
+
+    try:
+        inventory, calls = run_plan(entries, args.region)
+    except (NoCredentialsError, PartialCredentialsError):
+        print("AWS credentials not found or incomplete. Please configure your credentials.")
+        return 1
+    except ClientError as e:
+        print(f"AWS ClientError: {e.response['Error']['Message']}")
+        return 1
+    expected = sum(entry.calls for entry in entries)
+    print(f"Read {len(inventory)} resources in {sum(calls.values())} calls (planned {expected})")
+    if args.output:
+        write_snapshot(inventory, args.output, {"resource_type_filters": None, "region": args.region,
+                                                "read_plan": {entry.resource_type: entry.strategy
+                                                              for entry in entries}})
+        print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,62 +1,325 @@
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
 import boto3
+from botocore.exceptions import ClientError
+
+from arns import build_arn
+from inventory_snapshot import SnapshotError, SnapshotInventory, write_snapshot
+from naming import extract_info_from_name
+from tag_validation import TagValidationError, change_problems, parse_tags
+from tag_events import default_sink
+
+# Concurrent create calls in bulk mode
+DEFAULT_WORKERS = 8
+# Seconds between readiness polls, and how long to wait in total
+POLL_INTERVAL = 15
+POLL_TIMEOUT = 1800
+FAILED_STATUSES = {"create-failed", "incompatible-network", "incompatible-parameters", "deleting", "deleted"}
+# Describing by ID right after a create can miss the new resource (eventual consistency)
+NOT_FOUND_CODES = {"CacheClusterNotFound", "ReplicationGroupNotFoundFault"}
+
+MANIFEST_FIELDS = ("cluster_id", "instance_type", "parameter_group", "subnet_ids", "security_group_id")
+
+def resolve_tags(cluster_id, tags=None, infer=True):
+    """
+    Tags to create a cluster with: 'cust', 'env' and 'appname' inferred from the
+    cluster ID by the naming convention, overridden by explicit tags.
+
+    :raises TagValidationError: If ElastiCache would reject the tags (see tag_validation), so
+        the create call is never sent with them.
+    """
+    inferred = extract_info_from_name(cluster_id) if infer else {}
+    tags = {**inferred, **(tags or {})}
+    problems = change_problems(build_arn("redis", cluster_id), tags)
+    if problems:
+        raise TagValidationError(f"{cluster_id}: " + "; ".join(problems))
+    return tags
+
+def build_create_request(cluster_id, instance_type, parameter_group, subnet_group_name, security_group_id,
+                         cluster_mode, multi_az, tags=None):
+    """
+    Build the create call for a Redis cluster.
+
+    Tags are passed in the create call itself, so the cluster never needs a separate tagging pass.
+
+    :return: Tuple of (client method name, keyword arguments): create_replication_group when
+        cluster mode is on, create_cache_cluster otherwise.
+    """
+    kwargs = {
+        "CacheNodeType": instance_type,
+        "Engine": "redis",
+        "CacheParameterGroupName": parameter_group,
+        "SecurityGroupIds": [security_group_id],
+        "CacheSubnetGroupName": subnet_group_name,
+    }
+    if tags:
+        kwargs["Tags"] = [{"Key": key, "Value": value} for key, value in tags.items()]
+
+    if cluster_mode.lower() == "on":
+        kwargs["ReplicationGroupId"] = cluster_id
+        kwargs["ReplicationGroupDescription"] = f"Replication group for {cluster_id}"
+        kwargs["NumNodeGroups"] = 1  # Default to a single shard; you can adjust as needed
+        kwargs["ReplicasPerNodeGroup"] = 1  # Primary plus one replica
+        kwargs["AutomaticFailoverEnabled"] = True  # Required for cluster mode
+        if multi_az.lower() == "yes":
+            kwargs["MultiAZEnabled"] = True
+        return "create_replication_group", kwargs
+
+    if multi_az.lower() == "yes":
+        raise ValueError("Multi-AZ needs a replication group; enable cluster mode for it")
+    kwargs["CacheClusterId"] = cluster_id
+    kwargs["NumCacheNodes"] = 1  # Default for standalone Redis
+    return "create_cache_cluster", kwargs
 
-def create_redis_cluster(cluster_id, instance_type, parameter_group, vpc_id, subnet_ids, security_group_id, cluster_mode, multi_az):
+def created_arn(response):
+    """ARN of the cluster or replication group in a create response, if present."""
+    resource = response.get("ReplicationGroup") or response.get("CacheCluster") or {}
+    return resource.get("ARN")
+
+def record_created(arn, tags, inventory=None, sink=None):
+    """Record a new cluster in the event log and in a local inventory, so it needs no discovery pass."""
+    if inventory is not None:
+        inventory.add(arn, dict(tags))
+    (sink or default_sink()).record(arn, "create", "ok", tags=dict(tags))
+
+def load_snapshot(path):
+    """
+    Writable copy of the inventory snapshot at `path` and its metadata, or (None, None) when there
+    is no usable snapshot (a snapshot of only the new clusters would hide the rest of the estate).
+    """
+    try:
+        with SnapshotInventory(path) as snapshot:
+            return snapshot.to_compact(), dict(snapshot.meta)
+    except (OSError, SnapshotError) as e:
+        print(f"Not recording created clusters in {path}: {e}")
+        return None, None
+
+def save_snapshot(path, inventory, meta):
+    meta = dict(meta)
+    meta.pop("created", None)
+    write_snapshot(inventory, path, meta)
+    print(f"Recorded created clusters in {path}")
+
+def create_redis_cluster(cluster_id, instance_type, parameter_group, vpc_id, subnet_ids, security_group_id, cluster_mode, multi_az,
+                         tags=None, inventory=None):
     # Initialize the ElastiCache client
     client = boto3.client('elasticache')
 
     try:
-        # Prepare the arguments for the API request
-        kwargs = {
-            "CacheClusterId": cluster_id,
-            "CacheNodeType": instance_type,
-            "Engine": "redis",
-            "CacheParameterGroupName": parameter_group,
-            "SecurityGroupIds": [security_group_id],
-            "SubnetGroupName": create_subnet_group(client, cluster_id, subnet_ids),
-            "NumCacheNodes": 1,  # Default for standalone Redis
-        }
-
-        # Cluster mode (for Redis cluster mode)
-        if cluster_mode.lower() == "on":
-            kwargs.pop("CacheClusterId")  # Replace CacheClusterId with ReplicationGroupId
-            kwargs.pop("NumCacheNodes")
-            kwargs["ReplicationGroupId"] = cluster_id
-            kwargs["ReplicationGroupDescription"] = f"Replication group for {cluster_id}"
-            kwargs["NumNodeGroups"] = 1  # Default to a single shard; you can adjust as needed
-            kwargs["NumCacheClusters"] = 2  # Minimum 2 nodes for cluster mode
-
-        # Multi-AZ
-        if multi_az.lower() == "yes":
-            kwargs["PreferredAvailabilityZones"] = None  # Let AWS handle distribution
-            kwargs["MultiAZEnabled"] = True
+        tags = resolve_tags(cluster_id, tags)
+        subnet_group_name = SubnetGroupCache(client).ensure(
+            f"{cluster_id}-subnet-group", subnet_ids, f"Subnet group for {cluster_id}")
+        operation, kwargs = build_create_request(cluster_id, instance_type, parameter_group, subnet_group_name,
+                                                 security_group_id, cluster_mode, multi_az, tags)
 
         # Create the Redis cluster
-        if cluster_mode.lower() == "on":
-            response = client.create_replication_group(**kwargs)
-        else:
-            response = client.create_cache_cluster(**kwargs)
+        response = getattr(client, operation)(**kwargs)
 
         print("Redis cluster creation initiated. Details:")
         print(response)
+        arn = created_arn(response)
+        if arn:
+            record_created(arn, tags, inventory)
     except Exception as e:
         print(f"Error creating Redis cluster: {e}")
 
-def create_subnet_group(client, cluster_id, subnet_ids):
-    subnet_group_name = f"{cluster_id}-subnet-group"
-    try:
-        # Create the subnet group
-        client.create_cache_subnet_group(
-            CacheSubnetGroupName=subnet_group_name,
-            CacheSubnetGroupDescription=f"Subnet group for {cluster_id}",
-            SubnetIds=subnet_ids,
-        )
-        print(f"Subnet group '{subnet_group_name}' created successfully.")
-        return subnet_group_name
-    except Exception as e:
-        print(f"Error creating subnet group: {e}")
-        raise
+class SubnetGroupCache:
+    """
+    Cache subnet groups of an account, described once.
 
-if __name__ == "__main__":
+    ensure() returns an existing group by name, or one with exactly the requested
+    subnets, and only creates a group when neither exists. Safe to share between threads:
+    a thread needing a group another thread is creating waits for that create, and
+    creates of unrelated groups run in parallel.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.lock = threading.Lock()
+        self.by_name = {}
+        self.by_subnets = {}
+        # Name and subnet set -> Future of the create in progress for them
+        self.creating = {}
+        paginator = client.get_paginator('describe_cache_subnet_groups')
+        for page in paginator.paginate():
+            for group in page.get('CacheSubnetGroups', []):
+                self.remember(group['CacheSubnetGroupName'],
+                              [subnet['SubnetIdentifier'] for subnet in group.get('Subnets', [])])
+
+    def remember(self, name, subnet_ids):
+        self.by_name[name] = frozenset(subnet_ids)
+        self.by_subnets.setdefault(frozenset(subnet_ids), name)
+
+    def ensure(self, name, subnet_ids, description):
+        """Return the name of a subnet group covering `subnet_ids`, creating `name` if needed."""
+        subnets = frozenset(subnet_ids)
+        with self.lock:
+            if name in self.by_name:
+                return name
+            if subnets in self.by_subnets:
+                return self.by_subnets[subnets]
+            pending = self.creating.get(name) or self.creating.get(subnets)
+            if pending is None:
+                creation = self.creating[name] = self.creating[subnets] = Future()
+        if pending is not None:
+            return pending.result()
+
+        try:
+            self.client.create_cache_subnet_group(
+                CacheSubnetGroupName=name,
+                CacheSubnetGroupDescription=description,
+                SubnetIds=list(subnet_ids),
+            )
+        except BaseException as e:
+            with self.lock:
+                del self.creating[name], self.creating[subnets]
+            creation.set_exception(e)
+            raise
+        print(f"Subnet group '{name}' created successfully.")
+        with self.lock:
+            self.remember(name, subnet_ids)
+            del self.creating[name], self.creating[subnets]
+        creation.set_result(name)
+        return name
+
+def wait_until_available(client, cache_cluster_ids=(), replication_group_ids=(),
+                         interval=POLL_INTERVAL, timeout=POLL_TIMEOUT):
+    """
+    Wait for clusters and replication groups to become available.
+
+    Each round is one paginated describe_cache_clusters and one describe_replication_groups
+    covering everything still pending, instead of a waiter per resource.
+
+    :return: Dictionary of cluster ID -> final status ('timeout' if still pending at the deadline).
+    """
+    pending = {"cluster": set(cache_cluster_ids), "group": set(replication_group_ids)}
+    describe = {
+        "cluster": ('describe_cache_clusters', 'CacheClusterId', 'CacheClusters', 'CacheClusterStatus'),
+        "group": ('describe_replication_groups', 'ReplicationGroupId', 'ReplicationGroups', 'Status'),
+    }
+    statuses = {}
+    deadline = time.monotonic() + timeout
+
+    while any(pending.values()):
+        for kind, ids in pending.items():
+            if not ids:
+                continue
+            operation, id_key, result_key, status_key = describe[kind]
+            # A single pending resource is cheaper to describe by ID than by listing the account
+            kwargs = {id_key: next(iter(ids))} if len(ids) == 1 else {}
+            try:
+                for page in client.get_paginator(operation).paginate(**kwargs):
+                    for item in page.get(result_key, []):
+                        resource_id, status = item[id_key], item.get(status_key)
+                        if resource_id in ids and (status == "available" or status in FAILED_STATUSES):
+                            statuses[resource_id] = status
+                            print(f"{resource_id}: {status}")
+            except ClientError as e:
+                # Not visible yet: still pending, polled again next round
+                if e.response['Error']['Code'] not in NOT_FOUND_CODES:
+                    raise
+            ids.difference_update(statuses)
+
+        if not any(pending.values()):
+            break
+        if time.monotonic() >= deadline:
+            for ids in pending.values():
+                statuses.update({resource_id: "timeout" for resource_id in ids})
+            break
+        time.sleep(interval)
+    return statuses
+
+def load_manifest(path):
+    """
+    Load a bulk provisioning manifest.
+
+    The manifest is JSON with optional "defaults" applied to every entry of "clusters":
+
+        {"defaults": {"instance_type": "cache.t3.micro", "parameter_group": "default.redis7",
+                      "subnet_ids": ["subnet-1", "subnet-2"], "security_group_id": "sg-1"},
+         "clusters": [{"cluster_id": "acme-prvl-app1"},
+                      {"cluster_id": "acme-prvl-app2", "cluster_mode": "on", "multi_az": "yes"}]}
+
+    Entries may also set "subnet_group" to share one named subnet group, "tags" to
+    create the cluster with, and "infer_tags": false to skip the tags inferred from
+    the cluster ID.
+    """
+    with open(path) as file:
+        manifest = json.load(file)
+
+    defaults = {"cluster_mode": "off", "multi_az": "no", **manifest.get("defaults", {})}
+    specs = []
+    for entry in manifest.get("clusters", []):
+        spec = {**defaults, **entry}
+        missing = [field for field in MANIFEST_FIELDS if not spec.get(field)]
+        if missing:
+            raise ValueError(f"Manifest entry {entry} is missing {', '.join(missing)}")
+        specs.append(spec)
+
+    cluster_ids = [spec["cluster_id"] for spec in specs]
+    duplicates = sorted({cluster_id for cluster_id in cluster_ids if cluster_ids.count(cluster_id) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate cluster IDs in manifest: {', '.join(duplicates)}")
+    return specs
+
+def provision_one(client, subnet_groups, spec):
+    """
+    Create one cluster from a manifest entry.
+
+    :return: Tuple of ('cluster' or 'group', ARN from the response or None, tags it was created with).
+    """
+    cluster_id = spec["cluster_id"]
+    tags = resolve_tags(cluster_id, spec.get("tags"), spec.get("infer_tags", True))
+    subnet_group_name = subnet_groups.ensure(spec.get("subnet_group") or f"{cluster_id}-subnet-group",
+                                             spec["subnet_ids"], f"Subnet group for {cluster_id}")
+    operation, kwargs = build_create_request(cluster_id, spec["instance_type"], spec["parameter_group"],
+                                             subnet_group_name, spec["security_group_id"],
+                                             spec["cluster_mode"], spec["multi_az"], tags)
+    response = getattr(client, operation)(**kwargs)
+    return ("group" if operation == "create_replication_group" else "cluster"), created_arn(response), tags
+
+def provision_from_manifest(path, workers=DEFAULT_WORKERS, wait=True, interval=POLL_INTERVAL, timeout=POLL_TIMEOUT,
+                            inventory=None, sink=None):
+    """
+    Create every cluster in a manifest concurrently and optionally wait for them.
+
+    :param inventory: Optional inventory.Inventory or CompactInventory; created clusters are added
+        with their tags.
+    :param sink: EventSink receiving a 'create' event per cluster (default: tag_events.default_sink()).
+    :return: Dictionary of cluster ID -> status ('creating', 'available', 'failed: <error>', ...).
+    """
+    specs = load_manifest(path)
+    client = boto3.client('elasticache')
+    subnet_groups = SubnetGroupCache(client)
+
+    results = {}
+    created = {"cluster": [], "group": []}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(provision_one, client, subnet_groups, spec): spec["cluster_id"] for spec in specs}
+        for future in as_completed(futures):
+            cluster_id = futures[future]
+            try:
+                kind, arn, tags = future.result()
+                created[kind].append(cluster_id)
+                results[cluster_id] = "creating"
+                print(f"Redis cluster creation initiated: {cluster_id}")
+                if arn:
+                    record_created(arn, tags, inventory, sink)
+            except Exception as e:
+                results[cluster_id] = f"failed: {e}"
+                print(f"Error creating Redis cluster {cluster_id}: {e}")
+
+    if wait and (created["cluster"] or created["group"]):
+        print(f"Waiting for {len(created['cluster']) + len(created['group'])} clusters to become available...")
+        results.update(wait_until_available(client, created["cluster"], created["group"], interval, timeout))
+    return results
+
+def prompt_and_create(inventory=None):
     # Take inputs from the user
     cluster_id = input("Enter the Redis cluster ID (e.g., my-redis-cluster): ").strip()
     instance_type = input("Enter the instance type (e.g., cache.t2.micro): ").strip()
@@ -70,5 +333,39 @@ if __name__ == "__main__":
     cluster_mode = input("Enable cluster mode? (on/off): ").strip().lower()
     multi_az = input("Enable Multi-AZ deployment? (yes/no): ").strip().lower()
 
+    inferred_tags = extract_info_from_name(cluster_id)
+    if inferred_tags:
+        print(f"Tags inferred from the cluster ID: {inferred_tags}")
+    tags_input = input("Enter additional tags as key=value pairs separated by commas (optional): ").strip()
+    try:
+        tags = parse_tags(tags_input) if tags_input else {}
+    except TagValidationError as e:
+        print(f"Invalid tags: {e}")
+        return
+
     # Create the Redis cluster
-    create_redis_cluster(cluster_id, instance_type, parameter_group, vpc_id, subnet_ids, security_group_id, cluster_mode, multi_az)
+    create_redis_cluster(cluster_id, instance_type, parameter_group, vpc_id, subnet_ids, security_group_id, cluster_mode, multi_az,
+                         tags, inventory)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create ElastiCache Redis clusters, interactively or from a manifest.")
+    parser.add_argument("--manifest", help="JSON manifest of clusters to create concurrently.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Concurrent create calls.")
+    parser.add_argument("--no-wait", action="store_true", help="Return once creation has been initiated.")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL)
+    parser.add_argument("--timeout", type=float, default=POLL_TIMEOUT)
+    parser.add_argument("--snapshot", default=os.environ.get("AWS_TAGGER_SNAPSHOT"),
+                        help="Inventory snapshot to add the created clusters to (default: $AWS_TAGGER_SNAPSHOT).")
+    args = parser.parse_args()
+
+    inventory, meta = load_snapshot(args.snapshot) if args.snapshot else (None, None)
+    recorded = len(inventory) if inventory is not None else 0
+    if args.manifest:
+        results = provision_from_manifest(args.manifest, args.workers, not args.no_wait,
+                                          args.poll_interval, args.timeout, inventory)
+        for cluster_id, status in sorted(results.items()):
+            print(f"{cluster_id}: {status}")
+    else:
+        prompt_and_create(inventory)
+    if inventory is not None and len(inventory) != recorded:
+        save_snapshot(args.snapshot, inventory, meta)
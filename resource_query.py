@@ -0,0 +1,193 @@
+"""
+Selection expressions evaluated against an indexed Inventory.
+
+Grammar (keywords are case-insensitive):
+
+    expr   := term (OR term)*
+    term   := factor (AND factor)*
+    factor := NOT factor | '(' expr ')' | condition
+    condition:
+        type=ecs-service        resource type
+        tag:env=prvl            tag value (tag:env!=prvl for "tagged, other value")
+        tag:env                 tag key present
+        name=acme-api           exact name
+        name^=acme-             name prefix (trie lookup)
+        name~^acme-.*-api$      name regex; a literal '^' prefix is served by the trie
+        arn~:us-east-1:         regex over the ARN
+
+Values may be quoted with single or double quotes.
+"""
+import re
+
+REGEX_METACHARACTERS = set(".^$*+?{}[]\\|()")
+OPERATORS = ("!=", "^=", "=", "~")
+
+
+class QuerySyntaxError(ValueError):
+    """Raised for malformed selection expressions."""
+
+
+def tokenize(expression):
+    """Split an expression into words, parentheses and quoted strings."""
+    tokens = []
+    pattern = re.compile(r"""\s*(?:(\()|(\))|((?:[^\s()"']|"[^"]*"|'[^']*')+))""")
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = pattern.match(expression, position)
+        if not match or match.end() == position:
+            raise QuerySyntaxError(f"Unexpected input at position {position}: {expression[position:]!r}")
+        tokens.append(next(group for group in match.groups() if group is not None))
+        position = match.end()
+        while position < len(expression) and expression[position].isspace():
+            position += 1
+    return tokens
+
+
+def unquote(value):
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+        return value[1:-1]
+    return value
+
+
+def literal_prefix(pattern):
+    """Return the literal text a '^'-anchored regex must start with ('' if unanchored)."""
+    if not pattern.startswith("^") or "|" in pattern:
+        return ""
+    prefix = []
+    for char in pattern[1:]:
+        if char in REGEX_METACHARACTERS:
+            # A quantifier applies to the previous literal, so it is not part of the prefix
+            if char in "*?{" and prefix:
+                prefix.pop()
+            break
+        prefix.append(char)
+    return "".join(prefix)
+
+
+class Query:
+    """A parsed selection expression that can be evaluated against an Inventory."""
+
+    def __init__(self, expression):
+        self.expression = expression
+        self.tokens = tokenize(expression)
+        self.position = 0
+        if not self.tokens:
+            raise QuerySyntaxError("Empty selection expression.")
+        self.tree = self.parse_or()
+        if self.position != len(self.tokens):
+            raise QuerySyntaxError(f"Unexpected token: {self.tokens[self.position]!r}")
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self):
+        token = self.peek()
+        if token is None:
+            raise QuerySyntaxError("Unexpected end of expression.")
+        self.position += 1
+        return token
+
+    def parse_or(self):
+        nodes = [self.parse_and()]
+        while (self.peek() or "").upper() == "OR":
+            self.take()
+            nodes.append(self.parse_and())
+        return ("or", nodes) if len(nodes) > 1 else nodes[0]
+
+    def parse_and(self):
+        nodes = [self.parse_not()]
+        while (self.peek() or "").upper() == "AND":
+            self.take()
+            nodes.append(self.parse_not())
+        return ("and", nodes) if len(nodes) > 1 else nodes[0]
+
+    def parse_not(self):
+        token = self.take()
+        if token.upper() == "NOT":
+            return ("not", self.parse_not())
+        if token == "(":
+            node = self.parse_or()
+            if self.take() != ")":
+                raise QuerySyntaxError("Missing closing parenthesis.")
+            return node
+        if token == ")" or token.upper() in ("AND", "OR"):
+            raise QuerySyntaxError(f"Unexpected token: {token!r}")
+        return ("cond", self.parse_condition(token))
+
+    def parse_condition(self, token):
+        # The first operator in the token wins, so values may contain '=' or '~'
+        found = [(token.find(operator), -len(operator), operator) for operator in OPERATORS if operator in token]
+        if not found:
+            if token.startswith("tag:"):
+                return ("tag", token[4:], "exists", None)
+            raise QuerySyntaxError(f"Condition needs an operator (=, !=, ^=, ~): {token!r}")
+
+        operator = min(found)[2]
+        field, _, value = token.partition(operator)
+        value = unquote(value)
+        if field.startswith("tag:") and operator in ("=", "!="):
+            return ("tag", field[4:], operator, value)
+        if field == "type" and operator in ("=", "!="):
+            return ("type", None, operator, value)
+        if field == "name" and operator in ("=", "^=", "~"):
+            return ("name", None, operator, self.compile(value) if operator == "~" else value)
+        if field == "arn" and operator == "~":
+            return ("arn", None, operator, self.compile(value))
+        raise QuerySyntaxError(f"Unsupported condition: {token!r}")
+
+    @staticmethod
+    def compile(pattern):
+        try:
+            return re.compile(pattern)
+        except re.error as e:
+            raise QuerySyntaxError(f"Invalid regular expression {pattern!r}: {e}")
+
+    def evaluate(self, inventory):
+        """Return the set of ARNs in `inventory` matching the expression."""
+        return self.evaluate_node(self.tree, inventory)
+
+    def evaluate_node(self, node, inventory):
+        kind, payload = node
+        if kind == "and":
+            # Evaluate every operand, then intersect smallest-first
+            results = sorted((self.evaluate_node(child, inventory) for child in payload), key=len)
+            return set.intersection(*results)
+        if kind == "or":
+            return set().union(*(self.evaluate_node(child, inventory) for child in payload))
+        if kind == "not":
+            return inventory.arns() - self.evaluate_node(payload, inventory)
+        return self.evaluate_condition(payload, inventory)
+
+    @staticmethod
+    def evaluate_condition(condition, inventory):
+        field, key, operator, value = condition
+        if field == "type":
+            matched = inventory.with_type(value)
+            return inventory.arns() - matched if operator == "!=" else matched
+        if field == "tag":
+            if operator == "exists":
+                return inventory.with_tag(key)
+            if operator == "=":
+                return inventory.with_tag(key, value)
+            return inventory.with_tag(key) - inventory.with_tag(key, value)
+        if field == "name":
+            if operator == "=":
+                return {arn for arn in inventory.with_name_prefix(value) if inventory.names[arn] == value}
+            if operator == "^=":
+                return inventory.with_name_prefix(value)
+            prefix = literal_prefix(value.pattern)
+            candidates = inventory.with_name_prefix(prefix) if prefix else inventory.arns()
+            return {arn for arn in candidates if value.search(inventory.names[arn])}
+        return {arn for arn in inventory.arns() if value.search(arn)}
+
+
+def select(inventory, expression):
+    """
+    Return the ARNs in `inventory` matching a selection expression.
+
+    :param inventory: An Inventory (see inventory.load_inventory).
+    :param expression: Selection expression, e.g. 'type=ecs-service AND tag:env=prvl AND name~^acme-'.
+    :return: Set of matching ARNs.
+    """
+    return Query(expression).evaluate(inventory)
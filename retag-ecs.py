@@ -1,6 +1,9 @@
 import boto3
 from botocore.exceptions import NoCredentialsError, PartialCredentialsError
 
+from tag_validation import TagValidationError, change_problems, parse_tags
+from tagging import tag_resources
+
 def get_resource_arns_by_name(resource_name):
     """
     Get AWS resource ARNs for a specific resource name.
@@ -100,16 +103,7 @@ def tag_individual_resource(resource_arn, tags):
     :param tags: Dictionary of tags to apply.
     """
     try:
-        client = boto3.client('resourcegroupstaggingapi')
-        response = client.tag_resources(
-            ResourceARNList=[resource_arn],
-            Tags=tags
-        )
-
-        if response.get('FailedResourcesMap'):
-            print(f"Failed to tag resource: {resource_arn}")
-        else:
-            print(f"Successfully tagged resource: {resource_arn}")
+        tag_resources([resource_arn], tags)
 
     except NoCredentialsError:
         print("AWS credentials not found. Please configure your credentials.")
@@ -142,10 +136,18 @@ if __name__ == "__main__":
 
             # Prompt user for new tags
             tags_input = input("Enter new tags as key=value pairs separated by commas: ")
-            tags = dict(tag.split('=') for tag in tags_input.split(','))
-
-            # Tag the selected resource
-            tag_individual_resource(selected_arn, tags)
+            try:
+                tags = parse_tags(tags_input)
+            except TagValidationError as e:
+                print(f"Invalid tag format: {e}. Use key=value pairs.")
+            else:
+                # Check the resulting tag set before sending anything
+                problems = change_problems(selected_arn, tags, existing_tags)
+                if problems:
+                    print("Cannot apply these tags: " + "; ".join(problems))
+                else:
+                    # Tag the selected resource
+                    tag_individual_resource(selected_arn, tags)
         else:
             print("Invalid ARN selected.")
     else:
@@ -0,0 +1,133 @@
+"""
+Re-drive only the retryable failures of earlier tagging runs.
+
+Reads the failure log written by tag_resources / untag_resources (see failures.py),
+groups the outstanding retryable failures by the tags or keys they needed, and
+re-applies them in rounds with exponential backoff between rounds. No discovery
+or tag reads happen: the log already holds everything the calls need.
+
+Resources that succeed are dropped: at the end the log is rewritten to just
+the failures still outstanding (permanent and auth failures are kept for
+inspection, and retried too with --include-auth once permissions are fixed).
+
+    python retry_failed.py                       # retry the default log
+    python retry_failed.py --file run.failures.jsonl --rounds 5
+    python retry_failed.py --summary             # only show what is outstanding
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+from botocore.exceptions import NoCredentialsError, PartialCredentialsError
+
+from failures import AUTH, DEFAULT_PATH, RETRYABLE, FailureLog, load_pending, rewrite
+from tagging import tag_resources, untag_resources
+
+DEFAULT_ROUNDS = 3
+DEFAULT_BACKOFF_S = 2.0
+MAX_BACKOFF_S = 60.0
+DEFAULT_MAX_AGE_S = 7 * 24 * 3600
+
+
+def retry_groups(entries):
+    """Group failure entries into calls: [(action, tags dict or key tuple, ARNs)]."""
+    groups = {}
+    for entry in entries:
+        if entry["action"] == "tag":
+            payload = tuple(sorted((entry.get("tags") or {}).items()))
+        else:
+            payload = tuple(entry.get("keys") or ())
+        groups.setdefault((entry["action"], payload), []).append(entry["arn"])
+    return [(action, dict(payload) if action == "tag" else payload, arns) for (action, payload), arns in groups.items()]
+
+
+def backoff_delay(round_number, base_s=DEFAULT_BACKOFF_S):
+    """Full-jitter exponential backoff before retry round `round_number` (1-based)."""
+    return random.uniform(0, min(MAX_BACKOFF_S, base_s * 2 ** (round_number - 1)))
+
+
+def retry_failed(path=DEFAULT_PATH, rounds=DEFAULT_ROUNDS, classes=(RETRYABLE,), max_age_s=DEFAULT_MAX_AGE_S,
+                 backoff_s=DEFAULT_BACKOFF_S, sink=None, client=None):
+    """
+    Retry the outstanding failures of the chosen classes.
+
+    :param max_age_s: Failures older than this are dropped rather than retried, so stale tag
+        values are never re-applied over later changes.
+    :return: Counter with 'resolved', 'failed' (still outstanding after the last round) and 'expired'.
+    """
+    pending = load_pending(path)
+    now = time.time()
+    totals = Counter()
+    for key in [key for key, entry in pending.items() if now - entry.get("ts", now) > max_age_s]:
+        del pending[key]
+        totals["expired"] += 1
+
+    for round_number in range(1, rounds + 1):
+        due = [entry for entry in pending.values() if entry["class"] in classes]
+        if not due:
+            break
+        if round_number > 1:
+            time.sleep(backoff_delay(round_number - 1, backoff_s))
+        print(f"Round {round_number}: retrying {len(due)} resources", file=sys.stderr)
+
+        # Outcomes are folded into `pending`, which replaces the log at the end
+        attempt = FailureLog(None)
+        for action, payload, arns in retry_groups(due):
+            if action == "tag":
+                tag_resources(arns, payload, sink=sink, client=client, failures=attempt)
+            else:
+                untag_resources(arns, payload, sink=sink, client=client, failures=attempt)
+        retried = {(entry["action"], entry["arn"]): entry for entry in due}
+        for key in retried:
+            del pending[key]
+        for entry in attempt.entries:
+            key = (entry["action"], entry["arn"])
+            pending[key] = dict(entry, attempts=retried[key].get("attempts", 1) + 1)
+        totals["resolved"] += len(due) - len(attempt.entries)
+
+    totals["failed"] = sum(1 for entry in pending.values() if entry["class"] in classes)
+    rewrite(path, pending.values())
+    return totals
+
+
+def summarize(path=DEFAULT_PATH):
+    """Outstanding failures per class and error code."""
+    counts = Counter((entry["class"], entry.get("error_code")) for entry in load_pending(path).values())
+    return sorted(counts.items())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Retry only the retryable failures recorded by earlier runs.")
+    parser.add_argument("--file", default=None, help=f"Failure log (default: $AWS_TAGGER_FAILURES or {DEFAULT_PATH}).")
+    parser.add_argument("--rounds", type=int, default=DEFAULT_ROUNDS, help="Retry rounds, with backoff between them.")
+    parser.add_argument("--backoff", type=float, default=DEFAULT_BACKOFF_S, help="Base backoff in seconds.")
+    parser.add_argument("--include-auth", action="store_true", help="Also retry access-denied failures.")
+    parser.add_argument("--max-age", type=float, default=DEFAULT_MAX_AGE_S,
+                        help="Drop failures older than this many seconds instead of retrying them.")
+    parser.add_argument("--summary", action="store_true", help="Only list outstanding failures.")
+    args = parser.parse_args(argv)
+    path = args.file or os.environ.get("AWS_TAGGER_FAILURES") or DEFAULT_PATH
+
+    if args.summary:
+        for (failure_class, error_code), count in summarize(path):
+            print(f"{failure_class:10} {error_code}: {count}")
+        return 0
+
+    classes = (RETRYABLE, AUTH) if args.include_auth else (RETRYABLE,)
+    try:
+        totals = retry_failed(path, args.rounds, classes, args.max_age, args.backoff)
+    except (NoCredentialsError, PartialCredentialsError):
+        print("AWS credentials not found or incomplete. Please configure your credentials.")
+        return 1
+    except (OSError, ValueError) as e:
+        print(f"Cannot read failure log: {e}")
+        return 1
+    print(f"{totals['resolved']} resolved, {totals['failed']} still failing, {totals['expired']} expired")
+    return 2 if totals["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+Deadline-bounded, prioritized scheduling for cron sweeps.
+
+A sweep that checks resources in listing order spends its window on whatever
+is listed first. Here the discovered resources are ordered by value instead,
+using per-resource metadata kept from earlier runs:
+
+    1. new             never verified, newest first
+    2. noncompliant    the last check left required tags missing (or failed)
+    3. verified        least recently verified first
+
+and work stops once the time left is less than the expected cost of the next
+resource, estimated from the average time per resource of earlier runs. What
+is not reached keeps its old metadata, so it sorts ahead in the next run: work
+carries over without a separate queue.
+
+The state is a JSON file written atomically at the end of the run (and on
+SIGTERM, via the caller's finally block).
+"""
+import json
+import os
+import time
+
+NEW = 0
+NONCOMPLIANT = 1
+VERIFIED = 2
+
+PRIORITY_NAMES = {NEW: "new", NONCOMPLIANT: "noncompliant", VERIFIED: "verified"}
+
+DEFAULT_SECONDS_PER_ITEM = 0.2
+# Weight of the newest observation in the per-item cost average, once it has enough samples
+COST_SMOOTHING = 0.1
+# Stop when less than this many expected item costs remain
+SAFETY_FACTOR = 2.0
+
+
+class SweepState:
+    """
+    Per-resource metadata carried between runs: ARN -> [first seen, last verified or None,
+    compliant or None], plus the average seconds per resource and how many resources it averages.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.resources = {}
+        self.seconds_per_item = DEFAULT_SECONDS_PER_ITEM
+        self.cost_samples = 0
+        if path and os.path.exists(path):
+            with open(path) as file:
+                data = json.load(file)
+            self.resources = data.get("resources", {})
+            self.seconds_per_item = data.get("seconds_per_item", DEFAULT_SECONDS_PER_ITEM)
+            self.cost_samples = data.get("cost_samples", 0)
+
+    def seen(self, arn, now):
+        if arn not in self.resources:
+            self.resources[arn] = [now, None, None]
+
+    def verified(self, arn, compliant, now):
+        entry = self.resources.setdefault(arn, [now, None, None])
+        entry[1], entry[2] = now, compliant
+
+    def forget_missing(self, discovered):
+        """Drop resources that a complete discovery no longer lists."""
+        for arn in [arn for arn in self.resources if arn not in discovered]:
+            del self.resources[arn]
+
+    def observe_cost(self, seconds):
+        # A plain mean until there are enough samples, then a moving average
+        self.cost_samples += 1
+        weight = max(COST_SMOOTHING, 1.0 / self.cost_samples)
+        self.seconds_per_item += weight * (seconds - self.seconds_per_item)
+
+    def priority(self, arn):
+        """(priority class, sort key) of a resource; lower sorts first."""
+        first_seen, verified, compliant = self.resources.get(arn, [0.0, None, None])
+        if verified is None:
+            return NEW, -first_seen
+        if not compliant:
+            return NONCOMPLIANT, verified
+        return VERIFIED, verified
+
+    def save(self):
+        if not self.path:
+            return
+        temporary = f"{self.path}.tmp.{os.getpid()}"
+        with open(temporary, "w") as file:
+            json.dump({"seconds_per_item": round(self.seconds_per_item, 6), "cost_samples": self.cost_samples,
+                       "resources": self.resources}, file, separators=(",", ":"))
+        os.replace(temporary, self.path)
+
+
+class Deadline:
+    """Time budget of a run; `seconds` None means unbounded."""
+
+    def __init__(self, seconds=None, clock=time.monotonic):
+        self.clock = clock
+        self.ends = None if seconds is None else clock() + seconds
+
+    def remaining(self):
+        return float("inf") if self.ends is None else self.ends - self.clock()
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def fits(self, expected_seconds):
+        return self.remaining() >= expected_seconds * SAFETY_FACTOR
+
+
+def schedule(arns, state):
+    """Order ARNs by priority class, then by their key within the class."""
+    return sorted(arns, key=state.priority)
+
+
+def run_scheduled(arns, process, state, deadline, clock=time.monotonic):
+    """
+    Process resources in priority order until the deadline no longer fits the next one
+    (at least one is always processed).
+
+    :param process: Function of an ARN returning True when it is compliant (tags present or
+        applied), False when tags are still missing, and None when it could not be checked (its
+        tags could not be read); such a resource is not recorded as verified and keeps its place.
+    :return: Dictionary with 'done' and 'left' counts per priority class name, and the number
+        of processed resources that could not be checked ('unverified').
+    """
+    done = {name: 0 for name in PRIORITY_NAMES.values()}
+    left = dict(done)
+    unverified = 0
+    ordered = schedule(arns, state)
+    for index, arn in enumerate(ordered):
+        # The first resource always runs, so the cost estimate keeps learning and every run makes progress
+        if index and not deadline.fits(state.seconds_per_item):
+            for remaining_arn in ordered[index:]:
+                left[PRIORITY_NAMES[state.priority(remaining_arn)[0]]] += 1
+            break
+        priority_name = PRIORITY_NAMES[state.priority(arn)[0]]
+        started = clock()
+        compliant = process(arn)
+        state.observe_cost(clock() - started)
+        if compliant is None:
+            unverified += 1
+        else:
+            state.verified(arn, compliant, time.time())
+        done[priority_name] += 1
+    return {"done": done, "left": left, "unverified": unverified}
@@ -0,0 +1,298 @@
+"""
+Tag statistics of the estate in one streaming pass over the tagging API.
+
+Reports key cardinality, value distribution per key, near-duplicate keys
+(Env / env / environment) and values (Prod / prod), and per type the
+resources whose tags were all removed. The 'renames' section lists the key
+renames that would normalise each near-duplicate group, ready to drive a
+bulk retag job.
+
+The counts cover the resources get_resources returns: those tagged at some
+point. Resources that were never tagged are not returned by the tagging API,
+so 'tags_removed' is not an estate-wide untagged count; read_planner
+--complete lists resources from the service APIs, untagged ones included.
+
+Memory is bounded: only counters over interned strings are kept, never a
+per-resource record, and at most --max-values distinct values are counted
+per key. For keys past that cap the exact number of distinct values comes
+from get_tag_values, which is estate-wide; with --type it is estimated in the
+pass instead, with a fixed-size sketch of the values past the cap (KMV, about
+3% error; exact while fewer than --sketch-size values overflow).
+
+    python tag_analytics.py --output tag_report.json
+    python tag_analytics.py --type ecs:service --type lambda --format human
+"""
+import argparse
+import heapq
+import json
+import re
+import sys
+from collections import Counter
+
+import boto3
+from botocore.exceptions import NoCredentialsError, PartialCredentialsError, ClientError
+
+from inventory import resource_type_from_arn
+
+DEFAULT_MAX_VALUES = 1000
+# Hashes kept per key by DistinctSketch; the relative error is about 1/sqrt(size)
+DEFAULT_SKETCH_SIZE = 1024
+HASH_SPACE = 1 << 64
+TOP_VALUES = 20
+
+# Normalised spellings that mean the same key
+KEY_SYNONYMS = {
+    "environment": "env",
+    "application": "appname",
+    "app": "appname",
+    "applicationname": "appname",
+    "customer": "cust",
+    "client": "cust",
+}
+
+NON_ALPHANUMERIC = re.compile(r"[^a-z0-9]")
+
+
+def normalize_key(key):
+    """Canonical form used to group near-duplicate keys: lowercase, alphanumeric only, synonyms folded."""
+    folded = NON_ALPHANUMERIC.sub("", key.lower())
+    return KEY_SYNONYMS.get(folded, folded)
+
+
+def normalize_value(value):
+    return value.strip().lower()
+
+
+class DistinctSketch:
+    """
+    K-minimum-values distinct count estimate in fixed memory: the `size` smallest value hashes
+    are kept, and the distinct count follows from how small the largest of them is.
+    """
+
+    def __init__(self, size=DEFAULT_SKETCH_SIZE):
+        self.size = size
+        # Max-heap (negated) of the smallest hashes seen, and the same hashes as a set
+        self.heap = []
+        self.hashes = set()
+
+    def add(self, value):
+        value_hash = hash(value) % HASH_SPACE
+        if value_hash in self.hashes:
+            return
+        if len(self.heap) < self.size:
+            heapq.heappush(self.heap, -value_hash)
+            self.hashes.add(value_hash)
+        elif value_hash < -self.heap[0]:
+            self.hashes.discard(-heapq.heappushpop(self.heap, -value_hash))
+            self.hashes.add(value_hash)
+
+    def exact(self):
+        return len(self.heap) < self.size
+
+    def estimate(self):
+        if self.exact():
+            return len(self.heap)
+        return round((self.size - 1) * HASH_SPACE / (-self.heap[0] + 1))
+
+
+class TagStatistics:
+    """Streaming aggregation of tag usage."""
+
+    def __init__(self, max_values=DEFAULT_MAX_VALUES, count_overflow=False, sketch_size=DEFAULT_SKETCH_SIZE):
+        """
+        :param count_overflow: Estimate the distinct values past max_values of every key with a
+            DistinctSketch of `sketch_size` hashes, without get_tag_values.
+        """
+        self.max_values = max_values
+        self.count_overflow = count_overflow
+        self.sketch_size = sketch_size
+        self.overflow_sketches = {}
+        self.resources = 0
+        self.by_type = Counter()
+        # Returned with an empty tag set: tagged once, every tag since removed
+        self.tags_removed_by_type = Counter()
+        self.key_counts = Counter()
+        self.value_counts = {}
+        self.overflow = Counter()
+        self.tags_per_resource = Counter()
+
+    def add(self, arn, tags):
+        """Count one resource. `tags` is the tagging API's [{'Key', 'Value'}] list."""
+        resource_type = sys.intern(resource_type_from_arn(arn))
+        self.resources += 1
+        self.by_type[resource_type] += 1
+        self.tags_per_resource[len(tags)] += 1
+        if not tags:
+            self.tags_removed_by_type[resource_type] += 1
+            return
+        for tag in tags:
+            key = sys.intern(tag['Key'])
+            self.key_counts[key] += 1
+            values = self.value_counts.get(key)
+            if values is None:
+                values = self.value_counts[key] = Counter()
+            value = tag.get('Value', '')
+            if value in values or len(values) < self.max_values:
+                values[sys.intern(value)] += 1
+            else:
+                self.overflow[key] += 1
+                if self.count_overflow:
+                    sketch = self.overflow_sketches.get(key)
+                    if sketch is None:
+                        sketch = self.overflow_sketches[key] = DistinctSketch(self.sketch_size)
+                    sketch.add(value)
+
+    def near_duplicate_keys(self):
+        """Groups of keys with the same normalised form, most used spelling first."""
+        groups = {}
+        for key, count in self.key_counts.items():
+            groups.setdefault(normalize_key(key), []).append((key, count))
+        return {
+            canonical: sorted(variants, key=lambda variant: (-variant[1], variant[0]))
+            for canonical, variants in sorted(groups.items())
+            if len(variants) > 1
+        }
+
+    def near_duplicate_values(self, key):
+        groups = {}
+        for value, count in self.value_counts.get(key, {}).items():
+            groups.setdefault(normalize_value(value), []).append((value, count))
+        return [sorted(variants, key=lambda variant: (-variant[1], variant[0]))
+                for _, variants in sorted(groups.items()) if len(variants) > 1]
+
+    def report(self, distinct_values=None):
+        """
+        Build the report.
+
+        :param distinct_values: Optional key -> exact distinct value count (from get_tag_values),
+            used for keys whose values overflowed max_values.
+        """
+        distinct_values = dict(distinct_values or {})
+        for key, sketch in self.overflow_sketches.items():
+            distinct_values.setdefault(key, len(self.value_counts[key]) + sketch.estimate())
+        keys = []
+        for key, count in self.key_counts.most_common():
+            values = self.value_counts.get(key, Counter())
+            keys.append({
+                "key": key,
+                "resources": count,
+                "coverage": round(count / self.resources, 4) if self.resources else 0.0,
+                "distinct_values": distinct_values.get(key, len(values)),
+                "distinct_values_estimated": key in self.overflow_sketches and not self.overflow_sketches[key].exact(),
+                "values_truncated": key in self.overflow,
+                "top_values": values.most_common(TOP_VALUES),
+                "near_duplicate_values": self.near_duplicate_values(key),
+            })
+
+        duplicates = self.near_duplicate_keys()
+        renames = [
+            {"from": variant, "to": variants[0][0], "resources": count}
+            for variants in duplicates.values()
+            for variant, count in variants[1:]
+        ]
+        return {
+            "resources": self.resources,
+            "tagged": self.resources - sum(self.tags_removed_by_type.values()),
+            "tags_removed": sum(self.tags_removed_by_type.values()),
+            "distinct_keys": len(self.key_counts),
+            "tags_per_resource": dict(sorted(self.tags_per_resource.items())),
+            "by_type": {
+                resource_type: {"resources": count,
+                                "tags_removed": self.tags_removed_by_type.get(resource_type, 0)}
+                for resource_type, count in sorted(self.by_type.items())
+            },
+            "keys": keys,
+            "near_duplicate_keys": {canonical: [{"key": key, "resources": count} for key, count in variants]
+                                    for canonical, variants in duplicates.items()},
+            "renames": renames,
+        }
+
+
+def collect(resource_type_filters=None, max_values=DEFAULT_MAX_VALUES, region=None, sketch_size=DEFAULT_SKETCH_SIZE):
+    """
+    Stream get_resources into TagStatistics and return the report.
+
+    get_tag_keys and get_tag_values are only called for keys whose values
+    exceeded max_values, to report their exact distinct count. They cannot be
+    filtered by resource type, so with `resource_type_filters` the count is
+    taken during the pass instead.
+    """
+    client = boto3.client('resourcegroupstaggingapi', region_name=region)
+    statistics = TagStatistics(max_values, count_overflow=bool(resource_type_filters), sketch_size=sketch_size)
+    kwargs = {"ResourceTypeFilters": resource_type_filters} if resource_type_filters else {}
+    for page in client.get_paginator('get_resources').paginate(**kwargs):
+        for resource in page.get('ResourceTagMappingList', []):
+            statistics.add(resource['ResourceARN'], resource.get('Tags', []))
+
+    distinct_values = {}
+    if statistics.overflow and not resource_type_filters:
+        existing_keys = set()
+        for page in client.get_paginator('get_tag_keys').paginate():
+            existing_keys.update(page.get('TagKeys', []))
+        for key in statistics.overflow:
+            if key in existing_keys:
+                distinct_values[key] = sum(len(page.get('TagValues', []))
+                                           for page in client.get_paginator('get_tag_values').paginate(Key=key))
+    return statistics.report(distinct_values)
+
+
+def format_report(report):
+    lines = [
+        f"{report['resources']} resources known to the tagging API, {report['tags_removed']} with every tag "
+        f"removed, {report['distinct_keys']} distinct tag keys (never-tagged resources are not listed)",
+        "",
+        "Tags removed by type:",
+    ]
+    lines += [f"  {resource_type}: {counts['tags_removed']}/{counts['resources']}"
+              for resource_type, counts in report["by_type"].items() if counts["tags_removed"]]
+    lines += ["", "Keys:"]
+    for key in report["keys"]:
+        top = ", ".join(f"{value}={count}" for value, count in key["top_values"][:5])
+        more = "+" if key["values_truncated"] else ""
+        about = "~" if key["distinct_values_estimated"] else ""
+        lines.append(f"  {key['key']}: {key['resources']} resources ({key['coverage']:.0%}), "
+                     f"{about}{key['distinct_values']}{more} values [{top}]")
+    if report["near_duplicate_keys"]:
+        lines += ["", "Near-duplicate keys:"]
+        for canonical, variants in report["near_duplicate_keys"].items():
+            lines.append(f"  {canonical}: " + ", ".join(f"{v['key']} ({v['resources']})" for v in variants))
+    if report["renames"]:
+        lines += ["", "Suggested renames:"]
+        lines += [f"  {rename['from']} -> {rename['to']} ({rename['resources']} resources)"
+                  for rename in report["renames"]]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report tag key and value statistics for the whole estate.")
+    parser.add_argument("--type", action="append", dest="types",
+                        help="Tagging API resource type filter (repeatable), e.g. ecs:service.")
+    parser.add_argument("--max-values", type=int, default=DEFAULT_MAX_VALUES,
+                        help="Distinct values counted per key before the rest are only tallied.")
+    parser.add_argument("--sketch-size", type=int, default=DEFAULT_SKETCH_SIZE,
+                        help="Hashes kept per key to estimate distinct values past --max-values with --type.")
+    parser.add_argument("--region")
+    parser.add_argument("--format", choices=("json", "human"), default="json")
+    parser.add_argument("--output", help="Write the report here instead of stdout.")
+    args = parser.parse_args(argv)
+
+    try:
+        report = collect(args.types, args.max_values, args.region, args.sketch_size)
+    except (NoCredentialsError, PartialCredentialsError):
+        print("AWS credentials not found or incomplete. Please configure your credentials.")
+        return 1
+    except ClientError as e:
+        print(f"AWS ClientError: {e.response['Error']['Message']}")
+        return 1
+
+    output = json.dumps(report, indent=2) if args.format == "json" else format_report(report)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""
+Shared tag cache for callers in one process (library mode).
+
+Threads asking for the tags of overlapping ARNs would each call get_resources.
+A TagCache serves them from one place:
+
+    - ARNs already cached (and younger than `ttl_s`) are answered locally
+    - ARNs another thread is already fetching are waited for, not fetched again
+      (single flight); the rest are fetched by the caller, 100 per call
+    - at most `max_entries` ARNs are kept, least recently used evicted first
+    - tags written through cache.tag_resources / cache.untag_resources (or
+      tagging.tag_resources(..., cache=cache)) update the cached entries of the
+      ARNs that succeeded, so reading back a write never goes to AWS
+    - each ARN is read in its own region (the tagging API only returns
+      resources of the client's region)
+
+    cache = TagCache(ttl_s=300)
+    tags = cache.get_tags(arns)            # {arn: {key: value}}
+    cache.tag_resources(arns, {"env": "prod"})
+"""
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+
+import boto3
+
+from arns import ArnError, parse_arn
+from tagging import RegionalClients, chunked, tag_resources, untag_resources
+
+DEFAULT_TTL_S = 300.0
+DEFAULT_MAX_ENTRIES = 100000
+# get_resources accepts at most 100 ARNs in ResourceARNList
+GET_RESOURCES_BATCH_SIZE = 100
+
+
+class TagCache:
+    """Thread-safe TTL + LRU cache of ARN -> tags with single-flight fetches."""
+
+    def __init__(self, ttl_s=DEFAULT_TTL_S, max_entries=DEFAULT_MAX_ENTRIES, client=None, clock=time.monotonic,
+                 region_client=None):
+        """
+        :param ttl_s: Seconds a fetched entry is served before it is read from AWS again.
+        :param max_entries: ARNs kept; the least recently used are evicted beyond this.
+        :param client: Optional resourcegroupstaggingapi client, used for ARNs in its region
+            (created on first use otherwise).
+        :param region_client: Optional function of a region (None for the default) returning the
+            client to read that region's ARNs with; replaces `client`.
+        """
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.client = client
+        self.region_client = region_client
+        self.clients = None
+        self.clock = clock
+        self.lock = threading.Lock()
+        # ARN -> (expiry, tags), in least to most recently used order
+        self.entries = OrderedDict()
+        # ARN -> Future of the fetch that will return it
+        self.in_flight = {}
+        # In-flight ARNs written since their fetch started; that fetch is returned but not cached
+        self.overwritten = set()
+        self.stats = Counter()
+
+    def lookup(self, arn, now):
+        entry = self.entries.get(arn)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self.entries[arn]
+            self.stats["expired"] += 1
+            return None
+        self.entries.move_to_end(arn)
+        return entry[1]
+
+    def store(self, arn, tags, now):
+        self.entries[arn] = (now + self.ttl_s, tags)
+        self.entries.move_to_end(arn)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats["evicted"] += 1
+
+    def get_tags(self, resource_arns):
+        """
+        Tags of each ARN; ARNs the tagging API does not return have no tags.
+
+        :return: Dictionary of ARN -> tags dict (copies, safe to modify).
+        :raises ClientError: If the fetch this call made or waited for failed.
+        """
+        arns = list(dict.fromkeys(resource_arns))
+        found, waits, claimed = {}, {}, []
+        with self.lock:
+            now = self.clock()
+            for arn in arns:
+                tags = self.lookup(arn, now)
+                if tags is not None:
+                    found[arn] = tags
+                elif arn in self.in_flight:
+                    waits[arn] = self.in_flight[arn]
+                else:
+                    claimed.append(arn)
+            self.stats.update(hits=len(found), coalesced=len(waits), misses=len(claimed))
+            flight = Future()
+            for arn in claimed:
+                self.in_flight[arn] = flight
+
+        if claimed:
+            try:
+                fetched = self.fetch(claimed)
+            except BaseException as e:
+                with self.lock:
+                    for arn in claimed:
+                        del self.in_flight[arn]
+                        self.overwritten.discard(arn)
+                flight.set_exception(e)
+                raise
+            with self.lock:
+                now = self.clock()
+                for arn in claimed:
+                    del self.in_flight[arn]
+                    if arn in self.overwritten:
+                        self.overwritten.discard(arn)
+                    else:
+                        self.store(arn, fetched[arn], now)
+            flight.set_result(fetched)
+            found.update(fetched)
+
+        for arn, pending in waits.items():
+            found[arn] = pending.result()[arn]
+        return {arn: dict(found[arn]) for arn in arns}
+
+    def cached(self, arns):
+        """Cached tags of the ARNs that have a live entry, without fetching or touching LRU order."""
+        with self.lock:
+            now = self.clock()
+            return {arn: dict(entry[1]) for arn, entry in ((arn, self.entries.get(arn)) for arn in arns)
+                    if entry is not None and entry[0] > now}
+
+    def client_for(self, region):
+        if self.region_client is not None:
+            return self.region_client(region or None)
+        if self.clients is None:
+            self.clients = RegionalClients(self.client or boto3.client('resourcegroupstaggingapi'))
+        return self.clients.for_region(region)
+
+    def fetch(self, arns):
+        """Read tags from the tagging API, 100 ARNs of one region per call."""
+        # Grouped by client, so regionless ARNs (S3) share the default region's batches
+        clients, by_client = {}, {}
+        for arn in arns:
+            try:
+                region = parse_arn(arn).region
+            except ArnError:
+                region = ""
+            if region not in clients:
+                clients[region] = self.client_for(region)
+            by_client.setdefault(id(clients[region]), (clients[region], []))[1].append(arn)
+        fetched = dict.fromkeys(arns)
+        for client, client_arns in by_client.values():
+            for batch in chunked(client_arns, GET_RESOURCES_BATCH_SIZE):
+                self.stats["calls"] += 1
+                response = client.get_resources(ResourceARNList=batch)
+                for resource in response.get('ResourceTagMappingList', []):
+                    fetched[resource['ResourceARN']] = {tag['Key']: tag['Value'] for tag in resource.get('Tags', [])}
+        return {arn: tags or {} for arn, tags in fetched.items()}
+
+    def tagged(self, arns, tags):
+        """Merge tags that were applied successfully into the cached entries."""
+        self.written(arns, lambda cached: {**cached, **tags})
+
+    def untagged(self, arns, tag_keys):
+        """Drop tag keys that were removed successfully from the cached entries."""
+        keys = set(tag_keys)
+        self.written(arns, lambda cached: {key: value for key, value in cached.items() if key not in keys})
+
+    def written(self, arns, update):
+        with self.lock:
+            now = self.clock()
+            for arn in arns:
+                if arn in self.in_flight:
+                    self.overwritten.add(arn)
+                entry = self.entries.get(arn)
+                # Only entries holding the full tag set can be updated; the write alone does not give one
+                if entry is not None and entry[0] > now:
+                    self.entries[arn] = (entry[0], update(entry[1]))
+
+    def invalidate(self, arns=None):
+        """Forget the given ARNs, or everything."""
+        with self.lock:
+            if arns is None:
+                self.overwritten.update(self.in_flight)
+                self.entries.clear()
+                return
+            for arn in arns:
+                if arn in self.in_flight:
+                    self.overwritten.add(arn)
+                self.entries.pop(arn, None)
+
+    def tag_resources(self, resource_arns, tags, **kwargs):
+        """tagging.tag_resources, updating this cache for the ARNs that succeed."""
+        return tag_resources(resource_arns, tags, cache=self, **kwargs)
+
+    def untag_resources(self, resource_arns, tag_keys, **kwargs):
+        """tagging.untag_resources, updating this cache for the ARNs that succeed."""
+        return untag_resources(resource_arns, tag_keys, cache=self, **kwargs)
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,185 @@
+"""
+Buffered structured result events for tagging runs.
+
+Each resource outcome is one event: ARN, action, status, error code and the
+latency of the API call that produced it. Events are written as JSON lines
+(the default when writing to a file) or through the human-readable formatter,
+and an end-of-run summary with totals and throughput is written on close.
+
+The default sink is configured from the environment:
+
+    AWS_TAGGER_EVENTS   path of the event file, or '-' for stdout (default: stdout)
+    AWS_TAGGER_OUTPUT   'jsonl' (default) or 'human'
+
+Output is buffered either way; human output on a terminal is flushed once per
+API call, not once per resource.
+"""
+import atexit
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+from failures import classify
+
+PAST_TENSE = {"tag": "tagged", "untag": "untagged", "ecs-tag": "tagged", "create": "created"}
+
+
+def format_jsonl(event):
+    return json.dumps(event, separators=(",", ":"), default=str)
+
+
+def format_human(event):
+    if event.get("event") == "summary":
+        lines = [
+            f"Run summary: {event['resources']} resources in {event['elapsed_s']:.2f}s "
+            f"({event['throughput_per_s']:.1f}/s), {event['api_calls']} API calls",
+        ]
+        lines += [f"  {status}: {count}" for status, count in sorted(event["by_status"].items())]
+        lines += [f"  error {code}: {count}" for code, count in sorted(event["error_codes"].items())]
+        return "\n".join(lines)
+
+    arn, action, status = event["arn"], event["action"], event["status"]
+    if status == "ok":
+        return f"Successfully {PAST_TENSE.get(action, action)} resource: {arn}"
+    if status == "skipped":
+        return f"Skipped {arn}: {event.get('reason', 'nothing to do')}"
+    message = event.get("error_message") or ""
+    failure_class = f" [{event['failure_class']}]" if event.get("failure_class") else ""
+    return f"Failed to {action} resource: {arn} ({event.get('error_code')}{': ' + message if message else ''}){failure_class}"
+
+
+FORMATTERS = {"jsonl": format_jsonl, "human": format_human}
+
+
+class EventSink:
+    """Collects result events, writes them in buffered chunks and tracks run totals."""
+
+    def __init__(self, stream=None, formatter=format_jsonl, buffer_size=500, flush_batches=False):
+        """
+        :param buffer_size: Events held before they are written.
+        :param flush_batches: Also write out the buffer after each record_batch (interactive output).
+        """
+        self.stream = stream or sys.stdout
+        self.formatter = formatter
+        self.buffer_size = buffer_size
+        self.flush_batches = flush_batches
+        self.buffer = []
+        self.started = time.monotonic()
+        self.by_status = Counter()
+        self.by_action = Counter()
+        self.error_codes = Counter()
+        self.api_calls = 0
+        self.closed = False
+
+    def record(self, arn, action, status="ok", error_code=None, error_message=None, latency_ms=None, **extra):
+        """Record the outcome of one resource."""
+        event = {"ts": round(time.time(), 3), "arn": arn, "action": action, "status": status}
+        if error_code:
+            event["error_code"] = error_code
+        if error_message:
+            event["error_message"] = error_message
+        if latency_ms is not None:
+            event["latency_ms"] = round(latency_ms, 1)
+        event.update(extra)
+
+        self.by_status[status] += 1
+        self.by_action[action] += 1
+        if error_code:
+            self.error_codes[error_code] += 1
+        self.write(event)
+
+    def record_batch(self, arns, action, failed=None, latency_ms=None, error_code=None, error_message=None,
+                     status_code=None):
+        """
+        Record one API call covering `arns`.
+
+        Failed events carry the failure class (retryable, auth or permanent, see failures.classify).
+
+        :param failed: FailedResourcesMap from the response (ARN -> {ErrorCode, ErrorMessage, StatusCode}).
+        :param error_code: Set when the whole call failed; every ARN is recorded with it.
+        """
+        self.api_calls += 1
+        failed = failed or {}
+        for arn in arns:
+            if error_code:
+                self.record(arn, action, "failed", error_code, error_message, latency_ms, status_code=status_code,
+                            failure_class=classify(error_code, status_code), batch_size=len(arns))
+            elif arn in failed:
+                details = failed[arn]
+                self.record(arn, action, "failed", details.get("ErrorCode"), details.get("ErrorMessage"),
+                            latency_ms, status_code=details.get("StatusCode"),
+                            failure_class=classify(details.get("ErrorCode"), details.get("StatusCode")),
+                            batch_size=len(arns))
+            else:
+                self.record(arn, action, "ok", latency_ms=latency_ms, batch_size=len(arns))
+        if self.flush_batches:
+            self.flush()
+
+    def write(self, event):
+        self.buffer.append(self.formatter(event))
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.stream.write("\n".join(self.buffer) + "\n")
+            self.buffer = []
+        self.stream.flush()
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started
+        resources = sum(self.by_status.values())
+        return {
+            "event": "summary",
+            "resources": resources,
+            "api_calls": self.api_calls,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_per_s": round(resources / elapsed, 1) if elapsed > 0 else 0.0,
+            "by_status": dict(self.by_status),
+            "by_action": dict(self.by_action),
+            "error_codes": dict(self.error_codes),
+        }
+
+    def close(self):
+        """Write the run summary and flush. Safe to call more than once."""
+        if self.closed:
+            return
+        self.closed = True
+        if self.by_status:
+            self.write(self.summary())
+        self.flush()
+        if self.stream not in (sys.stdout, sys.stderr):
+            self.stream.close()
+
+
+def open_sink(path=None, output_format=None, buffer_size=500):
+    """
+    Open an EventSink.
+
+    :param path: Event file path, '-' for stdout. Defaults to $AWS_TAGGER_EVENTS, then stdout.
+    :param output_format: 'jsonl' or 'human'. Defaults to $AWS_TAGGER_OUTPUT, then jsonl.
+    """
+    path = path or os.environ.get("AWS_TAGGER_EVENTS") or "-"
+    to_stdout = path == "-"
+    output_format = output_format or os.environ.get("AWS_TAGGER_OUTPUT") or "jsonl"
+    if output_format not in FORMATTERS:
+        raise ValueError(f"Unknown output format '{output_format}', expected one of {sorted(FORMATTERS)}")
+
+    stream = sys.stdout if to_stdout else open(path, "a", buffering=1024 * 1024)
+    # Human output on a terminal shows each call's results as it completes, still written in one piece
+    interactive = to_stdout and output_format == "human" and sys.stdout.isatty()
+    return EventSink(stream, FORMATTERS[output_format], buffer_size=buffer_size, flush_batches=interactive)
+
+
+_default_sink = None
+
+
+def default_sink():
+    """Return the process-wide sink, opened from the environment and closed at exit."""
+    global _default_sink
+    if _default_sink is None or _default_sink.closed:
+        _default_sink = open_sink()
+        atexit.register(_default_sink.close)
+    return _default_sink
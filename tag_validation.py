@@ -0,0 +1,128 @@
+"""
+Local validation of tag changes against AWS tag rules, before any API call.
+
+Invalid tags otherwise only show up as per-resource failures of TagResources,
+after every batch carrying them has been sent. The checks here follow the
+tagging rules of the services the scripts tag:
+
+    - at most 50 user tags per resource after the change (aws: tags do not count)
+    - keys of 1 to 128 characters, values of up to 256
+    - no 'aws:' prefix on keys (on ECS, not on values either)
+    - letters, numbers, spaces and _ . : / = + - @ only (EC2 allows any character)
+
+tag_resources checks the merged final tag set of each resource against the
+existing tags it is given (or finds in a TagCache) and reports the resources
+it rejects as failed, without calling AWS for them.
+"""
+import re
+from collections import namedtuple
+
+from inventory import split_arn_resource
+
+TagRules = namedtuple("TagRules", "max_tags max_key_length max_value_length allowed reserved_values")
+
+ALLOWED_CHARACTERS = re.compile(r"[\w\s+\-=.:/@]*")
+RESERVED_PREFIX = "aws:"
+
+DEFAULT_RULES = TagRules(max_tags=50, max_key_length=128, max_value_length=256, allowed=ALLOWED_CHARACTERS,
+                         reserved_values=False)
+
+# Service (ARN service field) -> rules, where they differ from the defaults
+SERVICE_RULES = {
+    "ec2": DEFAULT_RULES._replace(allowed=None),
+    "ecs": DEFAULT_RULES._replace(reserved_values=True),
+}
+
+
+class TagValidationError(ValueError):
+    """Tags that AWS would reject."""
+
+
+def rules_for(arn):
+    return SERVICE_RULES.get(split_arn_resource(arn)[0], DEFAULT_RULES)
+
+
+def parse_tags(text):
+    """
+    Parse 'key=value,key2=value2' input. Values may contain '=' and may be empty.
+
+    :raises TagValidationError: For entries without '=' or with an empty key.
+    """
+    tags = {}
+    for entry in text.split(','):
+        if not entry.strip():
+            continue
+        key, separator, value = entry.partition('=')
+        if not separator or not key.strip():
+            raise TagValidationError(f"'{entry.strip()}' is not a key=value pair")
+        tags[key.strip()] = value.strip()
+    if not tags:
+        raise TagValidationError("no tags given")
+    return tags
+
+
+def tag_problems(key, value, rules=DEFAULT_RULES):
+    """Problems with one tag under `rules`, as a list of messages."""
+    problems = []
+    if not key:
+        problems.append("empty tag key")
+    elif len(key) > rules.max_key_length:
+        problems.append(f"key '{key[:20]}...' is longer than {rules.max_key_length} characters")
+    if len(value) > rules.max_value_length:
+        problems.append(f"value of '{key}' is longer than {rules.max_value_length} characters")
+    if key.lower().startswith(RESERVED_PREFIX):
+        problems.append(f"key '{key}' uses the reserved 'aws:' prefix")
+    if rules.reserved_values and value.lower().startswith(RESERVED_PREFIX):
+        problems.append(f"value of '{key}' uses the reserved 'aws:' prefix")
+    if rules.allowed is not None:
+        for kind, text in (("key", key), ("value", value)):
+            if not rules.allowed.fullmatch(text):
+                bad = sorted(set(char for char in text if not rules.allowed.fullmatch(char)))
+                problems.append(f"{kind} '{text}' contains characters not allowed here: {''.join(bad)!r}")
+    return problems
+
+
+def change_problems(arn, tags, existing=None):
+    """
+    Problems with applying `tags` to the resource `arn`.
+
+    :param existing: The resource's current tags when known; the tag count is then checked
+        on the merged tag set, otherwise on `tags` alone.
+    """
+    rules = rules_for(arn)
+    problems = []
+    for key, value in tags.items():
+        problems += tag_problems(key, value, rules)
+    merged = {**(existing or {}), **tags}
+    user_tags = sum(1 for key in merged if not key.lower().startswith(RESERVED_PREFIX))
+    if user_tags > rules.max_tags:
+        problems.append(f"{user_tags} tags after the change, more than the limit of {rules.max_tags}")
+    return problems
+
+
+def split_valid(resource_arns, tags, existing_tags=None):
+    """
+    Separate the ARNs `tags` can be applied to from those AWS would reject.
+
+    :param existing_tags: Optional mapping of ARN -> current tags (an Inventory's tags, a
+        TagCache's cached entries...); ARNs missing from it are checked on `tags` alone.
+    :return: (valid ARNs, dictionary of rejected ARN -> list of problems).
+    """
+    existing_tags = existing_tags or {}
+    valid, rejected = [], {}
+    # Key and value checks depend only on the service, so they are shared by its ARNs
+    per_service = {}
+    for arn in resource_arns:
+        current = existing_tags.get(arn)
+        if current:
+            problems = change_problems(arn, tags, current)
+        else:
+            service = split_arn_resource(arn)[0]
+            if service not in per_service:
+                per_service[service] = change_problems(arn, tags)
+            problems = per_service[service]
+        if problems:
+            rejected[arn] = problems
+        else:
+            valid.append(arn)
+    return valid, rejected
@@ -0,0 +1,292 @@
+"""
+Tag resources as they are created, from CloudTrail / EventBridge events.
+
+cron-run-1.py finds untagged ECS resources by rescanning every cluster on each
+cron tick, so short-lived tasks often finish before they are tagged. This
+watcher consumes creation events from a queue instead (event_queue: SQS, a
+file or stdin), collects them for a short window, infers 'cust', 'env' and
+'appname' from the cluster or resource name, and applies the tags with batched
+tag_resources calls: creation-to-tag latency is the window plus one call, with
+no scan at all.
+
+    python tag_watcher.py --queue https://sqs.us-east-1.amazonaws.com/123456789012/tag-on-create
+    python tag_watcher.py --queue events.jsonl --once
+    tail -f events.jsonl | python tag_watcher.py --queue - --follow
+
+Recognised events: CloudTrail records (or 'AWS API Call via CloudTrail'
+EventBridge events) for ECS CreateCluster, CreateService, RunTask and StartTask
+and ElastiCache CreateCacheCluster and CreateReplicationGroup, plus EventBridge
+'ECS Task State Change' events. Tags given in the create request are never
+overwritten. Messages are acknowledged once their resources are tagged; failed
+ones are redelivered up to MAX_ATTEMPTS times.
+"""
+import argparse
+import sys
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime
+
+from botocore.exceptions import NoCredentialsError, PartialCredentialsError
+
+from aws_metrics import enable_from_environment
+from event_queue import events_in, open_queue
+from naming import extract_info_from_name
+from profiling import enable_from_command_line
+from tag_events import default_sink
+from tagging import tag_resources
+
+DEFAULT_WINDOW_S = 2.0
+DEFAULT_MAX_BATCH = 200
+MAX_ATTEMPTS = 3
+SEEN_SIZE = 10000
+
+
+def field(data, name):
+    """Read a CloudTrail field, which may be camelCase or PascalCase depending on the service."""
+    if not isinstance(data, dict):
+        return None
+    value = data.get(name)
+    return value if value is not None else data.get(name[0].upper() + name[1:])
+
+
+def request_tags(record):
+    """Tags passed in the create request, as a dict (both {key, value} and {Key, Value} lists)."""
+    tags = field(record.get("requestParameters"), "tags") or []
+    if isinstance(tags, dict):
+        return tags
+    return {field(tag, "key"): field(tag, "value") or "" for tag in tags if field(tag, "key")}
+
+
+def ecs_created(record):
+    response = record.get("responseElements") or {}
+    tags = request_tags(record)
+    created = []
+    if field(response, "cluster"):
+        cluster_arn = field(field(response, "cluster"), "clusterArn")
+        created.append((cluster_arn, cluster_arn, tags))
+    if field(response, "service"):
+        service = field(response, "service")
+        created.append((field(service, "serviceArn"), field(service, "clusterArn"), tags))
+    for task in field(response, "tasks") or []:
+        created.append((field(task, "taskArn"), field(task, "clusterArn"), tags))
+    return created
+
+
+def elasticache_created(record):
+    response = record.get("responseElements") or {}
+    arn = field(response, "aRN") or field(response, "ARN")
+    return [(arn, None, request_tags(record))]
+
+
+# (eventSource, eventName) -> function returning [(ARN, cluster ARN or None, request tags)]
+CREATE_EVENTS = {
+    ("ecs.amazonaws.com", "CreateCluster"): ecs_created,
+    ("ecs.amazonaws.com", "CreateService"): ecs_created,
+    ("ecs.amazonaws.com", "RunTask"): ecs_created,
+    ("ecs.amazonaws.com", "StartTask"): ecs_created,
+    ("elasticache.amazonaws.com", "CreateCacheCluster"): elasticache_created,
+    ("elasticache.amazonaws.com", "CreateReplicationGroup"): elasticache_created,
+}
+
+
+def created_resources(event):
+    """
+    Resources created by one event.
+
+    :param event: CloudTrail record, or EventBridge event wrapping one or describing an ECS task.
+    :return: List of (ARN, cluster ARN or None, request tags, event time as epoch seconds or None).
+    """
+    detail_type = event.get("detail-type")
+    if detail_type == "ECS Task State Change":
+        detail = event.get("detail") or {}
+        created = [(detail.get("taskArn"), detail.get("clusterArn"), {})]
+        event_time = event.get("time")
+    else:
+        record = event.get("detail") if detail_type == "AWS API Call via CloudTrail" else event
+        extractor = CREATE_EVENTS.get((record.get("eventSource"), record.get("eventName")))
+        if extractor is None or record.get("errorCode"):
+            return []
+        created = extractor(record)
+        event_time = record.get("eventTime") or event.get("time")
+    timestamp = parse_time(event_time)
+    return [(arn, cluster_arn, tags, timestamp) for arn, cluster_arn, tags in created if arn]
+
+
+def parse_time(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def infer_tags(arn, cluster_arn=None):
+    """
+    Naming-convention tags for a new resource: from its cluster's name when it has
+    one (like cron-run-1.py), otherwise from its own name.
+    """
+    names = []
+    if cluster_arn:
+        names.append(cluster_arn.split("/")[-1])
+    resource = arn.split(":", 5)[-1]
+    if "/" in resource:
+        parts = resource.split("/")
+        # New-format ECS ARNs embed the cluster: service/CLUSTER/NAME, task/CLUSTER/ID
+        names += parts[1:-1] + parts[-1:]
+    else:
+        names.append(resource.split(":")[-1])
+    for name in names:
+        tags = extract_info_from_name(name)
+        if tags:
+            return tags
+    return {}
+
+
+class TagWatcher:
+    """
+    Micro-batching consumer of creation events.
+
+    Each batch is the messages received within `window_s` of the first one (or
+    `max_batch` messages); its resources are grouped by tag set and tagged with
+    one tag_resources call per 20 ARNs.
+    """
+
+    def __init__(self, queue, window_s=DEFAULT_WINDOW_S, max_batch=DEFAULT_MAX_BATCH, sink=None, client=None,
+                 inventory=None):
+        """
+        :param queue: event_queue queue to consume.
+        :param inventory: Optional inventory updated with the tags of resources tagged here.
+        """
+        self.queue = queue
+        self.window_s = window_s
+        self.max_batch = max_batch
+        self.sink = sink or default_sink()
+        self.client = client
+        self.inventory = inventory
+        # Recently tagged ARNs: task state changes repeat for every status transition
+        self.seen = OrderedDict()
+        self.attempts = Counter()
+        self.totals = Counter()
+
+    def collect(self, wait_s):
+        """Messages of one batch: wait up to `wait_s` for the first, then fill the window."""
+        messages = self.queue.receive(self.max_batch, wait_s)
+        if not messages:
+            return []
+        deadline = time.monotonic() + self.window_s
+        # A queue that cannot grow (a file read once) has nothing more for the window
+        live = getattr(self.queue, "live", True)
+        min_wait_s = getattr(self.queue, "min_wait_s", 0.0)
+        while len(messages) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or remaining < min_wait_s:
+                break
+            received = self.queue.receive(self.max_batch - len(messages), remaining if live else 0.0)
+            if not received and not live:
+                break
+            messages += received
+        return messages
+
+    def process(self, messages):
+        """Tag the resources created in a batch of messages, then ack or nack the messages."""
+        pending = {}
+        message_arns = {}
+        for message in messages:
+            arns = message_arns[message.receipt] = []
+            for event in events_in(message.body):
+                for arn, cluster_arn, tags, created in created_resources(event):
+                    if arn in self.seen:
+                        continue
+                    arns.append(arn)
+                    if arn not in pending:
+                        pending[arn] = (cluster_arn, tags, created)
+
+        groups = {}
+        for arn, (cluster_arn, tags, created) in pending.items():
+            missing = {key: value for key, value in infer_tags(arn, cluster_arn).items() if key not in tags}
+            if missing:
+                groups.setdefault(tuple(sorted(missing.items())), []).append(arn)
+            else:
+                self.sink.record(arn, "tag", "skipped", reason="no tags to infer or all present")
+                self.remember(arn, tags)
+
+        failed = {}
+        for tags, arns in groups.items():
+            failed.update(tag_resources(arns, dict(tags), sink=self.sink, client=self.client))
+            for arn in arns:
+                if arn not in failed:
+                    self.remember(arn, {**pending[arn][1], **dict(tags)})
+
+        retry = []
+        for message in messages:
+            arns = [arn for arn in message_arns[message.receipt] if arn in failed]
+            for arn in arns:
+                self.attempts[arn] += 1
+            if any(self.attempts[arn] < MAX_ATTEMPTS for arn in arns):
+                retry.append(message.receipt)
+        self.queue.ack([message.receipt for message in messages if message.receipt not in retry])
+        if retry:
+            self.queue.nack(retry)
+
+        now = time.time()
+        lags = [now - created for _, _, created in pending.values() if created]
+        self.totals.update(messages=len(messages), resources=len(pending), failed=len(failed))
+        return {"messages": len(messages), "resources": len(pending), "tagged": len(pending) - len(failed),
+                "failed": len(failed), "max_lag_s": round(max(lags), 1) if lags else None}
+
+    def remember(self, arn, tags):
+        self.attempts.pop(arn, None)
+        self.seen[arn] = True
+        if len(self.seen) > SEEN_SIZE:
+            self.seen.popitem(last=False)
+        if self.inventory is not None:
+            self.inventory.add(arn, tags)
+
+    def run(self, once=False, poll_s=20.0):
+        """
+        Consume batches until interrupted, or until the queue is empty when `once` is set.
+        """
+        try:
+            while True:
+                messages = self.collect(0.0 if once else poll_s)
+                if not messages:
+                    if once:
+                        break
+                    continue
+                result = self.process(messages)
+                if result["resources"]:
+                    lag = f", oldest event {result['max_lag_s']}s old" if result["max_lag_s"] is not None else ""
+                    print(f"Batch: {result['messages']} messages, {result['tagged']} tagged, "
+                          f"{result['failed']} failed{lag}", file=sys.stderr)
+        except KeyboardInterrupt:
+            pass
+        return self.totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tag new resources from CloudTrail / EventBridge creation events.")
+    parser.add_argument("--queue", required=True, help="SQS queue URL, a JSON lines file, or '-' for stdin.")
+    parser.add_argument("--follow", action="store_true", help="Keep reading a file or stdin as it grows.")
+    parser.add_argument("--once", action="store_true", help="Exit when the queue is empty.")
+    parser.add_argument("--window", type=float, default=DEFAULT_WINDOW_S,
+                        help="Seconds to collect events into one batch after the first arrives.")
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH)
+    args = parser.parse_args(argv)
+
+    try:
+        watcher = TagWatcher(open_queue(args.queue, args.follow), args.window, args.max_batch)
+        totals = watcher.run(once=args.once)
+    except (NoCredentialsError, PartialCredentialsError):
+        print("AWS credentials not found or incomplete. Please configure your credentials.")
+        return 1
+    except OSError as e:
+        print(f"Cannot read queue: {e}")
+        return 1
+    return 2 if totals["failed"] else 0
+
+
+if __name__ == "__main__":
+    enable_from_environment()
+    enable_from_command_line()
+    sys.exit(main())
@@ -0,0 +1,188 @@
+import time
+from collections import Counter
+
+import boto3
+from botocore.exceptions import NoCredentialsError, PartialCredentialsError, ClientError
+
+from arns import split_valid_arns
+from circuit_breaker import CircuitOpenError, breaker_key, default_breakers
+from failures import classify, default_failure_log
+from profiling import span
+from tag_events import default_sink
+from tag_validation import split_valid
+
+# tag_resources / untag_resources accept at most 20 ARNs per call
+TAG_RESOURCES_BATCH_SIZE = 20
+
+
+def chunked(items, size):
+    """Yield successive lists of at most `size` items."""
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def call_batch(sink, action, arns, call):
+    """Run one API call for `arns` and record its outcome. Returns the FailedResourcesMap."""
+    started = time.perf_counter()
+    try:
+        with span("apply"):
+            response = call()
+    except (NoCredentialsError, PartialCredentialsError) as e:
+        sink.record_batch(arns, action, latency_ms=(time.perf_counter() - started) * 1000,
+                          error_code="NoCredentials", error_message=str(e))
+        raise
+    except ClientError as e:
+        error = e.response.get("Error", {})
+        status_code = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+        sink.record_batch(arns, action, latency_ms=(time.perf_counter() - started) * 1000,
+                          error_code=error.get("Code", "ClientError"), error_message=error.get("Message"),
+                          status_code=status_code)
+        return {arn: {"ErrorCode": error.get("Code", "ClientError"), "StatusCode": status_code,
+                      "ErrorMessage": error.get("Message")} for arn in arns}
+    except Exception as e:
+        sink.record_batch(arns, action, latency_ms=(time.perf_counter() - started) * 1000,
+                          error_code=type(e).__name__, error_message=str(e))
+        return {arn: {"ErrorCode": type(e).__name__, "ErrorMessage": str(e)} for arn in arns}
+
+    failed = response.get("FailedResourcesMap", {})
+    sink.record_batch(arns, action, failed, latency_ms=(time.perf_counter() - started) * 1000)
+    return failed
+
+
+def guarded_batch(sink, action, key, arns, call, breakers):
+    """
+    call_batch through the circuit breaker for `key`.
+
+    A batch where every ARN failed with one error counts as a failure of the endpoint;
+    anything that tagged some ARNs counts as success. While the breaker is open the call
+    is skipped and every ARN is reported failed with the error that opened it.
+    """
+    breaker = breakers.get(key)
+    if not breaker.allow():
+        error = CircuitOpenError(key, breaker)
+        for arn in arns:
+            sink.record(arn, action, "failed", error.error_code, str(error), failure_class=error.failure_class,
+                        circuit_open=True)
+        return {arn: {"ErrorCode": error.error_code, "ErrorMessage": str(error)} for arn in arns}
+
+    failed = call_batch(sink, action, arns, call)
+    if len(failed) < len(arns):
+        breaker.success()
+    else:
+        (code, status_code), _ = Counter((details.get("ErrorCode"), details.get("StatusCode"))
+                                         for details in failed.values()).most_common(1)[0]
+        breaker.failure(classify(code, status_code), code)
+    return failed
+
+
+def breaker_batches(resource_arns, operation):
+    """Split ARNs into batches of at most 20 that share one breaker key: [(key, batch)]."""
+    groups = {}
+    for arn in resource_arns:
+        groups.setdefault(breaker_key(arn, operation), []).append(arn)
+    return [(key, batch) for key, arns in groups.items() for batch in chunked(arns, TAG_RESOURCES_BATCH_SIZE)]
+
+
+def reject_arns(sink, action, resource_arns, failed):
+    """Report malformed ARNs as failed without calling AWS; returns the canonical valid ARNs."""
+    valid, rejected = split_valid_arns(resource_arns)
+    for arn, reason in rejected.items():
+        sink.record(arn, action, "failed", "InvalidArn", reason)
+        failed[arn] = {"ErrorCode": "InvalidArn", "ErrorMessage": reason}
+    return valid
+
+
+class RegionalClients:
+    """
+    Tagging clients by region. The tagging API only tags resources in the client's own
+    region, so ARNs of other regions get a client there; regionless ARNs (S3) use the default.
+    """
+
+    def __init__(self, client=None):
+        self.default = client or boto3.client('resourcegroupstaggingapi')
+        meta = getattr(self.default, "meta", None)
+        self.default_region = getattr(meta, "region_name", None)
+        self.clients = {}
+
+    def for_region(self, region):
+        if not region or self.default_region is None or region == self.default_region:
+            return self.default
+        if region not in self.clients:
+            self.clients[region] = boto3.client('resourcegroupstaggingapi', region_name=region)
+        return self.clients[region]
+
+
+def tag_resources(resource_arns, tags, sink=None, client=None, failures=None, breakers=None, cache=None,
+                  existing_tags=None):
+    """
+    Apply tags to resources through the tagging API, 20 ARNs per call.
+
+    Malformed ARNs (see arns.parse_arn) and resources the tags cannot be applied to (see
+    tag_validation) are reported as failed with error code InvalidArn or TagValidationError,
+    and no call is made for them. Each batch goes to a client in its ARNs' region.
+
+    :param resource_arns: ARNs to tag.
+    :param tags: Dictionary of tags to apply.
+    :param sink: EventSink receiving one event per ARN (default: tag_events.default_sink()).
+    :param client: Optional resourcegroupstaggingapi client, used for ARNs in its region.
+    :param failures: FailureLog the failed ARNs are recorded in (default: failures.default_failure_log()).
+    :param breakers: CircuitBreakers guarding each (account, region, service) (default:
+        circuit_breaker.default_breakers()).
+    :param cache: Optional tag_cache.TagCache updated with the tags of the ARNs that succeed.
+        Its cached entries are also used as the existing tags for validation.
+    :param existing_tags: Optional mapping of ARN -> current tags, so the tag limit is checked
+        on the merged tag set.
+    :return: Dictionary of failed ARNs to their FailedResourcesMap entry.
+    """
+    sink = sink or default_sink()
+    clients = RegionalClients(client)
+    breakers = breakers or default_breakers()
+    failed = {}
+    with span("validate"):
+        resource_arns = reject_arns(sink, "tag", resource_arns, failed)
+        if existing_tags is None and cache is not None:
+            existing_tags = cache.cached(resource_arns)
+        resource_arns, rejected = split_valid(resource_arns, tags, existing_tags)
+    for arn, problems in rejected.items():
+        message = "; ".join(problems)
+        sink.record(arn, "tag", "failed", "TagValidationError", message)
+        failed[arn] = {"ErrorCode": "TagValidationError", "ErrorMessage": message}
+    with span("batch-build"):
+        batches = breaker_batches(resource_arns, "tag_resources")
+    for key, batch in batches:
+        client = clients.for_region(key[1])
+        failed.update(guarded_batch(sink, "tag", key, batch,
+                                    lambda: client.tag_resources(ResourceARNList=batch, Tags=tags), breakers))
+    if cache is not None:
+        cache.tagged([arn for arn in resource_arns if arn not in failed], tags)
+    if failed:
+        (failures or default_failure_log()).record(failed, "tag", tags=tags)
+    return failed
+
+
+def untag_resources(resource_arns, tag_keys, sink=None, client=None, failures=None, breakers=None, cache=None):
+    """
+    Remove tag keys from resources through the tagging API, 20 ARNs per call.
+    Malformed ARNs are reported as failed (InvalidArn) without a call.
+
+    :return: Dictionary of failed ARNs to their FailedResourcesMap entry.
+    """
+    sink = sink or default_sink()
+    clients = RegionalClients(client)
+    breakers = breakers or default_breakers()
+    failed = {}
+    with span("validate"):
+        resource_arns = reject_arns(sink, "untag", resource_arns, failed)
+    with span("batch-build"):
+        batches = breaker_batches(resource_arns, "untag_resources")
+    for key, batch in batches:
+        client = clients.for_region(key[1])
+        failed.update(guarded_batch(sink, "untag", key, batch,
+                                    lambda: client.untag_resources(ResourceARNList=batch, TagKeys=list(tag_keys)),
+                                    breakers))
+    if cache is not None:
+        cache.untagged([arn for arn in resource_arns if arn not in failed], tag_keys)
+    if failed:
+        (failures or default_failure_log()).record(failed, "untag", keys=tag_keys)
+    return failed